@@ -0,0 +1,95 @@
+# benchmarks/bench_caption_search.py
+"""Benchmark latensi pencarian CaptionStore pada baris sintetis.
+
+Contoh:
+    python -m benchmarks.bench_caption_search --rows 1000000 --queries 200
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from src.app.config.settings import CATEGORY_PRIORITY
+from src.app.services.CaptionStore import CaptionStore
+
+WORDS = (
+    "a man woman dog cat child boy girl people group car street road building house tree grass field water "
+    "beach sea river mountain snow sky sunset table food plate bicycle motorcycle bus train horse ball "
+    "playing standing sitting walking running riding holding wearing red blue white black green yellow "
+    "shirt hat jacket dress phone laptop book flowers garden park city night light window door"
+).split()
+
+
+def _rows(rng, count, categories):
+    for i in range(count):
+        yield {
+            "filename": f"img_{i}.jpg",
+            "caption": " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 12))),
+            "category": rng.choice(categories),
+            "cosine_similarity": round(rng.random(), 4),
+            "bleu_score": round(rng.random(), 4),
+            "decided_by": "caption",
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Caption full-text search benchmark")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--output", help="Tulis hasil JSON ke file ini (default: stdout)")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(0)
+    categories = list(CATEGORY_PRIORITY)
+    with tempfile.TemporaryDirectory(prefix="bench_caption_search_") as tmp:
+        store = CaptionStore(os.path.join(tmp, "captions.sqlite3"), batch_size=10_000)
+        start = time.perf_counter()
+        for n, row in enumerate(_rows(rng, args.rows, categories)):
+            store.add(row, f"task-{n // 1000}")
+        store.flush()
+        build_s = time.perf_counter() - start
+
+        # Campuran bentuk query: kata, dua kata, prefix, kata + kategori + skor, halaman lanjutan
+        kinds = {"word": [], "two_words": [], "prefix": [], "filtered": [], "next_page": [], "category_only": []}
+        for _ in range(args.queries):
+            a, b = rng.choice(WORDS), rng.choice(WORDS)
+            queries = {
+                "word": dict(query=a),
+                "two_words": dict(query=f"{a} {b}"),
+                "prefix": dict(query=a[:3] + "*"),
+                "filtered": dict(query=a, category=rng.choice(categories), min_score=0.5),
+                "category_only": dict(category=rng.choice(categories), max_score=0.2),
+            }
+            for kind, params in queries.items():
+                t = time.perf_counter()
+                hits, cursor = store.search(limit=args.limit, **params)
+                kinds[kind].append((time.perf_counter() - t) * 1000.0)
+                if kind == "word" and cursor is not None:
+                    for _ in range(5):
+                        hits, cursor = store.search(limit=args.limit, cursor=cursor, **params)
+                    t = time.perf_counter()
+                    store.search(limit=args.limit, cursor=cursor, **params)
+                    kinds["next_page"].append((time.perf_counter() - t) * 1000.0)
+
+    report = {"rows": args.rows, "limit": args.limit, "build_s": round(build_s, 3)}
+    for kind, latencies in kinds.items():
+        if latencies:
+            latencies.sort()
+            report[kind] = {
+                "p50_ms": round(statistics.median(latencies), 3),
+                "p95_ms": round(latencies[int(0.95 * (len(latencies) - 1))], 3),
+            }
+    payload = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(payload)
+    else:
+        print(payload)
+
+
+if __name__ == "__main__":
+    main()
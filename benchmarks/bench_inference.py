@@ -0,0 +1,127 @@
+# benchmarks/bench_inference.py
+"""Overhead per panggilan model: Keras predict vs graph function (tf.function).
+
+Contoh:
+    python -m benchmarks.bench_inference --models stub --calls 200
+    python -m benchmarks.bench_inference --models real --output bench_inference.json
+
+Untuk feature extractor dan caption model (batch 1) diukur:
+  predict   model.predict(x, verbose=0), jalur lama per gambar / per token
+  eager     model(x, training=False)
+  compiled  fungsi yang dipakai ImageCaptionService (input_signature tetap, sudah di-warm up)
+Ditambah satu caption penuh (decode per token) dengan predict dan dengan graph function.
+"""
+import argparse
+import json
+import logging
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.bench_pipeline import _meta, _summarize
+
+
+def _time_calls(fn, calls):
+    fn()  # panggilan pertama tidak dihitung (trace / alokasi)
+    samples = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def _build_services(models):
+    from src.app.services.ImageCaptionService import ImageCaptionService
+
+    if models == "stub":
+        from benchmarks.stub_models import build_stub_components
+
+        components = build_stub_components()
+        start = time.perf_counter()
+        compiled = ImageCaptionService.from_components(*components, compiled=True)
+        warmup_s = time.perf_counter() - start
+        fns = (compiled._feature_fn, compiled._next_token_fn, compiled._index_word)
+    else:
+        ImageCaptionService._instance = None
+        start = time.perf_counter()
+        ImageCaptionService()
+        warmup_s = time.perf_counter() - start
+        components = (ImageCaptionService._model, ImageCaptionService._tokenizer, ImageCaptionService._feature_extractor)
+        fns = (ImageCaptionService._feature_fn, ImageCaptionService._next_token_fn, ImageCaptionService._index_word)
+    return components, fns, warmup_s
+
+
+def run(args):
+    import tensorflow as tf
+    from src.app.services.ImageCaptionService import ImageCaptionService
+
+    (model, tokenizer, feature_extractor), (feature_fn, next_token_fn, _), load_s = _build_services(args.models)
+    logging.getLogger().setLevel(args.log_level)
+    if feature_fn is None:
+        raise SystemExit("COMPILED_INFERENCE=false; nothing to compare against")
+
+    rng = np.random.default_rng(0)
+    image = rng.uniform(-120, 150, size=(1, 224, 224, 3)).astype(np.float32)
+    feature = feature_extractor(image, training=False).numpy()
+    sequence = np.zeros((1, ImageCaptionService._max_length), dtype=np.int32)
+    sequence[0, -3:] = [1, 2, 3]
+    image_t = tf.convert_to_tensor(image)
+    feature_t = tf.convert_to_tensor(feature, next_token_fn.input_signature[0].dtype)
+    sequence_t = tf.convert_to_tensor(sequence, next_token_fn.input_signature[1].dtype)
+
+    cases = {
+        ("feature_extractor", "predict"): lambda: feature_extractor.predict(image, verbose=0),
+        ("feature_extractor", "eager"): lambda: feature_extractor(image_t, training=False).numpy(),
+        ("feature_extractor", "compiled"): lambda: feature_fn(image_t).numpy(),
+        ("caption_model", "predict"): lambda: np.argmax(model.predict([feature, sequence], verbose=0)),
+        ("caption_model", "eager"): lambda: int(np.argmax(model([feature_t, sequence_t], training=False))),
+        ("caption_model", "compiled"): lambda: int(next_token_fn(feature_t, sequence_t)[0]),
+    }
+    results = []
+    for (target, path), fn in cases.items():
+        entry = {"models": args.models, "target": target, "path": path}
+        entry.update(_summarize(_time_calls(fn, args.calls)))
+        results.append(entry)
+        print(f"{args.models:5s} {target:18s} {path:9s} p50={entry['p50_ms']:9.3f}ms p95={entry['p95_ms']:9.3f}ms", file=sys.stderr)
+
+    # Caption penuh: jalur predict vs graph function pada service yang sama
+    service = ImageCaptionService.from_components(model, tokenizer, feature_extractor, compiled=False)
+    for path, compiled in (("predict", False), ("compiled", True)):
+        ImageCaptionService._prepare_inference(compiled)
+        samples = _time_calls(lambda: service._decode_caption(feature), args.captions)
+        entry = {"models": args.models, "target": "full_caption", "path": path}
+        entry.update(_summarize(samples))
+        results.append(entry)
+        print(f"{args.models:5s} {'full_caption':18s} {path:9s} p50={entry['p50_ms']:9.3f}ms p95={entry['p95_ms']:9.3f}ms", file=sys.stderr)
+
+    speedups = {}
+    by_key = {(r["target"], r["path"]): r["p50_ms"] for r in results}
+    for target in ("feature_extractor", "caption_model", "full_caption"):
+        speedups[target] = round(by_key[(target, "predict")] / by_key[(target, "compiled")], 2)
+    meta = _meta(argparse.Namespace(repeat=args.calls, sizes="224x224", synthetic_count=0))
+    meta["load_and_warmup_s"] = round(load_s, 3)
+    return {"meta": meta, "results": results, "speedup_p50": speedups}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Keras predict vs compiled graph function per-call overhead")
+    parser.add_argument("--models", choices=["stub", "real"], default="stub")
+    parser.add_argument("--calls", type=int, default=100, help="Panggilan per kasus")
+    parser.add_argument("--captions", type=int, default=5, help="Caption penuh per jalur")
+    parser.add_argument("--output", help="Tulis hasil JSON ke file ini (default: stdout)")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    payload = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(payload)
+    else:
+        print(payload)
+
+
+if __name__ == "__main__":
+    main()
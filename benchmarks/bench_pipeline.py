@@ -0,0 +1,257 @@
+# benchmarks/bench_pipeline.py
+"""Micro-benchmark per tahap pipeline ImageCaptionService.
+
+Contoh:
+    python -m benchmarks.bench_pipeline --models stub --output bench_stub.json
+    python -m benchmarks.bench_pipeline --models both --sizes 640x480,1920x1080
+    python -m benchmarks.bench_pipeline --compare bench_old.json bench_new.json
+
+Setiap tahap diukur terpisah (decode, preprocess, feature_extraction,
+caption_decode, categorization, bleu, file_organization, excel, zip) untuk
+gambar di assets/ dan gambar sintetis berbagai ukuran. Hasil ditulis sebagai
+JSON supaya run yang berbeda bisa dibandingkan.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+from PIL import Image
+
+from src.app.config.settings import BASE_DIR
+
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.dirname(BASE_DIR)), "assets")
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".bmp", ".tiff", ".webp"}
+DEFAULT_SIZES = "224x224,640x480,1920x1080,4032x3024"
+STAGES = [
+    "decode",
+    "preprocess",
+    "feature_extraction",
+    "caption_decode",
+    "categorization",
+    "bleu",
+    "file_organization",
+    "excel",
+    "zip",
+]
+
+
+def _summarize(samples):
+    samples_ms = sorted(s * 1000.0 for s in samples)
+    n = len(samples_ms)
+    p95_index = min(n - 1, int(round(0.95 * (n - 1))))
+    return {
+        "n": n,
+        "mean_ms": round(statistics.fmean(samples_ms), 3),
+        "p50_ms": round(statistics.median(samples_ms), 3),
+        "p95_ms": round(samples_ms[p95_index], 3),
+        "min_ms": round(samples_ms[0], 3),
+        "max_ms": round(samples_ms[-1], 3),
+    }
+
+
+def _timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def _asset_images(assets_dir):
+    if not os.path.isdir(assets_dir):
+        return []
+    return sorted(
+        os.path.join(assets_dir, name)
+        for name in os.listdir(assets_dir)
+        if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+    )
+
+
+def _synthetic_images(target_dir, sizes, count, seed=0):
+    """Buat JPEG sintetis (gradien + noise) agar ukuran file mendekati foto asli."""
+    rng = np.random.default_rng(seed)
+    groups = {}
+    for width, height in sizes:
+        paths = []
+        for i in range(count):
+            x = np.linspace(0, 255, width, dtype=np.float32)[None, :, None]
+            y = np.linspace(0, 255, height, dtype=np.float32)[:, None, None]
+            base = (x * 0.5 + y * 0.5 + rng.uniform(0, 255, size=(1, 1, 3))) % 256
+            noise = rng.normal(0, 20, size=(height, width, 3))
+            pixels = np.clip(base + noise, 0, 255).astype(np.uint8)
+            path = os.path.join(target_dir, f"synthetic_{width}x{height}_{i}.jpg")
+            Image.fromarray(pixels).save(path, quality=90)
+            paths.append(path)
+        groups[f"synthetic-{width}x{height}"] = paths
+    return groups
+
+
+def _build_service(models):
+    from src.app.services.ImageCaptionService import ImageCaptionService
+
+    if models == "stub":
+        from benchmarks.stub_models import build_stub_components
+
+        model, tokenizer, feature_extractor = build_stub_components()
+        return ImageCaptionService.from_components(model, tokenizer, feature_extractor)
+    ImageCaptionService._instance = None
+    return ImageCaptionService()
+
+
+def bench_group(service, paths, repeat, work_dir):
+    """Ukur semua tahap untuk satu kelompok gambar, kembalikan {stage: [detik, ...]}."""
+    timings = {stage: [] for stage in STAGES}
+    for r in range(repeat):
+        output_dir = os.path.join(work_dir, f"out_{r}")
+        processed_dir = os.path.join(work_dir, f"processed_{r}")
+        os.makedirs(output_dir, exist_ok=True)
+        rows = []
+        for path in paths:
+            filename = os.path.basename(path)
+            img, t = _timed(service._decode_image, path)
+            timings["decode"].append(t)
+            img_array, t = _timed(service._prepare_input, img)
+            timings["preprocess"].append(t)
+            features, t = _timed(service._extract_features, img_array)
+            timings["feature_extraction"].append(t)
+            caption, t = _timed(service._generate_caption, features)
+            timings["caption_decode"].append(t)
+            (category, score), t = _timed(service.categorize_image_by_cosine, caption)
+            timings["categorization"].append(t)
+            bleu, t = _timed(service._compute_bleu_score, caption, category)
+            timings["bleu"].append(t)
+            image_path, t = _timed(service._organize_image, path, filename, category, output_dir, processed_dir)
+            timings["file_organization"].append(t)
+            rows.append({
+                "filename": filename,
+                "caption": caption,
+                "category": category,
+                "cosine_similarity": round(float(score), 4),
+                "bleu_score": round(float(bleu), 4),
+                "image_path": image_path,
+            })
+        _, t = _timed(service._generate_excel, rows, output_dir)
+        timings["excel"].append(t)
+        _, t = _timed(service._generate_zip, output_dir)
+        timings["zip"].append(t)
+    return timings
+
+
+def _warmup(service, path):
+    img = service._decode_image(path)
+    features = service._extract_features(service._prepare_input(img))
+    service._generate_caption(features)
+
+
+def run(args):
+    sizes = [tuple(int(v) for v in size.lower().split("x")) for size in args.sizes.split(",") if size]
+    models_to_run = ["stub", "real"] if args.models == "both" else [args.models]
+    results = []
+    skipped = []
+
+    with tempfile.TemporaryDirectory(prefix="bench_pipeline_") as tmp:
+        groups = {}
+        assets = _asset_images(args.assets)
+        if assets:
+            groups["assets"] = assets
+        groups.update(_synthetic_images(tmp, sizes, args.synthetic_count))
+
+        for models in models_to_run:
+            try:
+                service = _build_service(models)
+            except (FileNotFoundError, OSError, ValueError) as e:
+                skipped.append({"models": models, "reason": str(e)})
+                print(f"[skip] models={models}: {e}", file=sys.stderr)
+                continue
+            # basicConfig di service meng-set level INFO saat import; turunkan lagi di sini.
+            logging.getLogger().setLevel(args.log_level)
+
+            first_path = next(iter(groups.values()))[0]
+            _warmup(service, first_path)
+
+            for group, paths in groups.items():
+                work_dir = os.path.join(tmp, f"work_{models}_{group}")
+                os.makedirs(work_dir, exist_ok=True)
+                timings = bench_group(service, paths, args.repeat, work_dir)
+                for stage in STAGES:
+                    entry = {"models": models, "input": group, "stage": stage}
+                    entry.update(_summarize(timings[stage]))
+                    results.append(entry)
+                    print(f"{models:5s} {group:24s} {stage:20s} p50={entry['p50_ms']:10.3f}ms p95={entry['p95_ms']:10.3f}ms", file=sys.stderr)
+
+    return {"meta": _meta(args), "results": results, "skipped": skipped}
+
+
+def _meta(args):
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=False
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+    import tensorflow as tf
+
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "tensorflow": tf.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "repeat": args.repeat,
+        "sizes": args.sizes,
+        "synthetic_count": args.synthetic_count,
+    }
+
+
+def compare(baseline_path, candidate_path):
+    """Cetak rasio p50 kandidat terhadap baseline untuk setiap (models, input, stage)."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    with open(candidate_path) as f:
+        candidate = json.load(f)
+    base_index = {(r["models"], r["input"], r["stage"]): r for r in baseline["results"]}
+    print(f"{'models':6s} {'input':24s} {'stage':20s} {'base p50':>12s} {'new p50':>12s} {'ratio':>8s}")
+    for r in candidate["results"]:
+        key = (r["models"], r["input"], r["stage"])
+        if key not in base_index:
+            continue
+        base_p50 = base_index[key]["p50_ms"]
+        ratio = r["p50_ms"] / base_p50 if base_p50 else float("inf")
+        print(f"{key[0]:6s} {key[1]:24s} {key[2]:20s} {base_p50:12.3f} {r['p50_ms']:12.3f} {ratio:8.2f}x")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-stage benchmark for ImageCaptionService")
+    parser.add_argument("--models", choices=["stub", "real", "both"], default="stub")
+    parser.add_argument("--assets", default=ASSETS_DIR, help="Folder gambar contoh (default: assets/)")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="Ukuran gambar sintetis, mis. 640x480,1920x1080")
+    parser.add_argument("--synthetic-count", type=int, default=3, help="Jumlah gambar sintetis per ukuran")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--output", help="Tulis hasil JSON ke file ini (default: stdout)")
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CANDIDATE"), help="Bandingkan dua file hasil")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    report = run(args)
+    payload = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(payload)
+    else:
+        print(payload)
+
+
+if __name__ == "__main__":
+    main()
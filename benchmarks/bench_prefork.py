@@ -0,0 +1,93 @@
+# benchmarks/bench_prefork.py
+"""Startup time dan memori N worker: fork dengan preload vs fork tanpa preload.
+
+Contoh:
+    python -m benchmarks.bench_prefork --workers 1,2,4
+    python -m benchmarks.bench_prefork --models real --workers 2 --output bench_prefork.json
+
+Tiap konfigurasi dijalankan di proses Python baru (induk tanpa TensorFlow untuk mode cold):
+  cold     induk tidak memuat apa pun; tiap worker import TF/Keras dan memuat model sendiri,
+           setara dengan `uvicorn --workers N`
+  preload  induk menjalankan preload_service() (import + tokenizer) lalu fork, seperti `cli serve`
+Dilaporkan per konfigurasi: waktu sampai semua worker siap, PSS total, dan memori privat per worker.
+"""
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+
+
+def _target(models):
+    def target(ready):
+        if models == "stub":
+            from benchmarks.stub_models import build_stub_components
+            from src.app.services.ImageCaptionService import ImageCaptionService
+
+            ImageCaptionService.from_components(*build_stub_components())
+        else:
+            from src.app.services.ServiceFactory import ServiceFactory
+
+            ServiceFactory.get_image_caption_service()
+        ready()
+        signal.pause()
+    return target
+
+
+def run_one(mode, workers, models):
+    from src.app.services.Prefork import PreforkSupervisor, preload_service
+
+    def on_ready(report):
+        print(json.dumps(report), flush=True)
+        os.kill(os.getpid(), signal.SIGTERM)
+
+    PreforkSupervisor(workers, _target(models), preload=preload_service if mode == "preload" else None,
+                      respawn=False, on_ready=on_ready).run()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prefork startup time and per-worker memory")
+    parser.add_argument("--models", choices=["stub", "real"], default="stub")
+    parser.add_argument("--workers", default="1,2,4", help="Daftar jumlah worker, dipisah koma")
+    parser.add_argument("--modes", default="cold,preload")
+    parser.add_argument("--output", help="Tulis hasil JSON ke file ini (default: stdout)")
+    parser.add_argument("--run-one", nargs=2, metavar=("MODE", "WORKERS"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.run_one:
+        run_one(args.run_one[0], int(args.run_one[1]), args.models)
+        return
+
+    results = []
+    for workers in [int(n) for n in args.workers.split(",")]:
+        for mode in args.modes.split(","):
+            proc = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_prefork", "--models", args.models, "--run-one", mode, str(workers)],
+                capture_output=True, text=True, check=True,
+            )
+            report = json.loads(proc.stdout.strip().splitlines()[-1])
+            entry = {
+                "mode": mode,
+                "workers": workers,
+                "startup_s": report["startup_s"],
+                "preload_s": report["preload_s"],
+                "total_pss_mb": report["total_pss_mb"],
+                "mean_private_mb": report["mean_private_mb"],
+                "mean_ready_s": round(sum(w["ready_s"] for w in report["per_worker"]) / workers, 3),
+            }
+            results.append(entry)
+            print(f"{mode:8s} workers={workers} startup={entry['startup_s']:7.2f}s "
+                  f"total_pss={entry['total_pss_mb']:8.1f}MB private/worker={entry['mean_private_mb']:7.1f}MB",
+                  file=sys.stderr)
+
+    payload = json.dumps({"models": args.models, "cpu_count": os.cpu_count(), "results": results}, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(payload)
+    else:
+        print(payload)
+
+
+if __name__ == "__main__":
+    main()
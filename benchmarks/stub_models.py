@@ -0,0 +1,10 @@
+# benchmarks/stub_models.py
+"""Model stub dipindah ke src/app/services/StubModels.py (dipakai juga oleh `tune --models stub`)."""
+from src.app.services.StubModels import (
+    FEATURE_DIM,
+    MAX_LENGTH,
+    build_stub_caption_model,
+    build_stub_components,
+    build_stub_feature_extractor,
+    build_stub_tokenizer,
+)
@@ -1,9 +1,295 @@
+import json
+
 import click
 
-@click.command()
+
+@click.group()
+def cli():
+    """Image foldering tools: API server and offline batch processing."""
+
+
+@cli.command("run-server")
 def run_server():
     import uvicorn
     uvicorn.run("main:app", host="127.0.0.1", port=8000, reload=True)
 
+
+@cli.command()
+@click.option("--workers", "-w", default=1, show_default=True,
+              help="Server processes forked from one parent (more than 1 needs JOB_QUEUE_BACKEND=sqlite).")
+@click.option("--host", default="127.0.0.1", show_default=True)
+@click.option("--port", default=8000, show_default=True)
+@click.option("--threads", type=int, default=None, help="TF CPU threads per worker (default: CPUs / workers).")
+@click.option("--report", "report_path", type=click.Path(dir_okay=False), default=None,
+              help="Also write the startup/memory report JSON to this file.")
+def serve(workers, host, port, threads, report_path):
+    """Serve the API from pre-forked workers sharing one listening socket.
+
+    The parent imports TensorFlow/Keras and the app code and loads the tokenizer once,
+    then forks; each worker loads the models and serves. Once all workers are ready,
+    per-worker RSS/PSS/private memory and the startup time are logged and printed.
+    With several workers, task state must live in the job queue: inline tasks exist only
+    in the worker that accepted the upload, and other workers would answer "Task not found".
+    """
+    import socket
+
+    import uvicorn
+
+    from src.app.config import settings
+    from src.app.services.Prefork import PreforkSupervisor, configure_worker_threads, intra_op_threads, preload_service
+
+    if workers > 1 and settings.JOB_QUEUE_BACKEND == "inline":
+        raise click.ClickException(
+            "--workers > 1 needs JOB_QUEUE_BACKEND=sqlite (and `worker` processes): with inline jobs, progress, "
+            "cancel and results of a task are only known to the worker that accepted its upload"
+        )
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    threads = threads or intra_op_threads(workers)
+
+    def target(ready):
+        configure_worker_threads(threads)
+        from src.main import app  # memuat model lewat controller
+
+        ready()
+        uvicorn.Server(uvicorn.Config(app, log_level="info")).run(sockets=[sock])
+
+    _run_supervisor(PreforkSupervisor(workers, target, preload=preload_service, on_ready=_report_writer(report_path)))
+
+
+def _run_supervisor(supervisor):
+    try:
+        supervisor.run()
+    except RuntimeError as e:
+        raise click.ClickException(str(e))
+
+
+def _report_writer(report_path):
+    def write(report):
+        payload = json.dumps(report, indent=2)
+        click.echo(payload)
+        if report_path:
+            with open(report_path, "w") as f:
+                f.write(payload)
+    return write
+
+
+@cli.command()
+@click.argument("input_dir", type=click.Path(exists=True, file_okay=False))
+@click.argument("output_dir", type=click.Path(file_okay=False))
+@click.option("--workers", "-j", default=1, show_default=True, help="Images processed in parallel.")
+@click.option("--link-mode", type=click.Choice(["copy", "hardlink", "symlink", "none"]), default="copy",
+              show_default=True, help="How images are placed in OUTPUT_DIR/<category>/.")
+@click.option("--resume/--no-resume", default=True, show_default=True,
+              help="Skip files already processed (same path, size and mtime) in OUTPUT_DIR/results.jsonl.")
+@click.option("--fast-mode", is_flag=True, help="Let the feature-space classifier decide confident images.")
+@click.option("--index/--no-index", "index_embeddings", default=None,
+              help="Add embeddings to the similar-image index (default: EMBEDDING_INDEX_ENABLED).")
+def batch(input_dir, output_dir, workers, link_mode, resume, fast_mode, index_embeddings):
+    """Categorize every image under INPUT_DIR without going through the HTTP API.
+
+    Writes OUTPUT_DIR/results.jsonl, OUTPUT_DIR/results.csv and an organized
+    OUTPUT_DIR/<category>/<relative path> tree.
+    """
+    from src.app.config.settings import EMBEDDING_INDEX_ENABLED
+    from src.app.services.BatchRunner import BatchRunner
+    from src.app.services.ServiceFactory import ServiceFactory
+
+    runner = BatchRunner(
+        ServiceFactory.get_image_caption_service(),
+        output_dir,
+        workers=workers,
+        link_mode=link_mode,
+        resume=resume,
+        fast_mode=fast_mode,
+        index_embeddings=EMBEDDING_INDEX_ENABLED if index_embeddings is None else index_embeddings,
+    )
+    summary = runner.run(input_dir)
+    click.echo(json.dumps(summary, indent=2))
+
+
+@cli.command()
+@click.argument("input_dirs", nargs=-1, type=click.Path(exists=True, file_okay=False))
+@click.option("--output", "output_dir", type=click.Path(file_okay=False), default=None,
+              help="Output root (default: WATCH_OUTPUT_DIR). With several inputs each gets OUTPUT/<dir name>.")
+@click.option("--workers", "-j", default=1, show_default=True, help="Images processed in parallel.")
+@click.option("--link-mode", type=click.Choice(["copy", "hardlink", "symlink", "none"]), default="copy",
+              show_default=True, help="How images are placed in the output tree.")
+@click.option("--interval", type=float, default=None, help="Seconds between scans (default: WATCH_POLL_INTERVAL).")
+@click.option("--batch-size", type=int, default=None, help="Images per micro-batch (default: WATCH_BATCH_SIZE).")
+@click.option("--fast-mode", is_flag=True, help="Let the feature-space classifier decide confident images.")
+@click.option("--once", is_flag=True, help="Scan twice (to let files settle), process, and exit.")
+def watch(input_dirs, output_dir, workers, link_mode, interval, batch_size, fast_mode, once):
+    """Watch INPUT_DIRS (default: WATCH_DIRS) and process new or changed images as they arrive."""
+    import os
+    import signal
+    import threading
+
+    from src.app.config import settings
+    from src.app.services.BatchRunner import BatchRunner
+    from src.app.services.FolderWatcher import FolderWatcher
+    from src.app.services.ServiceFactory import ServiceFactory
+
+    input_dirs = list(input_dirs) or settings.WATCH_DIRS
+    if not input_dirs:
+        raise click.UsageError("Give at least one directory or set WATCH_DIRS")
+    output_dir = output_dir or settings.WATCH_OUTPUT_DIR
+    service = ServiceFactory.get_image_caption_service()
+    runners = []
+    for input_dir in input_dirs:
+        target = output_dir if len(input_dirs) == 1 else os.path.join(output_dir, os.path.basename(os.path.abspath(input_dir)))
+        runner = BatchRunner(service, target, workers=workers, link_mode=link_mode, fast_mode=fast_mode)
+        runners.append((runner, input_dir))
+
+    watcher = FolderWatcher(
+        runners,
+        poll_interval=settings.WATCH_POLL_INTERVAL if interval is None else interval,
+        settle_seconds=0 if once else settings.WATCH_SETTLE_SECONDS,
+        batch_size=batch_size or settings.WATCH_BATCH_SIZE,
+    )
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+    try:
+        stats = watcher.run(stop_event, max_polls=2 if once else None)
+    except KeyboardInterrupt:
+        watcher.flush()
+        stats = watcher.stats
+    click.echo(json.dumps(stats, indent=2))
+
+
+@cli.command()
+@click.option("--queue", "queue_path", type=click.Path(dir_okay=False), default=None,
+              help="SQLite job queue file (default: JOB_QUEUE_PATH).")
+@click.option("--worker-id", default=None, help="Name reported in the queue (default: host-pid-random).")
+@click.option("--max-jobs", type=int, default=None, help="Exit after this many jobs.")
+@click.option("--burst", is_flag=True, help="Exit as soon as the queue is empty.")
+@click.option("--processes", "-p", default=1, show_default=True,
+              help="Worker processes forked from one parent (see `serve`).")
+@click.option("--threads", type=int, default=None, help="TF CPU threads per process (default: CPUs / processes).")
+def worker(queue_path, worker_id, max_jobs, burst, processes, threads):
+    """Run queued upload jobs (API started with JOB_QUEUE_BACKEND=sqlite).
+
+    Start as many workers as needed, on this host or on others sharing the queue file,
+    JOB_SPOOL_DIR and the output directories. SIGTERM finishes the current job first.
+    """
+    import os
+    import signal
+    import threading
+
+    from src.app.config import settings
+    from src.app.services.JobQueue import SQLiteJobQueue
+    from src.app.services.JobWorker import JobWorker
+    from src.app.services.ServiceFactory import ServiceFactory
+
+    queue = SQLiteJobQueue(queue_path or settings.JOB_QUEUE_PATH)
+
+    def run_worker(ready=None):
+        job_worker = JobWorker(queue, ServiceFactory.get_image_caption_service(),
+                               worker_id=f"{worker_id}-{os.getpid()}" if worker_id and processes > 1 else worker_id)
+        if ready is not None:
+            ready()
+        stop_event = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+        try:
+            stats = job_worker.run(stop_event, max_jobs=max_jobs, burst=burst)
+        except KeyboardInterrupt:
+            stats = job_worker.stats
+        click.echo(json.dumps(stats, indent=2))
+
+    if processes == 1:
+        run_worker()
+        return
+
+    from src.app.services.Prefork import PreforkSupervisor, configure_worker_threads, intra_op_threads, preload_service
+
+    def target(ready):
+        configure_worker_threads(threads or intra_op_threads(processes))
+        run_worker(ready)
+
+    # --burst/--max-jobs: proses yang selesai tidak di-fork ulang
+    respawn = not burst and max_jobs is None
+    _run_supervisor(PreforkSupervisor(processes, target, preload=preload_service, respawn=respawn,
+                                      on_ready=_report_writer(None)))
+
+
+def _int_list(value):
+    return [int(n) for n in value.split(",") if n.strip()]
+
+
+@cli.command()
+@click.option("--images", "images_dir", type=click.Path(exists=True, file_okay=False), default="assets",
+              show_default=True, help="Sample images to measure with.")
+@click.option("--count", default=32, show_default=True, help="Images per measurement (samples are repeated).")
+@click.option("--models", type=click.Choice(["real", "stub"]), default="real", show_default=True)
+@click.option("--threads", default=None, help="Intra-op thread counts to try (default: 1,CPUs/2,CPUs).")
+@click.option("--inter-op", default="1,2", show_default=True, help="Inter-op thread counts to try.")
+@click.option("--batch-sizes", default="1,4,8", show_default=True, help="Feature and caption batch sizes to try.")
+@click.option("--decode-workers", default="1,2", show_default=True, help="Image decode thread counts to try.")
+@click.option("--max-p95-ms", type=float, default=None, help="Only pick configurations with p95 latency under this.")
+@click.option("--output", type=click.Path(dir_okay=False), default=None,
+              help="Profile file to write (default: RUNTIME_PROFILE_PATH).")
+@click.option("--trial", nargs=2, type=int, default=None, hidden=True)
+def tune(images_dir, count, models, threads, inter_op, batch_sizes, decode_workers, max_p95_ms, output, trial):
+    """Measure throughput and p95 latency per configuration and write the fastest as runtime profile.
+
+    Each TF thread setting runs in a fresh process (thread pools are fixed once TF starts);
+    inside it every feature batch x caption batch x decode worker combination is measured.
+    The API, `batch`, `watch` and `worker` load the profile at startup.
+    """
+    import os
+
+    from src.app.config import settings
+    from src.app.services import Autotuner
+    from src.app.services.RuntimeProfile import save_runtime_profile
+
+    paths = Autotuner.sample_images(images_dir, count)
+    if trial:
+        results = Autotuner.run_trial(models, paths, trial[0], trial[1], _int_list(batch_sizes),
+                                      _int_list(decode_workers))
+        click.echo(json.dumps(results))
+        return
+
+    cpus = os.cpu_count() or 1
+    intra_candidates = _int_list(threads) if threads else sorted({1, max(1, cpus // 2), cpus})
+    thread_configs = [(intra, inter) for intra in intra_candidates for inter in _int_list(inter_op)]
+    try:
+        profile, _ = Autotuner.tune(models, images_dir, count, thread_configs, _int_list(batch_sizes),
+                                    _int_list(decode_workers), max_p95_ms=max_p95_ms, echo=click.echo)
+    except RuntimeError as e:
+        raise click.ClickException(str(e))
+    output = output or settings.RUNTIME_PROFILE_PATH
+    save_runtime_profile(profile, output)
+    click.echo(json.dumps(profile.model_dump(), indent=2))
+    click.echo(f"Runtime profile written to {output}")
+
+
+@cli.command("reindex-captions")
+@click.option("--output-dir", type=click.Path(exists=True, file_okay=False), default=None,
+              help="Task result root holding <task_id>/results.jsonl (default: OUTPUT_DIR).")
+def reindex_captions(output_dir):
+    """Add results of jobs missing from the caption search store (e.g. run before it existed)."""
+    import os
+
+    from src.app.config import settings
+    from src.app.services.CaptionStore import get_caption_store
+    from src.app.services.ResultSpill import RESULTS_FILENAME
+    from src.app.services.TaskArtifacts import task_dir
+
+    output_dir = output_dir or settings.OUTPUT_DIR
+    store = get_caption_store()
+    imported = 0
+    for name in sorted(os.listdir(output_dir)):
+        path = os.path.join(output_dir, name, RESULTS_FILENAME)
+        if task_dir(name) is None or not os.path.isfile(path) or store.has_task(name):
+            continue
+        rows = store.import_results(name, path)
+        imported += rows
+        click.echo(f"{name}: {rows} rows")
+    click.echo(f"Imported {imported} rows into {store.path}")
+
+
 if __name__ == "__main__":
-    run_server()
\ No newline at end of file
+    cli()
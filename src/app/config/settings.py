@@ -7,6 +7,113 @@ UPLOAD_DIR = os.path.join(BASE_DIR, "uploads")
 OUTPUT_DIR = os.path.join(BASE_DIR, "folderisasi")
 PROCESSED_IMAGES_DIR = os.path.join(BASE_DIR, "processed_images")  # Direktori baru untuk menyimpan gambar hasil
 
+# Logging: JSON per baris lewat antrean ke satu thread penulis; log detail per gambar hanya sampel
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()  # "json" atau "text"
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_IMAGE_SAMPLE_RATE = float(os.getenv("LOG_IMAGE_SAMPLE_RATE", "0.01"))  # 1 = setiap gambar, 0 = tidak ada
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))  # record yang menunggu ditulis; penuh = dibuang
+
+# Jumlah maksimum timing per-gambar yang disimpan di trace task (reservoir sampling untuk job besar)
+TRACE_MAX_IMAGE_SAMPLES = int(os.getenv("TRACE_MAX_IMAGE_SAMPLES", "500"))
+
+# Profiling on-demand lewat /v1/admin/profile (cProfile + tracemalloc); mati secara default
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(BASE_DIR, "profiles"))
+PROFILE_MAX_IMAGES = int(os.getenv("PROFILE_MAX_IMAGES", "100"))  # batas N gambar per sesi
+PROFILE_KEEP_SESSIONS = int(os.getenv("PROFILE_KEEP_SESSIONS", "20"))  # sesi lama (dan artefaknya) dihapus
+PROFILE_TRACEMALLOC_FRAMES = int(os.getenv("PROFILE_TRACEMALLOC_FRAMES", "10"))
+
+# Deteksi gambar hampir-duplikat (burst shot, kiriman ulang WhatsApp) dalam satu job
+# Mati secara default: duplikat memakai ulang caption gambar pertama, jadi hasil klien lama berubah
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "false").lower() == "true"
+DEDUP_HASH_THRESHOLD = int(os.getenv("DEDUP_HASH_THRESHOLD", "4"))  # jarak Hamming maksimum dHash 64-bit (0-7)
+DEDUP_CONFIRM_WITH_FEATURES = os.getenv("DEDUP_CONFIRM_WITH_FEATURES", "true").lower() == "true"
+DEDUP_FEATURE_MAX_DISTANCE = float(os.getenv("DEDUP_FEATURE_MAX_DISTANCE", "0.05"))  # jarak cosine fitur ResNet50
+
+# Indeks embedding ResNet50 untuk pencarian gambar serupa
+EMBEDDING_INDEX_ENABLED = os.getenv("EMBEDDING_INDEX_ENABLED", "true").lower() == "true"
+EMBEDDING_INDEX_DIR = os.getenv("EMBEDDING_INDEX_DIR", os.path.join(BASE_DIR, "embedding_index"))
+EMBEDDING_DIM = 2048
+EMBEDDING_DTYPE = os.getenv("EMBEDDING_DTYPE", "float16")  # float16 atau float32
+EMBEDDING_SKETCH_DIM = int(os.getenv("EMBEDDING_SKETCH_DIM", "64"))  # dimensi PCA untuk scan kasar
+EMBEDDING_PCA_TRAIN_ROWS = int(os.getenv("EMBEDDING_PCA_TRAIN_ROWS", "2048"))  # di bawah ini scan exact
+EMBEDDING_RERANK_CANDIDATES = int(os.getenv("EMBEDDING_RERANK_CANDIDATES", "512"))
+
+# Riwayat caption semua job (SQLite + FTS5) untuk /v1/search
+CAPTION_STORE_ENABLED = os.getenv("CAPTION_STORE_ENABLED", "true").lower() == "true"
+CAPTION_STORE_PATH = os.getenv("CAPTION_STORE_PATH", os.path.join(BASE_DIR, "caption_store", "captions.sqlite3"))
+CAPTION_STORE_BATCH = int(os.getenv("CAPTION_STORE_BATCH", "500"))  # baris per transaksi tulis
+
+# Upload arsip ZIP/tar ke /v1/upload-folder: batas ukuran per member (dibaca ke memori, bukan diekstrak)
+ARCHIVE_MAX_MEMBER_BYTES = int(os.getenv("ARCHIVE_MAX_MEMBER_BYTES", str(64 * 1024 * 1024)))
+# Baris hasil per gambar dicatat ke results.jsonl; respons API hanya memuat sebanyak ini (sisanya di Excel/ZIP)
+RESULT_INLINE_ROWS = int(os.getenv("RESULT_INLINE_ROWS", "5000"))
+
+# Watch mode (CLI `watch`): direktori dipantau dengan polling, dipisah os.pathsep
+WATCH_DIRS = [d for d in os.getenv("WATCH_DIRS", "").split(os.pathsep) if d]
+WATCH_OUTPUT_DIR = os.getenv("WATCH_OUTPUT_DIR", os.path.join(BASE_DIR, "watch_output"))
+WATCH_POLL_INTERVAL = float(os.getenv("WATCH_POLL_INTERVAL", "10"))  # detik antar scan
+WATCH_SETTLE_SECONDS = float(os.getenv("WATCH_SETTLE_SECONDS", "5"))  # umur minimum file sebelum diproses
+WATCH_BATCH_SIZE = int(os.getenv("WATCH_BATCH_SIZE", "32"))
+WATCH_CSV_INTERVAL = float(os.getenv("WATCH_CSV_INTERVAL", "60"))  # rebuild results.csv paling sering tiap N detik
+
+# Jalankan model lewat tf.function dengan input_signature tetap (false = Keras predict per panggilan)
+COMPILED_INFERENCE = os.getenv("COMPILED_INFERENCE", "true").lower() == "true"
+# Residensi model: backbone tanpa head klasifikasi, presisi bobot, dan unload saat idle
+FEATURE_BACKBONE = os.getenv("FEATURE_BACKBONE", "headless")  # headless (include_top=False + avg pooling) atau full
+MODEL_PRECISION = os.getenv("MODEL_PRECISION", "float32")  # float32 atau float16 (bobot separuh, lebih lambat di CPU)
+MODEL_IDLE_UNLOAD_SECONDS = float(os.getenv("MODEL_IDLE_UNLOAD_SECONDS", "0"))  # 0 = model selalu dimuat
+# Profil runtime hasil `cli tune` (thread TF, ukuran batch, worker decode); tidak ada file = default
+RUNTIME_PROFILE_PATH = os.getenv("RUNTIME_PROFILE_PATH", os.path.join(BASE_DIR, "runtime_profile.json"))
+
+# Tag model fitur yang diterima /v1/upload-features (vektor dari perangkat); harus cocok dengan backbone di atas
+FEATURE_MODEL_VERSION = os.getenv("FEATURE_MODEL_VERSION", "resnet50-imagenet-avgpool")
+
+# Mode cepat: classifier centroid pada fitur ResNet50 sebelum decoding caption
+CLASSIFIER_PATH = os.getenv("CLASSIFIER_PATH", os.path.join(EMBEDDING_INDEX_DIR, "category_centroids.npz"))
+FAST_MODE_TARGET_PRECISION = float(os.getenv("FAST_MODE_TARGET_PRECISION", "0.95"))  # kalibrasi ambang confidence
+FAST_MODE_TEMPERATURE = float(os.getenv("FAST_MODE_TEMPERATURE", "0.05"))  # softmax atas cosine ke centroid
+FAST_MODE_MIN_SAMPLES = int(os.getenv("FAST_MODE_MIN_SAMPLES", "50"))
+FAST_MODE_HOLDOUT = float(os.getenv("FAST_MODE_HOLDOUT", "0.2"))  # porsi baris untuk kalibrasi ambang, tidak ikut centroid
+FAST_MODE_AUDIT_RATE = float(os.getenv("FAST_MODE_AUDIT_RATE", "0.05"))  # porsi gambar yakin yang tetap di-caption
+
+# Antrean job: "inline" = thread penjadwal di proses API, "sqlite" = worker terpisah (CLI `worker`)
+JOB_QUEUE_BACKEND = os.getenv("JOB_QUEUE_BACKEND", "inline").lower()
+JOB_QUEUE_PATH = os.getenv("JOB_QUEUE_PATH", os.path.join(BASE_DIR, "jobs", "jobs.sqlite3"))
+JOB_SPOOL_DIR = os.getenv("JOB_SPOOL_DIR", os.path.join(BASE_DIR, "jobs", "spool"))  # upload menunggu worker
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))  # job dianggap yatim jika heartbeat berhenti selama ini
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))  # percobaan maksimum setelah worker mati
+WORKER_POLL_INTERVAL = float(os.getenv("WORKER_POLL_INTERVAL", "1.0"))  # detik tunggu saat antrean kosong
+# Hasil tiap job di folderisasi/<task_id>/ dan processed_images/<task_id>/ (false = mode lama: satu hasil,
+# semua direktori dikosongkan di awal setiap job)
+TASK_SCOPED_OUTPUT = os.getenv("TASK_SCOPED_OUTPUT", "true").lower() == "true"
+# Upload gambar diserahkan ke job lewat shared memory (tanpa spool di disk); worker antrean harus satu host dengan API
+SHM_HANDOFF = os.getenv("SHM_HANDOFF", "false").lower() == "true"
+SHM_HANDOFF_DECODED = os.getenv("SHM_HANDOFF_DECODED", "false").lower() == "true"  # API juga menyimpan tensor 224x224
+SHM_HANDOFF_MAX_MB = float(os.getenv("SHM_HANDOFF_MAX_MB", "512"))  # upload lebih besar tetap di-spool ke disk
+
+# Penjadwalan job inline: job kecil (upload-images <= INTERACTIVE_MAX_IMAGES) didahulukan dari job folder/arsip
+INTERACTIVE_MAX_IMAGES = int(os.getenv("INTERACTIVE_MAX_IMAGES", "50"))
+SCHEDULER_SLOTS = int(os.getenv("SCHEDULER_SLOTS", "2"))  # job inline yang berjalan bersamaan; job bulk maks SLOTS - 1
+
+# Admission control upload (0 = tanpa batas); di atas batas API membalas 429 + Retry-After
+ADMISSION_MAX_JOBS = int(os.getenv("ADMISSION_MAX_JOBS", "50"))  # job antre + berjalan
+ADMISSION_MAX_QUEUED_IMAGES = int(os.getenv("ADMISSION_MAX_QUEUED_IMAGES", "20000"))  # gambar dalam job yang belum selesai
+ADMISSION_MAX_UPLOAD_MB = float(os.getenv("ADMISSION_MAX_UPLOAD_MB", "4096"))  # upload sedang diterima + spool job belum selesai
+ADMISSION_RETRY_AFTER_DEFAULT = int(os.getenv("ADMISSION_RETRY_AFTER_DEFAULT", "30"))  # detik, sebelum throughput terukur
+ADMISSION_RETRY_AFTER_MAX = int(os.getenv("ADMISSION_RETRY_AFTER_MAX", "3600"))
+ADMISSION_THROUGHPUT_JOBS = int(os.getenv("ADMISSION_THROUGHPUT_JOBS", "20"))  # job selesai terakhir untuk mengukur gambar/detik
+
+# Retensi hasil task: kuota disk, umur maksimum, dan sapuan direktori sementara yatim
+RETENTION_QUOTA_MB = float(os.getenv("RETENTION_QUOTA_MB", "2048"))  # total folderisasi + processed_images
+RETENTION_MAX_AGE_HOURS = float(os.getenv("RETENTION_MAX_AGE_HOURS", "72"))  # sejak dibuat / terakhir diunduh
+RETENTION_SWEEP_INTERVAL = float(os.getenv("RETENTION_SWEEP_INTERVAL", "300"))  # detik antar sapuan
+RETENTION_ORPHAN_GRACE = float(os.getenv("RETENTION_ORPHAN_GRACE", "3600"))  # umur minimum spool/upload yatim (detik)
+RETENTION_LOCK_PATH = os.getenv("RETENTION_LOCK_PATH", os.path.join(BASE_DIR, ".retention.lock"))  # di luar direktori yang disapu / dikosongkan
+# Progress + trace task yang sudah selesai disimpan di memori proses API; dibuang saat sapuan retensi
+TASK_HISTORY_SECONDS = float(os.getenv("TASK_HISTORY_SECONDS", "3600"))
+TASK_HISTORY_MAX = int(os.getenv("TASK_HISTORY_MAX", "1000"))
+
 # Prioritas kategori (action-focused first, then people, animals, scenery, atmosphere)
 CATEGORY_PRIORITY = ["kegiatan", "manusia", "hewan", "pemandangan", "suasana"]
 
@@ -1,116 +1,197 @@
 from fastapi import UploadFile, File, HTTPException, BackgroundTasks
+from fastapi.responses import JSONResponse
 from src.app.services.ServiceFactory import ServiceFactory
-from src.app.models.ImageModel import ImageData, UploadResponse, ProcessingProgress
+from src.app.models.ImageModel import (
+    ProcessingProgress,
+    PartialResults,
+    CancelResponse,
+    AdmissionStats,
+    TaskArtifactInfo,
+    TaskArtifactList,
+    SimilarImagesResponse,
+    CaptionSearchResponse,
+    FastModeStatus,
+    MemoryStatus,
+    ProfileSession,
+    StorageStatus,
+    SweepResult,
+)
+from src.app.services.EmbeddingIndex import get_embedding_index
+from src.app.services.CaptionStore import get_caption_store
+from src.app.services.CategoryClassifier import category_classifier
+from src.app.services.JobQueue import get_job_queue, job_priority
+from src.app.services.JobWorker import build_upload_response, run_job
+from src.app.services.TaskScheduler import TaskCancelled, task_scheduler
+from src.app.services.AdmissionControl import AdmissionRejected, admission_control
 from src.app.services.ProgressTracker import progress_tracker
+from src.app.services.RetentionManager import retention_manager
+from src.app.services.ProfileCapture import profile_capture
+from src.app.services.ImageSources import count_archive, is_archive
+from src.app.services.FeatureVectors import check_model_version, load_vectors, parse_filenames
+from src.app.services.SharedUploads import MARKER_FILENAME as SHARED_MEMORY_MARKER, share_uploads
+from src.app.services.ResultSpill import RESULTS_FILENAME, ResultSpill
+from src.app.services.TaskArtifacts import (
+    CATEGORY_CACHE_DIR,
+    ZIP_FILENAME,
+    ZIP_MEDIA_TYPE,
+    Artifact,
+    categories,
+    category_artifact,
+    report_artifact,
+    task_dir,
+    zip_artifact,
+)
+from src.app.services.MetricsRegistry import UPLOAD_BYTES, UPLOAD_FILES
+from src.app.config.settings import (
+    CAPTION_STORE_ENABLED,
+    JOB_SPOOL_DIR,
+    OUTPUT_DIR,
+    SHM_HANDOFF,
+    SHM_HANDOFF_DECODED,
+    SHM_HANDOFF_MAX_MB,
+    TASK_SCOPED_OUTPUT,
+)
 import tempfile
 import os
 import shutil
-import asyncio
+import time
+from datetime import datetime
+from typing import List, Optional
+import uuid
+import zipfile
+from urllib.parse import quote
 
 class ImageFolderController:
     def __init__(self):
         self.service = ServiceFactory.get_image_caption_service()
 
-    async def process_images_background(self, files, task_id: str):
-        """Background task for processing images"""
+    def run_job_background(self, job_type: str, payload: dict, task_id: str):
+        """Scheduled task for a spooled upload when jobs run inline (JOB_QUEUE_BACKEND=inline)"""
+        admission_control.started(task_id)
+        start = time.perf_counter()
+        processed = 0
         try:
-            zip_path, image_data = self.service.process_images(files, task_id)
-            result = UploadResponse(
-                message="Images processed successfully",
-                zip_path=zip_path,
-                processed_count=len(files),
-                spreadsheet_data=image_data
-            )
+            result = run_job(self.service, job_type, payload, task_id, scoped=TASK_SCOPED_OUTPUT)
+            processed = result.processed_count
             progress_tracker.complete_task(task_id, result)
+        except TaskCancelled:
+            retention_manager.discard(task_id)
+            progress_tracker.complete_task(task_id, error="Task cancelled", cancelled=True)
         except Exception as e:
             progress_tracker.complete_task(task_id, error=str(e))
+        finally:
+            admission_control.finish(task_id, processed, time.perf_counter() - start)
+
+    @staticmethod
+    def _new_spool(task_id: str) -> str:
+        """Directory holding an upload until the job runs (shared with workers in queue mode).
+
+        Left-over spools of crashed jobs are removed by the retention sweeper.
+        """
+        spool_dir = os.path.join(JOB_SPOOL_DIR, task_id)
+        os.makedirs(spool_dir)
+        return spool_dir
 
-    async def process_folder_background(self, temp_dir: str, task_id: str):
-        """Background task for processing folder"""
+    @staticmethod
+    def _admit(images: int):
+        """Refuse a new job with 429 + Retry-After while the job or queued-image limit is reached"""
         try:
-            result_zip_path, processed_count, image_data = self.service.process_folder(temp_dir, task_id)
-            
-            if processed_count == 0:
-                progress_tracker.complete_task(task_id, error="No valid images found in the uploaded folder")
-                return
-
-            result = UploadResponse(
-                message="Folder processed successfully",
-                zip_path=result_zip_path,
-                processed_count=processed_count,
-                spreadsheet_data=image_data
-            )
-            progress_tracker.complete_task(task_id, result)
-        except Exception as e:
-            progress_tracker.complete_task(task_id, error=str(e))
+            admission_control.admit(images)
+        except AdmissionRejected as e:
+            raise HTTPException(status_code=e.status_code, detail=str(e), headers=e.headers)
+
+    @staticmethod
+    def _share_uploads(files: list[UploadFile], spool_dir: str) -> Optional[dict]:
+        """Hand the uploads to the job in shared memory instead of spool files (SHM_HANDOFF).
 
-    async def upload_and_process_images(self, files: list[UploadFile] = File(...), background_tasks: BackgroundTasks = None):
+        Returns the payload part {"shm", "files"}, or None to spool to disk (disabled, size
+        unknown or over SHM_HANDOFF_MAX_MB). The segment name is also written to the spool
+        directory so cancellation and the orphan sweep can free it.
+        """
+        if not SHM_HANDOFF or any(file.size is None for file in files):
+            return None
+        if sum(file.size for file in files) > SHM_HANDOFF_MAX_MB * 1024 * 1024:
+            return None
+        arena, entries = share_uploads(files, decode=SHM_HANDOFF_DECODED)
+        with open(os.path.join(spool_dir, SHARED_MEMORY_MARKER), "w") as f:
+            f.write(arena.name)
+        arena.detach()  # referensi diserahkan ke job
+        return {"shm": arena.name, "files": entries}
+
+    def _submit(self, task_type: str, job_type: str, payload: dict, task_id: str, images: int, size_bytes: int):
+        """Enqueue the job for worker processes, or schedule it on this process's task scheduler"""
+        priority = job_priority(job_type, payload)
+        queue = get_job_queue()
+        if queue is not None:
+            progress = progress_tracker.new_progress(task_type, task_id, priority)
+            queue.enqueue(task_id, job_type, payload, progress.model_dump_json(), priority, images, size_bytes)
+            return {"task_id": task_id, "message": "Processing queued"}
+        progress_tracker.create_task(task_type, task_id, priority)
+        admission_control.register(task_id, images, size_bytes)
+        task_scheduler.submit(task_id, priority, lambda: self.run_job_background(job_type, payload, task_id))
+        return {"task_id": task_id, "message": "Processing started"}
+
+    async def upload_and_process_images(self, files: list[UploadFile] = File(...), background_tasks: BackgroundTasks = None, fast_mode: bool = False):
         """Upload and process images with optional progress tracking"""
         if not files:
             raise HTTPException(status_code=400, detail="No files uploaded")
+        self._record_upload("upload-images", files)
 
         # If background_tasks is provided, use asynchronous processing with progress tracking
         if background_tasks:
-            # Create task
-            task_id = progress_tracker.create_task("image_processing")
-            
-            # Save files to temporary storage (since background task needs access)
-            temp_files = []
-            for file in files:
-                temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file.filename)[1])
-                content = await file.read()
-                temp_file.write(content)
-                temp_file.close()
-                
-                # Create a mock file object with the temp path
-                class TempFile:
-                    def __init__(self, path, filename):
-                        self.path = path
-                        self.filename = filename
-                        
-                    @property
-                    def file(self):
-                        return open(self.path, 'rb')
-                
-                temp_files.append(TempFile(temp_file.name, file.filename))
+            self._admit(len(files))
+            task_id = str(uuid.uuid4())
+            spool_dir = self._new_spool(task_id)
 
-            # Start background processing
-            background_tasks.add_task(self.process_images_background, temp_files, task_id)
-            return {"task_id": task_id, "message": "Processing started"}
+            payload = self._share_uploads(files, spool_dir)
+            if payload is None:
+                # Save files to the spool (the upload is closed once the response is sent)
+                spooled = []
+                for n, file in enumerate(files):
+                    path = os.path.join(spool_dir, f"{n:06d}{os.path.splitext(file.filename)[1]}")
+                    with open(path, "wb") as f:
+                        shutil.copyfileobj(file.file, f)
+                    spooled.append({"path": path, "filename": file.filename})
+                payload = {"files": spooled}
+            payload.update(fast_mode=fast_mode, spool_dir=spool_dir)
+            return self._submit("image_processing", "images", payload, task_id, len(files), self._upload_size(files))
         
         # Otherwise, use synchronous processing
         else:
-            zip_path, image_data = self.service.process_images(files)
-            return UploadResponse(
-                message="Images processed successfully", 
-                zip_path=zip_path,
-                processed_count=len(files),
-                spreadsheet_data=image_data
-            )
+            zip_path, image_data = self.service.process_images(files, fast_mode=fast_mode)
+            return build_upload_response("Images processed successfully", zip_path, len(files), image_data)
 
-    async def upload_and_process_folder(self, files: list[UploadFile] = File(...), background_tasks: BackgroundTasks = None):
+    async def upload_and_process_folder(self, files: list[UploadFile] = File(...), background_tasks: BackgroundTasks = None, fast_mode: bool = False):
         """Upload and process folder with optional progress tracking"""
         if not files:
             raise HTTPException(status_code=400, detail="No files uploaded")
+        self._record_upload("upload-folder", files)
+
+        archives = [file for file in files if is_archive(file.filename)]
+        if archives:
+            if len(files) > 1:
+                raise HTTPException(status_code=400, detail="Upload a single ZIP/tar archive or individual image files, not both")
+            return self._process_uploaded_archive(files[0], background_tasks, fast_mode)
 
         # If background_tasks is provided, use asynchronous processing with progress tracking
         if background_tasks:
-            # Create task
-            task_id = progress_tracker.create_task("folder_processing")
+            self._admit(len(files))
+            task_id = str(uuid.uuid4())
+            spool_dir = self._new_spool(task_id)
 
-            # Create temporary directory and save files
-            temp_dir = tempfile.mkdtemp()
+            # Save files under spool_dir/folder, keeping their relative paths
+            folder = os.path.join(spool_dir, "folder")
             for file in files:
-                file_path = os.path.join(temp_dir, file.filename)
+                relpath = os.path.normpath(file.filename).lstrip(os.sep)
+                if relpath.startswith(".."):
+                    continue  # jangan tulis di luar spool
+                file_path = os.path.join(folder, relpath)
                 os.makedirs(os.path.dirname(file_path), exist_ok=True)
-                
-                content = await file.read()
                 with open(file_path, "wb") as f:
-                    f.write(content)
+                    shutil.copyfileobj(file.file, f)
 
-            # Start background processing
-            background_tasks.add_task(self.process_folder_background, temp_dir, task_id)
-            return {"task_id": task_id, "message": "Processing started"}
+            payload = {"folder": folder, "fast_mode": fast_mode, "spool_dir": spool_dir}
+            return self._submit("folder_processing", "folder", payload, task_id, len(files), self._upload_size(files))
         
         # Otherwise, use synchronous processing
         else:
@@ -125,17 +206,104 @@ class ImageFolderController:
                         shutil.copyfileobj(file.file, buffer)
 
                 # Process the folder
-                result_zip_path, processed_count, image_data = self.service.process_folder(temp_dir)
+                result_zip_path, processed_count, image_data = self.service.process_folder(temp_dir, fast_mode=fast_mode)
                 
                 if processed_count == 0:
                     raise HTTPException(status_code=400, detail="No valid images found in the uploaded folder")
 
-                return UploadResponse(
-                    message="Folder processed successfully",
-                    zip_path=result_zip_path,
-                    processed_count=processed_count,
-                    spreadsheet_data=image_data
-                )
+                return build_upload_response("Folder processed successfully", result_zip_path, processed_count, image_data)
+
+    def _process_uploaded_archive(self, file: UploadFile, background_tasks: BackgroundTasks = None, fast_mode: bool = False):
+        """Process a ZIP/tar archive: members are streamed into the pipeline, not extracted"""
+        if background_tasks:
+            task_id = str(uuid.uuid4())
+            spool_dir = self._new_spool(task_id)
+            # Upload ditutup setelah response; simpan arsipnya saja (satu file) untuk background task
+            archive_path = os.path.join(spool_dir, os.path.basename(file.filename))
+            with open(archive_path, "wb") as f:
+                shutil.copyfileobj(file.file, f)
+            try:
+                images = count_archive(archive_path, file.filename) or 0  # tar: jumlah belum diketahui
+                self._admit(images)
+            except (ValueError, HTTPException) as e:
+                shutil.rmtree(spool_dir, ignore_errors=True)
+                if isinstance(e, ValueError):
+                    raise HTTPException(status_code=400, detail=str(e))
+                raise
+            payload = {"archive": archive_path, "filename": file.filename, "fast_mode": fast_mode, "spool_dir": spool_dir}
+            return self._submit("folder_processing", "archive", payload, task_id, images, self._upload_size([file]))
+
+        try:
+            result_zip_path, processed_count, image_data = self.service.process_archive(file.file, file.filename, fast_mode=fast_mode)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if processed_count == 0:
+            raise HTTPException(status_code=400, detail="No valid images found in the uploaded archive")
+        return build_upload_response("Archive processed successfully", result_zip_path, processed_count, image_data)
+
+    def upload_and_process_features(self, vectors: UploadFile, filenames: str, model_version: str,
+                                    background_tasks: BackgroundTasks = None, fast_mode: bool = False):
+        """Categorize ResNet50 feature vectors computed on the capture device (no image decode or feature extraction)"""
+        try:
+            check_model_version(model_version)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        self._record_upload("upload-features", [vectors])
+        suffix = ".npy" if vectors.filename and vectors.filename.endswith(".npy") else ".f32"
+
+        if background_tasks:
+            task_id = str(uuid.uuid4())
+            spool_dir = self._new_spool(task_id)
+            vectors_path = os.path.join(spool_dir, f"vectors{suffix}")
+            with open(vectors_path, "wb") as f:
+                shutil.copyfileobj(vectors.file, f)
+            try:
+                names = parse_filenames(filenames, len(load_vectors(vectors_path)))
+                self._admit(len(names))
+            except (ValueError, HTTPException) as e:
+                shutil.rmtree(spool_dir, ignore_errors=True)
+                if isinstance(e, ValueError):
+                    raise HTTPException(status_code=400, detail=str(e))
+                raise
+            payload = {"vectors": vectors_path, "filenames": names, "model_version": model_version,
+                       "fast_mode": fast_mode, "spool_dir": spool_dir}
+            return self._submit("feature_processing", "features", payload, task_id, len(names), self._upload_size([vectors]))
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            vectors_path = os.path.join(temp_dir, f"vectors{suffix}")
+            with open(vectors_path, "wb") as f:
+                shutil.copyfileobj(vectors.file, f)
+            try:
+                data = load_vectors(vectors_path)
+                names = parse_filenames(filenames, len(data))
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            zip_path, processed_count, image_data = self.service.process_features(data, names, fast_mode=fast_mode)
+            if processed_count == 0:
+                raise HTTPException(status_code=400, detail="No feature vectors could be processed")
+            return build_upload_response("Features processed successfully", zip_path, processed_count, image_data)
+
+    @staticmethod
+    def _upload_size(files: list[UploadFile]) -> int:
+        return sum(file.size or 0 for file in files)
+
+    @staticmethod
+    def _record_upload(endpoint: str, files: list[UploadFile]):
+        """Count uploaded files and bytes for the metrics endpoint"""
+        UPLOAD_FILES.inc(len(files), endpoint=endpoint)
+        UPLOAD_BYTES.inc(sum(file.size or 0 for file in files), endpoint=endpoint)
+
+    def get_fast_mode_status(self) -> FastModeStatus:
+        """Current fast-mode classifier (categories, calibrated threshold, expected precision)"""
+        category_classifier.refresh()
+        return category_classifier.status()
+
+    def train_fast_mode(self) -> FastModeStatus:
+        """Re-fit the fast-mode classifier from caption-decided images in the embedding index"""
+        try:
+            return category_classifier.train_from_index(get_embedding_index())
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
 
     def get_task_progress(self, task_id: str) -> ProcessingProgress:
         """Get current progress for a task"""
@@ -143,3 +311,233 @@ class ImageFolderController:
         if not progress:
             raise HTTPException(status_code=404, detail="Task not found")
         return progress
+
+    def get_partial_results(self, task_id: str, since: int = 0, limit: int = 200) -> PartialResults:
+        """Result rows finished so far, starting at row `since`; works while the task is running"""
+        if since < 0 or not 1 <= limit <= 1000:
+            raise HTTPException(status_code=400, detail="since must be >= 0 and limit between 1 and 1000")
+        # Progress dibaca dulu: jika sudah selesai, semua barisnya pasti sudah tertulis
+        progress = progress_tracker.get_progress(task_id)
+        if not progress:
+            raise HTTPException(status_code=404, detail="Task not found")
+        if get_job_queue() is None and not TASK_SCOPED_OUTPUT:
+            raise HTTPException(status_code=404, detail="Partial results need TASK_SCOPED_OUTPUT=true")
+        rows, available = ResultSpill.read_since(os.path.join(task_dir(task_id), RESULTS_FILENAME), since, limit)
+        return PartialResults(
+            task_id=task_id,
+            since=since,
+            next=since + len(rows),
+            available=available,
+            is_completed=progress.is_completed,
+            rows=rows,
+        )
+
+    def cancel_task(self, task_id: str) -> CancelResponse:
+        """Cancel a task: a waiting one never starts, a running one stops before its next image.
+
+        Its spool, uploads and partial results are deleted.
+        """
+        queue = get_job_queue()
+        if queue is not None:
+            status = queue.cancel(task_id)
+            if status is None:
+                raise HTTPException(status_code=404, detail="Task not found")
+            if status not in ("cancelled", "cancelling"):
+                raise HTTPException(status_code=409, detail=f"Task already finished ({status})")
+            if status == "cancelled":
+                retention_manager.discard(task_id)  # progress akhir dibentuk dari status antrean
+            return CancelResponse(task_id=task_id, status=status)
+
+        progress = progress_tracker.get_progress(task_id)
+        if progress is None:
+            raise HTTPException(status_code=404, detail="Task not found")
+        if progress.is_completed:
+            raise HTTPException(status_code=409, detail="Task already finished")
+        status = task_scheduler.cancel(task_id)
+        if status is None:
+            # Terdaftar tapi belum/tidak dijadwalkan di proses ini
+            raise HTTPException(status_code=409, detail="Task is not scheduled in this process")
+        if status == "cancelled":
+            retention_manager.discard(task_id)
+            admission_control.finish(task_id)
+            progress_tracker.complete_task(task_id, error="Task cancelled", cancelled=True)
+        return CancelResponse(task_id=task_id, status=status)
+
+    def get_admission_stats(self) -> AdmissionStats:
+        """Backlog (jobs, images, upload bytes) against the admission limits, throughput, rejections"""
+        return admission_control.status()
+
+    def get_task_artifact(self, task_id: str, name: str) -> Artifact:
+        """ZIP or Excel report of a job that ran in a task-scoped output directory"""
+        artifact = zip_artifact(task_id) if name == "zip" else report_artifact(task_id)
+        if artifact is None:
+            raise HTTPException(status_code=404, detail="ZIP file not found" if name == "zip" else "Report not found")
+        retention_manager.touch(str(uuid.UUID(task_id)))
+        return artifact
+
+    def get_category_artifact(self, task_id: str, category: str) -> Artifact:
+        """ZIP of one category folder of a task's results (built on first request)"""
+        try:
+            artifact = category_artifact(task_id, category)
+        except (OSError, zipfile.BadZipFile) as e:
+            raise HTTPException(status_code=500, detail=f"Could not build category archive: {e}")
+        if artifact is None:
+            raise HTTPException(status_code=404, detail="Category not found")
+        retention_manager.touch(str(uuid.UUID(task_id)))
+        return artifact
+
+    def list_task_artifacts(self, task_id: str) -> TaskArtifactList:
+        """Downloadable files of a task: ZIP, report and one archive per category"""
+        source = zip_artifact(task_id)
+        if source is None:
+            raise HTTPException(status_code=404, detail="ZIP file not found")
+        task_id = os.path.basename(task_dir(task_id))
+        artifacts = [TaskArtifactInfo(name="zip", filename=source.filename, url=f"/v1/download/{task_id}",
+                                      bytes=os.path.getsize(source.path))]
+        report = report_artifact(task_id)
+        if report is not None:
+            artifacts.append(TaskArtifactInfo(name="report", filename=report.filename,
+                                              url=f"/v1/download/{task_id}/report", bytes=os.path.getsize(report.path)))
+        for category in categories(source.path):
+            cached = os.path.join(os.path.dirname(source.path), CATEGORY_CACHE_DIR, f"{category}.zip")
+            artifacts.append(TaskArtifactInfo(
+                name=f"category/{category}",
+                filename=f"{category}.zip",
+                url=f"/v1/download/{task_id}/categories/{quote(category)}",
+                bytes=os.path.getsize(cached) if os.path.exists(cached) else None,
+            ))
+        return TaskArtifactList(task_id=task_id, artifacts=artifacts)
+
+    def get_latest_zip(self) -> Optional[Artifact]:
+        """ZIP for the legacy /v1/download: the shared one, or the most recently used task's"""
+        zip_path = os.path.join(OUTPUT_DIR, ZIP_FILENAME)
+        if not os.path.exists(zip_path):
+            zip_path = retention_manager.latest_zip()
+        return Artifact(zip_path, ZIP_MEDIA_TYPE, ZIP_FILENAME) if zip_path else None
+
+    def get_memory_status(self) -> MemoryStatus:
+        """Process RSS and per-model weight footprint"""
+        return self.service.memory_status()
+
+    def start_profile(self, task_id: Optional[str], images: int, memory: bool) -> ProfileSession:
+        """Arm cProfile/tracemalloc capture for the next images of a task (or of any task)"""
+        try:
+            return profile_capture.arm(task_id, images, memory)
+        except PermissionError as e:
+            raise HTTPException(status_code=403, detail=str(e))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except RuntimeError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+
+    def list_profiles(self) -> List[ProfileSession]:
+        """Profile sessions of this process, newest first"""
+        return profile_capture.list()
+
+    def get_profile(self, session_id: str) -> ProfileSession:
+        """Status and artifact names of a profile session"""
+        session = profile_capture.get(session_id)
+        if session is None:
+            raise HTTPException(status_code=404, detail="Profile session not found")
+        return session
+
+    def stop_profile(self, session_id: str) -> ProfileSession:
+        """Stop a profile session and write what was captured so far"""
+        session = profile_capture.stop(session_id)
+        if session is None:
+            raise HTTPException(status_code=404, detail="Profile session not found")
+        return session
+
+    def get_profile_artifact_path(self, session_id: str, name: str) -> str:
+        """Path of one artifact of a finished profile session"""
+        path = profile_capture.artifact_path(session_id, name)
+        if path is None or not os.path.exists(path):
+            raise HTTPException(status_code=404, detail="Profile artifact not found")
+        return path
+
+    def get_storage_status(self) -> StorageStatus:
+        """Disk used by task results against the retention quota"""
+        return retention_manager.status()
+
+    def sweep_storage(self) -> SweepResult:
+        """Run a retention sweep now"""
+        result = retention_manager.sweep()
+        if result is None:
+            raise HTTPException(status_code=409, detail="A retention sweep is already running")
+        return result
+
+    def get_task_trace(self, task_id: str, format: str = "json"):
+        """Get the stage timing trace for a task, optionally in Chrome trace-event format"""
+        trace = progress_tracker.get_trace(task_id)
+        if not trace:
+            if progress_tracker.get_progress(task_id) is not None:
+                # Job di worker antrean: trace tersedia setelah job selesai
+                raise HTTPException(status_code=404, detail="Trace not available until the task finishes")
+            raise HTTPException(status_code=404, detail="Task not found")
+        if format == "chrome":
+            return JSONResponse(
+                trace.to_chrome_trace(),
+                headers={"Content-Disposition": f'attachment; filename="trace-{task_id}.json"'},
+            )
+        if format != "json":
+            raise HTTPException(status_code=400, detail="format must be 'json' or 'chrome'")
+        return trace.to_report()
+
+    async def find_similar_to_upload(self, file: UploadFile, k: int = 10) -> SimilarImagesResponse:
+        """Find indexed images most similar to an uploaded image"""
+        content = await file.read()
+        if not content:
+            raise HTTPException(status_code=400, detail="Empty file")
+        try:
+            features = self.service.extract_features_from_bytes(content)
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Could not read image: {e}")
+        return self._search_similar(features, k, query=file.filename)
+
+    def find_similar_to_indexed(self, image_id: int, k: int = 10) -> SimilarImagesResponse:
+        """Find indexed images most similar to an already indexed image"""
+        index = get_embedding_index()
+        try:
+            features = index.get_vector(image_id)
+        except KeyError:
+            raise HTTPException(status_code=404, detail="Image not found in index")
+        return self._search_similar(features, k, query=f"id:{image_id}", exclude_id=image_id)
+
+    @staticmethod
+    def _search_similar(features, k: int, query: str, exclude_id: int = None) -> SimilarImagesResponse:
+        if not 1 <= k <= 100:
+            raise HTTPException(status_code=400, detail="k must be between 1 and 100")
+        index = get_embedding_index()
+        start = time.perf_counter()
+        results = index.search(features, k, exclude_id)
+        return SimilarImagesResponse(
+            query=query,
+            index_size=len(index),
+            took_ms=round((time.perf_counter() - start) * 1000.0, 3),
+            results=results,
+        )
+
+    def search_captions(self, q: Optional[str] = None, category: Optional[str] = None, task_id: Optional[str] = None,
+                        min_score: Optional[float] = None, max_score: Optional[float] = None,
+                        since: Optional[datetime] = None, until: Optional[datetime] = None,
+                        limit: int = 50, cursor: Optional[int] = None) -> CaptionSearchResponse:
+        """Full-text search over the captions of all past jobs, newest first, one page per call"""
+        if not CAPTION_STORE_ENABLED:
+            raise HTTPException(status_code=503, detail="Caption store is disabled")
+        if not 1 <= limit <= 500:
+            raise HTTPException(status_code=400, detail="limit must be between 1 and 500")
+        start = time.perf_counter()
+        try:
+            hits, next_cursor = get_caption_store().search(
+                q, category, task_id, min_score, max_score,
+                since.timestamp() if since else None, until.timestamp() if until else None,
+                limit, cursor,
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return CaptionSearchResponse(
+            query=q,
+            hits=hits,
+            next_cursor=next_cursor,
+            took_ms=round((time.perf_counter() - start) * 1000.0, 3),
+        )
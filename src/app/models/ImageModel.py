@@ -1,6 +1,6 @@
 #  src/app/models/ImageModel.py
 from pydantic import BaseModel
-from typing import List, Optional, Union
+from typing import Dict, List, Optional, Union
 
 
 class ImageData(BaseModel):
@@ -17,6 +17,21 @@ class ImageCategorization(BaseModel):
     cosine_similarity: float
     bleu_score: float
     image_path: Optional[str] = None
+    duplicate_of: Optional[str] = None
+    decided_by: str = "caption"
+    classifier_category: Optional[str] = None
+    classifier_confidence: Optional[float] = None
+
+
+class CascadeSummary(BaseModel):
+    images: int
+    decided_by_classifier: int
+    decided_by_caption: int
+    fallbacks: int
+    fallback_agreement_rate: Optional[float] = None
+    audited: int
+    audit_agreement_rate: Optional[float] = None
+    threshold: float
 
 
 class UploadResponse(BaseModel):
@@ -24,6 +39,8 @@ class UploadResponse(BaseModel):
     zip_path: str
     processed_count: int
     spreadsheet_data: List[ImageCategorization]
+    spreadsheet_truncated: bool = False
+    fast_mode: Optional[CascadeSummary] = None
 
 
 class AsyncResponse(BaseModel):
@@ -46,6 +63,206 @@ class ProcessingProgress(BaseModel):
     is_completed: bool
     result: Optional[UploadResponse] = None
     error: Optional[str] = None
+    priority: Optional[str] = None  # "interactive" atau "bulk"
+    queue_position: Optional[int] = None  # 1 = berikutnya; None setelah mulai berjalan
+    cancelled: bool = False
+
+
+class PartialResults(BaseModel):
+    task_id: str
+    since: int
+    next: int  # kirim sebagai `since` pada permintaan berikutnya
+    available: int  # baris yang sudah selesai sejauh ini
+    is_completed: bool
+    rows: List[ImageCategorization]
+
+
+class CancelResponse(BaseModel):
+    task_id: str
+    status: str  # "cancelled" (belum mulai) atau "cancelling" (berhenti sebelum gambar berikutnya)
+
+
+class StepSpan(BaseModel):
+    step_id: int
+    text: str
+    start_ms: Optional[float] = None
+    end_ms: Optional[float] = None
+    duration_ms: Optional[float] = None
+
+
+class StageTimingSummary(BaseModel):
+    stage: str
+    count: int
+    total_ms: float
+    max_ms: float
+    first_start_ms: float
+    last_end_ms: float
+
+
+class ImageTimingSample(BaseModel):
+    index: int
+    filename: str
+    start_ms: float
+    total_ms: float
+    stages: Dict[str, float]
+
+
+class TaskTraceReport(BaseModel):
+    task_id: str
+    started_at: str
+    duration_ms: float
+    steps: List[StepSpan]
+    stages: List[StageTimingSummary]
+    images_seen: int
+    images_sampled: int
+    images: List[ImageTimingSample]
+    model_calls: Dict[str, int]
+
+
+class SimilarImage(BaseModel):
+    id: int
+    filename: str
+    task_id: Optional[str] = None
+    category: Optional[str] = None
+    caption: Optional[str] = None
+    image_path: Optional[str] = None
+    created_at: Optional[str] = None
+    score: float
+
+
+class SimilarImagesResponse(BaseModel):
+    query: str
+    index_size: int
+    took_ms: float
+    results: List[SimilarImage]
+
+
+class CaptionSearchHit(BaseModel):
+    id: int
+    task_id: Optional[str] = None
+    filename: str
+    caption: str
+    category: str
+    cosine_similarity: float
+    bleu_score: float
+    decided_by: str = "caption"
+    duplicate_of: Optional[str] = None
+    image_path: Optional[str] = None
+    created_at: str
+
+
+class CaptionSearchResponse(BaseModel):
+    query: Optional[str] = None
+    hits: List[CaptionSearchHit]
+    next_cursor: Optional[int] = None  # kirim sebagai `cursor` untuk halaman berikutnya
+    took_ms: float
+
+
+class FastModeStatus(BaseModel):
+    ready: bool
+    categories: List[str]
+    threshold: Optional[float] = None
+    trained_at: Optional[str] = None
+    samples: Optional[int] = None
+    calibration_samples: Optional[int] = None
+    expected_precision: Optional[float] = None
+    expected_coverage: Optional[float] = None
 
 
 APIResponse = Union[UploadResponse, AsyncResponse]
+
+
+class SweepResult(BaseModel):
+    at: str
+    evicted_by_age: int
+    evicted_by_quota: int
+    orphans_removed: int
+    freed_mb: float
+    took_ms: float
+
+
+class StorageStatus(BaseModel):
+    artifacts: int
+    total_mb: float
+    quota_mb: float
+    max_age_hours: float
+    oldest_last_used: Optional[str] = None
+    last_sweep: Optional[SweepResult] = None
+
+
+class TaskArtifactInfo(BaseModel):
+    name: str  # "zip", "report" atau "category/<kategori>"
+    filename: str
+    url: str
+    bytes: Optional[int] = None  # None: arsip kategori belum dibuat
+
+
+class TaskArtifactList(BaseModel):
+    task_id: str
+    artifacts: List[TaskArtifactInfo]
+
+
+class AdmissionLimits(BaseModel):
+    max_jobs: int
+    max_queued_images: int
+    max_upload_mb: float
+
+
+class AdmissionStats(BaseModel):
+    jobs: int  # antre + berjalan
+    running_jobs: int
+    queued_images: int
+    spooled_mb: float
+    receiving_mb: float  # upload yang sedang diterima proses ini
+    images_per_s: Optional[float] = None  # throughput terukur; None sebelum ada job selesai
+    estimated_drain_s: Optional[float] = None
+    limits: AdmissionLimits
+    rejections: Dict[str, int]  # sejak proses ini mulai, per alasan
+
+
+class ModelMemory(BaseModel):
+    name: str
+    loaded: bool
+    parameters: int
+    dtype: Optional[str] = None
+    weights_mb: float
+
+
+class MemoryStatus(BaseModel):
+    rss_mb: Optional[float] = None
+    pss_mb: Optional[float] = None
+    private_mb: Optional[float] = None
+    backbone: str
+    precision: str
+    idle_unload_seconds: float
+    idle_seconds: Optional[float] = None
+    unloads: int
+    models: List[ModelMemory]
+
+
+class ProfileSession(BaseModel):
+    session_id: str
+    task_id: Optional[str] = None
+    images: int
+    memory: bool
+    status: str  # armed, capturing, completed, cancelled
+    captured: int
+    created_at: str
+    completed_at: Optional[str] = None
+    peak_traced_mb: Optional[float] = None
+    artifacts: List[str] = []
+
+
+class RuntimeProfile(BaseModel):
+    intra_op_threads: int = 0  # 0 = default TensorFlow
+    inter_op_threads: int = 0
+    feature_batch_size: int = 1
+    caption_batch_size: int = 1
+    decode_workers: int = 1
+    # Hasil pengukuran `cli tune` yang menghasilkan profil ini
+    tuned_at: Optional[str] = None
+    host: Optional[str] = None
+    cpu_count: Optional[int] = None
+    models: Optional[str] = None
+    images_per_s: Optional[float] = None
+    p95_ms: Optional[float] = None
@@ -1,37 +1,157 @@
 # src/app/routes/v1.py
-from fastapi import APIRouter, UploadFile, File, BackgroundTasks
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, UploadFile, File, Form, BackgroundTasks, Request
 from fastapi.responses import FileResponse
 from src.app.controllers.api.ImageFolderController import ImageFolderController
-from src.app.config.settings import OUTPUT_DIR
-import os
+from src.app.services.ConditionalDownload import file_response
 
 router = APIRouter(prefix="/v1", tags=["Image Folding"])
 controller = ImageFolderController()
 
 @router.post("/upload-images")
-async def upload_images(files: list[UploadFile] = File(...), background_tasks: BackgroundTasks = None):
-    """Upload multiple images for processing and categorization with progress tracking"""
-    return await controller.upload_and_process_images(files, background_tasks)
+async def upload_images(files: list[UploadFile] = File(...), background_tasks: BackgroundTasks = None, fast_mode: bool = False):
+    """Upload multiple images for processing and categorization with progress tracking.
+    With fast_mode=true a feature-space classifier decides confident images without captioning"""
+    return await controller.upload_and_process_images(files, background_tasks, fast_mode)
 
 @router.post("/upload-folder")
-async def upload_folder(files: list[UploadFile] = File(...), background_tasks: BackgroundTasks = None):
-    """Upload folder contents (multiple files) for processing and categorization with progress tracking"""
-    return await controller.upload_and_process_folder(files, background_tasks)
+async def upload_folder(files: list[UploadFile] = File(...), background_tasks: BackgroundTasks = None, fast_mode: bool = False):
+    """Upload folder contents (multiple files) for processing and categorization with progress tracking.
+    With fast_mode=true a feature-space classifier decides confident images without captioning"""
+    return await controller.upload_and_process_folder(files, background_tasks, fast_mode)
+
+@router.post("/upload-features")
+async def upload_features(vectors: UploadFile = File(...), filenames: str = Form(...), model_version: str = Form(...),
+                          background_tasks: BackgroundTasks = None, fast_mode: bool = False):
+    """Categorize precomputed ResNet50 feature vectors (e.g. extracted on the capture device).
+    `vectors`: float32 .npy of shape (N, 2048) or raw little-endian float32; `filenames`: JSON array of N names;
+    `model_version` must match the server's FEATURE_MODEL_VERSION. Only captioning and categorization run"""
+    return controller.upload_and_process_features(vectors, filenames, model_version, background_tasks, fast_mode)
 
 @router.get("/progress/{task_id}")
 async def get_progress(task_id: str):
     """Get current progress for a processing task"""
     return controller.get_task_progress(task_id)
 
+@router.get("/progress/{task_id}/results")
+async def get_partial_results(task_id: str, since: int = 0, limit: int = 200):
+    """Get result rows finished so far, from row `since` on, while the task is still running.
+    Poll with since=<next> until is_completed is true and no rows are left"""
+    return controller.get_partial_results(task_id, since, limit)
+
+@router.post("/progress/{task_id}/cancel")
+async def cancel_task(task_id: str):
+    """Cancel a task: if it has not started it never will; if it is running it stops before
+    its next image. Uploads and partial results are deleted"""
+    return controller.cancel_task(task_id)
+
+@router.get("/progress/{task_id}/trace")
+async def get_trace(task_id: str, format: str = "json"):
+    """Get per-stage, per-image (sampled) timings and model call counts for a task.
+    Use format=chrome to download a trace loadable in chrome://tracing or Perfetto"""
+    return controller.get_task_trace(task_id, format)
+
+@router.post("/similar")
+async def similar_to_upload(file: UploadFile = File(...), k: int = 10):
+    """Find the k processed images most similar to an uploaded image (cosine on ResNet50 features)"""
+    return await controller.find_similar_to_upload(file, k)
+
+@router.get("/similar/{image_id}")
+async def similar_to_indexed(image_id: int, k: int = 10):
+    """Find the k processed images most similar to an already indexed image"""
+    return controller.find_similar_to_indexed(image_id, k)
+
+@router.get("/search")
+async def search_captions(q: Optional[str] = None, category: Optional[str] = None, task_id: Optional[str] = None,
+                          min_score: Optional[float] = None, max_score: Optional[float] = None,
+                          since: Optional[datetime] = None, until: Optional[datetime] = None,
+                          limit: int = 50, cursor: Optional[int] = None):
+    """Search captions of all past jobs (words must all match, `word*` = prefix, "a phrase").
+    Filter by category, task, cosine score range and time; page with the returned next_cursor"""
+    return controller.search_captions(q, category, task_id, min_score, max_score, since, until, limit, cursor)
+
+@router.get("/fast-mode")
+async def fast_mode_status():
+    """Status of the fast-mode category classifier"""
+    return controller.get_fast_mode_status()
+
+@router.post("/fast-mode/train")
+async def fast_mode_train():
+    """Train and calibrate the fast-mode classifier from past caption-decided results"""
+    return controller.train_fast_mode()
+
+@router.get("/memory")
+async def memory_status():
+    """Process RSS/PSS, per-model weight size and precision, idle-unload state"""
+    return controller.get_memory_status()
+
+@router.post("/admin/profile")
+async def start_profile(task_id: str = None, images: int = 5, memory: bool = True):
+    """Profile the next `images` images of task_id (or of any task) with cProfile and tracemalloc"""
+    return controller.start_profile(task_id, images, memory)
+
+@router.get("/admin/profile")
+async def list_profiles():
+    return controller.list_profiles()
+
+@router.get("/admin/profile/{session_id}")
+async def get_profile(session_id: str):
+    return controller.get_profile(session_id)
+
+@router.post("/admin/profile/{session_id}/stop")
+async def stop_profile(session_id: str):
+    """Stop a session early; artifacts cover the images captured so far"""
+    return controller.stop_profile(session_id)
+
+@router.get("/admin/profile/{session_id}/{artifact}")
+async def download_profile_artifact(session_id: str, artifact: str):
+    """Download profile.pstats, profile.txt, tracemalloc-*.snapshot or tracemalloc.txt"""
+    return FileResponse(
+        controller.get_profile_artifact_path(session_id, artifact),
+        filename=f"{session_id[:8]}-{artifact}"
+    )
+
+@router.get("/stats")
+async def admission_stats():
+    """Queue depth (jobs, images, upload bytes) against admission limits, measured throughput and 429 rejections"""
+    return controller.get_admission_stats()
+
+@router.get("/storage")
+async def storage_status():
+    """Disk used by task results, retention quota and the last sweep"""
+    return controller.get_storage_status()
+
+@router.post("/storage/sweep")
+async def storage_sweep():
+    """Evict expired / over-quota results and orphaned temp directories now"""
+    return controller.sweep_storage()
+
 @router.get("/download")
-async def download_zip():
+async def download_zip(request: Request):
     """Download the ZIP file containing categorized images and Excel report"""
-    zip_path = os.path.join(OUTPUT_DIR, "hasil_folderisasi.zip")
-    print("ZIP Path:", zip_path)  # Debug
-    if os.path.exists(zip_path):
-        return FileResponse(
-            zip_path,
-            media_type="application/zip",
-            filename="hasil_folderisasi.zip"
-        )
-    return {"error": "ZIP file not found"}
\ No newline at end of file
+    artifact = controller.get_latest_zip()
+    if artifact:
+        return file_response(request, artifact)
+    return {"error": "ZIP file not found"}
+
+@router.get("/download/{task_id}")
+async def download_task_zip(task_id: str, request: Request):
+    """Download the ZIP of a job processed in a task-scoped directory (queue worker or TASK_SCOPED_OUTPUT).
+    Supports Range (resume), If-None-Match / If-Modified-Since (304) and If-Range"""
+    return file_response(request, controller.get_task_artifact(task_id, "zip"))
+
+@router.get("/download/{task_id}/artifacts")
+async def list_task_artifacts(task_id: str):
+    """Downloadable files of a task: ZIP, Excel report and one ZIP per category"""
+    return controller.list_task_artifacts(task_id)
+
+@router.get("/download/{task_id}/report")
+async def download_task_report(task_id: str, request: Request):
+    """Download the Excel report of a task (Range and conditional requests supported)"""
+    return file_response(request, controller.get_task_artifact(task_id, "report"))
+
+@router.get("/download/{task_id}/categories/{category}")
+async def download_task_category(task_id: str, category: str, request: Request):
+    """Download one category folder of a task as ZIP (Range and conditional requests supported)"""
+    return file_response(request, controller.get_category_artifact(task_id, category))
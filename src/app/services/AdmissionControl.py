@@ -0,0 +1,198 @@
+import math
+import threading
+from collections import deque
+from typing import Dict, Optional
+
+from src.app.config.settings import (
+    ADMISSION_MAX_JOBS,
+    ADMISSION_MAX_QUEUED_IMAGES,
+    ADMISSION_MAX_UPLOAD_MB,
+    ADMISSION_RETRY_AFTER_DEFAULT,
+    ADMISSION_RETRY_AFTER_MAX,
+    ADMISSION_THROUGHPUT_JOBS,
+)
+from src.app.models.ImageModel import AdmissionLimits, AdmissionStats
+from src.app.services.JobQueue import get_job_queue
+from src.app.services.MetricsRegistry import ADMISSION_REJECTIONS, metrics_registry
+
+# Endpoint yang body-nya dihitung sebagai upload (dicek dari Content-Length sebelum dibaca)
+UPLOAD_PATHS = ("/v1/upload-images", "/v1/upload-folder", "/v1/upload-features")
+
+
+class AdmissionRejected(Exception):
+    """Upload refused: `status_code` 429 (retry after `retry_after` seconds) or 413 (never fits)"""
+
+    def __init__(self, reason: str, detail: str, retry_after: Optional[int] = None):
+        super().__init__(detail)
+        self.reason = reason
+        self.retry_after = retry_after
+
+    @property
+    def status_code(self) -> int:
+        return 429 if self.retry_after is not None else 413
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        return {"Retry-After": str(self.retry_after)} if self.retry_after is not None else {}
+
+
+class AdmissionControl:
+    """Limit unfinished jobs, their images and upload bytes (receiving + spooled) accepted by the API.
+
+    The backlog comes from the job queue when there is one, so every API process sees the
+    same totals; inline jobs are tracked here with `register`/`finish`. Bytes of uploads
+    still being received are per process. Retry-After is the time the measured throughput
+    (images/s over recently finished jobs, times the jobs running in parallel) needs to
+    drain enough of the backlog for the upload to fit.
+    """
+
+    _instance = None
+    _lock = threading.Lock()
+    _receiving = 0
+    _inline: Dict[str, tuple] = {}  # task_id -> (images, bytes, running)
+    _finished = deque(maxlen=max(1, ADMISSION_THROUGHPUT_JOBS))  # (images, seconds) job inline
+    _rejections: Dict[str, int] = {}
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(AdmissionControl, cls).__new__(cls)
+        return cls._instance
+
+    @staticmethod
+    def limits() -> AdmissionLimits:
+        return AdmissionLimits(
+            max_jobs=ADMISSION_MAX_JOBS,
+            max_queued_images=ADMISSION_MAX_QUEUED_IMAGES,
+            max_upload_mb=ADMISSION_MAX_UPLOAD_MB,
+        )
+
+    def backlog(self) -> Dict[str, int]:
+        queue = get_job_queue()
+        if queue is not None:
+            return queue.backlog()
+        with self._lock:
+            entries = list(self._inline.values())
+        return {
+            "jobs": len(entries),
+            "running": sum(1 for entry in entries if entry[2]),
+            "images": sum(entry[0] for entry in entries),
+            "bytes": sum(entry[1] for entry in entries),
+        }
+
+    def throughput(self, backlog: Dict[str, int]) -> Optional[float]:
+        """Images per second across all running jobs, from recently finished jobs; None if unmeasured"""
+        queue = get_job_queue()
+        if queue is not None:
+            measured = queue.recent_throughput(ADMISSION_THROUGHPUT_JOBS)
+        else:
+            with self._lock:
+                finished = list(self._finished)
+            measured = (sum(f[0] for f in finished), sum(f[1] for f in finished)) if finished else None
+        if not measured or measured[1] <= 0:
+            return None
+        return measured[0] / measured[1] * max(1, backlog["running"])
+
+    def _reject(self, reason: str, detail: str, drain_images: Optional[float], backlog: Dict[str, int]):
+        """Raise AdmissionRejected with a Retry-After for draining `drain_images` (None = never fits)"""
+        with self._lock:
+            self._rejections[reason] = self._rejections.get(reason, 0) + 1
+        ADMISSION_REJECTIONS.inc(reason=reason)
+        if drain_images is None:
+            raise AdmissionRejected(reason, detail)
+        rate = self.throughput(backlog)
+        if rate is None or drain_images <= 0:
+            retry_after = ADMISSION_RETRY_AFTER_DEFAULT
+        else:
+            retry_after = math.ceil(drain_images / rate)
+        raise AdmissionRejected(reason, detail, min(max(1, retry_after), ADMISSION_RETRY_AFTER_MAX))
+
+    def reserve_upload(self, size: int):
+        """Count an upload body of `size` bytes as in flight until `release_upload`, or raise AdmissionRejected"""
+        limit = int(ADMISSION_MAX_UPLOAD_MB * 1024 * 1024)
+        if limit > 0:
+            if size > limit:
+                self._reject("upload_bytes", f"Upload of {size} bytes exceeds the {ADMISSION_MAX_UPLOAD_MB:g} MB limit",
+                             None, {})
+            backlog = self.backlog()
+            with self._lock:
+                over = backlog["bytes"] + self._receiving + size - limit
+                if over <= 0:
+                    AdmissionControl._receiving += size
+                    return
+            # Byte per gambar backlog: berapa gambar harus selesai supaya spool-nya terhapus
+            bytes_per_image = backlog["bytes"] / backlog["images"] if backlog["images"] else None
+            self._reject("upload_bytes", "Too many upload bytes in flight, retry later",
+                         over / bytes_per_image if bytes_per_image else 0, backlog)
+        with self._lock:
+            AdmissionControl._receiving += size
+
+    def release_upload(self, size: int):
+        with self._lock:
+            AdmissionControl._receiving = max(0, self._receiving - size)
+
+    def admit(self, images: int):
+        """Check the job and image limits for a new job of `images` images, or raise AdmissionRejected"""
+        if ADMISSION_MAX_QUEUED_IMAGES > 0 and images > ADMISSION_MAX_QUEUED_IMAGES:
+            self._reject("queued_images", f"{images} images exceed the limit of {ADMISSION_MAX_QUEUED_IMAGES} per job",
+                         None, {})
+        backlog = self.backlog()
+        if ADMISSION_MAX_JOBS > 0 and backlog["jobs"] >= ADMISSION_MAX_JOBS:
+            # Perkiraan: job tertua selesai setelah rata-rata gambar per job di backlog
+            per_job = backlog["images"] / backlog["jobs"]
+            self._reject("jobs", f"{backlog['jobs']} jobs pending (limit {ADMISSION_MAX_JOBS}), retry later",
+                         per_job * (backlog["jobs"] - ADMISSION_MAX_JOBS + 1), backlog)
+        over = backlog["images"] + images - ADMISSION_MAX_QUEUED_IMAGES
+        if ADMISSION_MAX_QUEUED_IMAGES > 0 and over > 0:
+            self._reject("queued_images", f"{backlog['images']} images pending (limit {ADMISSION_MAX_QUEUED_IMAGES}), "
+                         f"retry later", over, backlog)
+
+    def register(self, task_id: str, images: int, size_bytes: int):
+        """Track an admitted inline job until `finish`"""
+        with self._lock:
+            self._inline[task_id] = (images, size_bytes, False)
+
+    def started(self, task_id: str):
+        with self._lock:
+            if task_id in self._inline:
+                images, size_bytes, _ = self._inline[task_id]
+                self._inline[task_id] = (images, size_bytes, True)
+
+    def finish(self, task_id: str, processed: int = 0, seconds: float = 0.0):
+        """Drop an inline job from the backlog; `processed` images in `seconds` feed the throughput"""
+        with self._lock:
+            self._inline.pop(task_id, None)
+            if processed > 0 and seconds > 0:
+                self._finished.append((processed, seconds))
+
+    def status(self) -> AdmissionStats:
+        backlog = self.backlog()
+        rate = self.throughput(backlog)
+        with self._lock:
+            receiving = self._receiving
+            rejections = dict(self._rejections)
+        return AdmissionStats(
+            jobs=backlog["jobs"],
+            running_jobs=backlog["running"],
+            queued_images=backlog["images"],
+            spooled_mb=round(backlog["bytes"] / (1024 * 1024), 2),
+            receiving_mb=round(receiving / (1024 * 1024), 2),
+            images_per_s=round(rate, 3) if rate is not None else None,
+            estimated_drain_s=round(backlog["images"] / rate, 1) if rate else None,
+            limits=self.limits(),
+            rejections=rejections,
+        )
+
+
+# Singleton instance
+admission_control = AdmissionControl()
+
+metrics_registry.gauge(
+    "foldering_queued_images",
+    "Images in jobs that have not finished yet.",
+    callback=lambda: admission_control.backlog()["images"],
+)
+metrics_registry.gauge(
+    "foldering_upload_bytes_in_flight",
+    "Upload bytes being received by this process plus spooled bytes of unfinished jobs.",
+    callback=lambda: admission_control.backlog()["bytes"] + AdmissionControl._receiving,
+)
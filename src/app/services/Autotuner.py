@@ -0,0 +1,128 @@
+import itertools
+import json
+import logging
+import os
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from src.app.models.ImageModel import RuntimeProfile
+from src.app.services.ImageSources import IMAGE_EXTENSIONS
+
+
+def sample_images(images_dir: str, count: int) -> List[str]:
+    """`count` gambar dari images_dir (diulang bila kurang) sebagai beban pengukuran"""
+    paths = sorted(
+        os.path.join(images_dir, name)
+        for name in os.listdir(images_dir)
+        if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+    )
+    if not paths:
+        raise ValueError(f"No images found in {images_dir}")
+    return list(itertools.islice(itertools.cycle(paths), count))
+
+
+def _build_service(models: str):
+    from src.app.services.ImageCaptionService import ImageCaptionService
+
+    if models == "stub":
+        from src.app.services.StubModels import build_stub_components
+
+        return ImageCaptionService.from_components(*build_stub_components(), runtime_profile=RuntimeProfile())
+    ImageCaptionService._instance = None
+    return ImageCaptionService()
+
+
+def measure(service, paths: List[str], profile: RuntimeProfile) -> Dict:
+    """Throughput dan p95 latensi per gambar untuk satu kombinasi batch/decode.
+
+    Gambar diproses per analysis_batch_size seperti di _process_source; latensi sebuah gambar
+    adalah durasi batch-nya (semua gambar dalam batch selesai bersamaan).
+    """
+    service.apply_runtime_profile(profile)
+    names = [os.path.basename(p) for p in paths]
+    latencies = []
+    start = time.perf_counter()
+    for batch in service._iter_batches(range(len(paths))):
+        batch_start = time.perf_counter()
+        results = service._analyze_batch([paths[i] for i in batch], [names[i] for i in batch])
+        elapsed = time.perf_counter() - batch_start
+        failed = [r for r in results if isinstance(r, Exception)]
+        if failed:
+            raise failed[0]
+        latencies.extend([elapsed] * len(batch))
+    total = time.perf_counter() - start
+    return {
+        "images_per_s": round(len(paths) / total, 3),
+        "p95_ms": round(float(np.percentile(latencies, 95)) * 1000.0, 3),
+    }
+
+
+def run_trial(models: str, paths: List[str], intra: int, inter: int, batch_sizes: List[int],
+              decode_workers: List[int]) -> List[Dict]:
+    """Semua kombinasi batch fitur x batch caption x worker decode dengan thread TF tetap.
+
+    Harus berjalan di proses baru: jumlah thread TF tidak bisa diubah setelah runtime TF aktif.
+    """
+    import tensorflow as tf
+
+    tf.config.threading.set_intra_op_parallelism_threads(intra)
+    tf.config.threading.set_inter_op_parallelism_threads(inter)
+    service = _build_service(models)
+    # Pemanasan: trace graph untuk setiap ukuran batch sebelum diukur
+    for size in batch_sizes:
+        measure(service, paths[:size], RuntimeProfile(feature_batch_size=size, caption_batch_size=size))
+
+    results = []
+    for feature_batch, caption_batch, workers in itertools.product(batch_sizes, batch_sizes, decode_workers):
+        profile = RuntimeProfile(intra_op_threads=intra, inter_op_threads=inter, feature_batch_size=feature_batch,
+                                 caption_batch_size=caption_batch, decode_workers=workers)
+        result = measure(service, paths, profile)
+        results.append(dict(profile.model_dump(include={"intra_op_threads", "inter_op_threads", "feature_batch_size",
+                                                        "caption_batch_size", "decode_workers"}), **result))
+    return results
+
+
+def tune(models: str, images_dir: str, count: int, thread_configs: List[tuple], batch_sizes: List[int],
+         decode_workers: List[int], max_p95_ms: Optional[float] = None, echo=print) -> tuple:
+    """Ukur setiap konfigurasi thread di subprocess `cli tune --trial`; kembalikan (profil terbaik, semua hasil).
+
+    Terbaik = images/s tertinggi di antara konfigurasi dengan p95 <= max_p95_ms (jika diberikan).
+    """
+    results = []
+    for intra, inter in thread_configs:
+        command = [
+            sys.executable, "-m", "src.app.cli", "tune", "--models", models, "--images", images_dir,
+            "--count", str(count), "--batch-sizes", ",".join(map(str, batch_sizes)),
+            "--decode-workers", ",".join(map(str, decode_workers)), "--trial", str(intra), str(inter),
+        ]
+        proc = subprocess.run(command, capture_output=True, text=True)
+        if proc.returncode != 0:
+            logging.error(f"Tuning trial intra={intra} inter={inter} failed:\n{proc.stderr[-2000:]}")
+            continue
+        for result in json.loads(proc.stdout.strip().splitlines()[-1]):
+            echo(f"threads {intra}/{inter} feature batch {result['feature_batch_size']:2d} "
+                 f"caption batch {result['caption_batch_size']:2d} decode {result['decode_workers']}: "
+                 f"{result['images_per_s']:8.2f} img/s  p95 {result['p95_ms']:9.1f} ms")
+            results.append(result)
+    if not results:
+        raise RuntimeError("All tuning trials failed")
+
+    eligible = [r for r in results if max_p95_ms is None or r["p95_ms"] <= max_p95_ms]
+    if not eligible:
+        raise RuntimeError(f"No configuration meets p95 <= {max_p95_ms} ms "
+                           f"(best p95 {min(r['p95_ms'] for r in results)} ms)")
+    best = max(eligible, key=lambda r: r["images_per_s"])
+    profile = RuntimeProfile(
+        **best,
+        tuned_at=datetime.now().isoformat(),
+        host=socket.gethostname(),
+        cpu_count=os.cpu_count(),
+        models=models,
+    )
+    return profile, results
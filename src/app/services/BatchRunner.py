@@ -0,0 +1,233 @@
+import csv
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from src.app.config.settings import CAPTION_STORE_ENABLED, EMBEDDING_INDEX_ENABLED
+from src.app.services.CaptionStore import get_caption_store
+from src.app.services.ImageSources import is_image_name
+from src.app.services.MetricsRegistry import IMAGES_PROCESSED
+
+LINK_MODES = ("copy", "hardlink", "symlink", "none")
+RESULT_FIELDS = [
+    "filename", "caption", "category", "cosine_similarity", "bleu_score", "image_path",
+    "duplicate_of", "decided_by", "classifier_category", "classifier_confidence",
+]
+
+
+class BatchRunner:
+    """Run the ImageCaptionService pipeline directly on a local directory tree.
+
+    Results are appended to `<output_dir>/results.jsonl` as each image finishes, so an
+    interrupted run loses at most the images in flight. On a rerun, files whose
+    relative path, size and mtime match an ok row in results.jsonl are skipped.
+    Within one run (or one FolderWatcher session) a file that failed is not scanned
+    again until its size or mtime changes; a new run retries it.
+    `results.csv` is rebuilt from the JSONL (latest row per file) at the end of a run.
+    """
+
+    def __init__(self, service, output_dir: str, workers: int = 1, link_mode: str = "copy",
+                 resume: bool = True, fast_mode: bool = False, index_embeddings: bool = EMBEDDING_INDEX_ENABLED):
+        if link_mode not in LINK_MODES:
+            raise ValueError(f"link_mode must be one of {', '.join(LINK_MODES)}")
+        if workers < 1:
+            raise ValueError("workers must be >= 1")
+        self.service = service
+        self.output_dir = os.path.abspath(output_dir)
+        self.workers = workers
+        self.link_mode = link_mode
+        self.resume = resume
+        self.fast_mode = fast_mode
+        self.index_embeddings = index_embeddings
+        self.results_path = os.path.join(self.output_dir, "results.jsonl")
+        self.csv_path = os.path.join(self.output_dir, "results.csv")
+        self._write_lock = threading.Lock()
+        self._done: Dict[str, dict] = {}
+        # relpath -> (size, mtime_ns) file yang gagal; dicoba lagi hanya jika file berubah
+        self._failed: Dict[str, Tuple[int, int]] = {}
+        self._input_dir: Optional[str] = None
+
+    @staticmethod
+    def iter_images(input_dir: str, exclude_dir: Optional[str] = None) -> Iterator[Tuple[str, str]]:
+        """(absolute path, path relative to input_dir) for every image under input_dir, sorted"""
+        for root, dirs, files in os.walk(input_dir):
+            # Output tree boleh berada di dalam input (mode in-place); jangan ikut dipindai
+            dirs[:] = sorted(d for d in dirs if os.path.join(root, d) != exclude_dir)
+            for filename in sorted(files):
+                if is_image_name(filename):
+                    path = os.path.join(root, filename)
+                    yield path, os.path.relpath(path, input_dir)
+
+    def _load_done(self) -> Dict[str, dict]:
+        """relpath -> latest ok result row of files already processed"""
+        done = {}
+        if not os.path.exists(self.results_path):
+            return done
+        with open(self.results_path, encoding="utf-8") as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    break  # baris terakhir terpotong dari run yang terhenti
+                row = json.loads(line)
+                if row.get("status") == "ok":
+                    done[row["source"]] = row
+                else:
+                    done.pop(row["source"], None)
+        return done
+
+    def _place(self, source_path: str, relpath: str, category: str) -> Optional[str]:
+        """Put the image into <output_dir>/<category>/<relpath> using the configured link mode"""
+        if self.link_mode == "none":
+            return None
+        dest = os.path.join(self.output_dir, category, relpath)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        if os.path.lexists(dest):
+            os.remove(dest)
+        if self.link_mode == "symlink":
+            os.symlink(os.path.abspath(source_path), dest)
+        elif self.link_mode == "hardlink":
+            try:
+                os.link(source_path, dest)
+            except OSError:
+                # Beda filesystem / tidak didukung: jatuh ke salinan biasa
+                shutil.copy2(source_path, dest)
+        else:
+            shutil.copy2(source_path, dest)
+        return os.path.relpath(dest, self.output_dir)
+
+    def _remove_placed(self, row: dict):
+        if row.get("image_path"):
+            placed = os.path.join(self.output_dir, row["image_path"])
+            if os.path.lexists(placed):
+                os.remove(placed)
+
+    def _append(self, row: dict):
+        line = json.dumps(row, ensure_ascii=False) + "\n"
+        with self._write_lock, open(self.results_path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+    def _process_one(self, path: str, relpath: str, stat: os.stat_result, dedup_index, cascade, batch_id: str) -> dict:
+        base = {"source": relpath, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "processed_at": datetime.now().isoformat()}
+        try:
+            analysis = self.service._analyze_image(path, relpath, dedup_index, None, cascade)
+            previous = self._done.get(relpath)
+            if previous is not None:
+                self._remove_placed(previous)  # file berubah; kategorinya bisa berbeda
+            image_path = self._place(path, relpath, analysis["category"])
+            row = self.service._build_row(relpath, analysis, image_path)
+            if self.index_embeddings:
+                self.service._index_embedding(analysis, row, batch_id)
+            self.service._store_caption(row, batch_id)
+            row.update(base, status="ok")
+            IMAGES_PROCESSED.inc(job_type="batch", status="ok")
+        except Exception as e:
+            logging.error(f"Error processing {relpath}: {e}")
+            row = dict(base, status="error", error=str(e))
+            IMAGES_PROCESSED.inc(job_type="batch", status="error")
+        self._append(row)
+        with self._write_lock:
+            if row["status"] == "ok":
+                self._done[relpath] = row
+                self._failed.pop(relpath, None)
+            else:
+                self._done.pop(relpath, None)
+                self._failed[relpath] = (stat.st_size, stat.st_mtime_ns)
+        return row
+
+    def prepare(self, input_dir: str) -> str:
+        """Validate directories and load the results of earlier runs; returns the absolute input_dir"""
+        input_dir = os.path.abspath(input_dir)
+        if not os.path.isdir(input_dir):
+            raise FileNotFoundError(f"Input directory not found: {input_dir}")
+        if self.output_dir == input_dir:
+            raise ValueError("output_dir must differ from input_dir (use a subdirectory for in-place runs)")
+        os.makedirs(self.output_dir, exist_ok=True)
+        if self.resume:
+            self._done = self._load_done()
+        else:
+            self._done = {}
+            if os.path.exists(self.results_path):
+                os.remove(self.results_path)
+        self._failed = {}
+        self._input_dir = input_dir
+        return input_dir
+
+    def scan(self) -> Tuple[List[Tuple[str, str, os.stat_result]], int]:
+        """(new or changed images as (path, relpath, stat), number of images skipped as unchanged)"""
+        todo, skipped = [], 0
+        for path, relpath in self.iter_images(self._input_dir, self.output_dir):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue  # dihapus di antara listing dan stat
+            previous = self._done.get(relpath)
+            if previous is not None and (previous["size"], previous["mtime_ns"]) == (stat.st_size, stat.st_mtime_ns):
+                skipped += 1
+                continue
+            if self._failed.get(relpath) == (stat.st_size, stat.st_mtime_ns):
+                skipped += 1
+                continue
+            todo.append((path, relpath, stat))
+        return todo, skipped
+
+    def process(self, todo, batch_id: str) -> Dict[str, int]:
+        """Run the pipeline on `todo` with the configured parallelism; returns ok/error counts"""
+        dedup_index = self.service._new_dedup_index()
+        cascade = self.service._new_cascade(self.fast_mode, batch_id)
+        counts = {"ok": 0, "error": 0}
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="batch") as pool:
+            rows = pool.map(lambda item: self._process_one(*item, dedup_index, cascade, batch_id), todo)
+            for n, row in enumerate(rows, 1):
+                counts[row["status"]] += 1
+                if n % 50 == 0 or n == len(todo):
+                    logging.info(f"{batch_id}: processed {n}/{len(todo)} ({counts['error']} errors)")
+        if CAPTION_STORE_ENABLED:
+            get_caption_store().flush()
+        return counts
+
+    def run(self, input_dir: str) -> dict:
+        """Process every (new or changed) image under input_dir and return a summary"""
+        input_dir = self.prepare(input_dir)
+        todo, skipped = self.scan()
+
+        batch_id = "batch-" + datetime.now().strftime("%Y%m%dT%H%M%S")
+        logging.info(f"Batch {batch_id}: {len(todo)} images to process, {skipped} already done, {self.workers} worker(s)")
+        start = time.perf_counter()
+        counts = self.process(todo, batch_id)
+        elapsed = time.perf_counter() - start
+
+        self.write_csv()
+        return {
+            "batch_id": batch_id,
+            "input_dir": input_dir,
+            "output_dir": self.output_dir,
+            "found": len(todo) + skipped,
+            "skipped": skipped,
+            "processed": counts["ok"],
+            "errors": counts["error"],
+            "elapsed_s": round(elapsed, 3),
+            "images_per_s": round(len(todo) / elapsed, 3) if elapsed and todo else None,
+            "results_jsonl": self.results_path,
+            "results_csv": self.csv_path,
+        }
+
+    def write_csv(self):
+        """Rebuild results.csv from results.jsonl, keeping the latest ok row per source file"""
+        latest = {}
+        if os.path.exists(self.results_path):
+            with open(self.results_path, encoding="utf-8") as f:
+                for line in f:
+                    if line.endswith("\n"):
+                        row = json.loads(line)
+                        if row.get("status") == "ok":
+                            latest[row["source"]] = row
+        with open(self.csv_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=RESULT_FIELDS, extrasaction="ignore")
+            writer.writeheader()
+            for source in sorted(latest):
+                writer.writerow(latest[source])
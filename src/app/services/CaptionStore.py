@@ -0,0 +1,199 @@
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from src.app.config.settings import CAPTION_STORE_BATCH, CAPTION_STORE_PATH
+from src.app.models.ImageModel import CaptionSearchHit
+
+COLUMNS = (
+    "task_id", "filename", "caption", "category", "cosine_similarity", "bleu_score", "decided_by",
+    "duplicate_of", "classifier_category", "classifier_confidence", "image_path", "created_at",
+)
+_QUERY_TERM = re.compile(r'"([^"]*)"|(\S+)')
+
+
+def fts_query(text: str) -> Optional[str]:
+    """Plain search text -> FTS5 query: every word (or "quoted phrase") must match, `word*` is a prefix"""
+    terms = []
+    for phrase, word in _QUERY_TERM.findall(text):
+        prefix = bool(word) and word.endswith("*")
+        term = (phrase or word).rstrip("*").replace('"', '""').strip()
+        if term:
+            terms.append(f'"{term}"' + ("*" if prefix else ""))
+    return " ".join(terms) or None
+
+
+class CaptionStore:
+    """Every categorised image of every job, in SQLite with an FTS5 index over captions.
+
+    Rows are buffered and written CAPTION_STORE_BATCH at a time (and when a job ends via
+    `flush`), so a job pays one short transaction per batch, not one per image. API
+    processes and queue workers share the file (WAL mode). Search pages newest first with a
+    keyset cursor (row id), so each page costs the same however deep it is; the FTS index
+    is walked in rowid order, which needs no ranking pass over all matches.
+    """
+
+    def __init__(self, path: str = CAPTION_STORE_PATH, batch_size: int = CAPTION_STORE_BATCH):
+        self.path = path
+        self.batch_size = max(1, batch_size)
+        self._lock = threading.Lock()
+        self._pending: List[tuple] = []
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS images (
+                    id INTEGER PRIMARY KEY,
+                    task_id TEXT,
+                    filename TEXT NOT NULL,
+                    caption TEXT NOT NULL,
+                    category TEXT NOT NULL,
+                    cosine_similarity REAL NOT NULL,
+                    bleu_score REAL NOT NULL,
+                    decided_by TEXT,
+                    duplicate_of TEXT,
+                    classifier_category TEXT,
+                    classifier_confidence REAL,
+                    image_path TEXT,
+                    created_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS images_category ON images (category, id);
+                CREATE INDEX IF NOT EXISTS images_task ON images (task_id, id);
+                CREATE VIRTUAL TABLE IF NOT EXISTS captions_fts USING fts5(
+                    caption, content='images', content_rowid='id', tokenize='unicode61'
+                );
+                CREATE TRIGGER IF NOT EXISTS images_fts_insert AFTER INSERT ON images BEGIN
+                    INSERT INTO captions_fts (rowid, caption) VALUES (new.id, new.caption);
+                END;
+                CREATE TRIGGER IF NOT EXISTS images_fts_delete AFTER DELETE ON images BEGIN
+                    INSERT INTO captions_fts (captions_fts, rowid, caption) VALUES ('delete', old.id, old.caption);
+                END;
+            """)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def add(self, row: Dict, task_id: Optional[str] = None):
+        """Buffer one result row (ImageCategorization fields); written once the batch is full"""
+        values = dict(row, task_id=task_id, created_at=time.time())
+        with self._lock:
+            self._pending.append(tuple(values.get(column) for column in COLUMNS))
+            if len(self._pending) < self.batch_size:
+                return
+            pending, self._pending = self._pending, []
+        self._write(pending)
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if pending:
+            self._write(pending)
+
+    def _write(self, rows: List[tuple]):
+        placeholders = ", ".join("?" * len(COLUMNS))
+        try:
+            with self._connect() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.executemany(f"INSERT INTO images ({', '.join(COLUMNS)}) VALUES ({placeholders})", rows)
+                conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            logging.error(f"Failed to store {len(rows)} caption rows: {e}")
+
+    def delete_task(self, task_id: str) -> int:
+        """Drop a task's rows (e.g. after it was cancelled)"""
+        with self._lock:
+            self._pending = [row for row in self._pending if row[0] != task_id]
+        with self._connect() as conn:
+            return conn.execute("DELETE FROM images WHERE task_id = ?", (task_id,)).rowcount
+
+    def has_task(self, task_id: str) -> bool:
+        with self._connect() as conn:
+            return conn.execute("SELECT 1 FROM images WHERE task_id = ? LIMIT 1", (task_id,)).fetchone() is not None
+
+    def import_results(self, task_id: str, results_path: str) -> int:
+        """Store the rows of a job's results.jsonl (for jobs that ran before the store existed)"""
+        created_at = os.path.getmtime(results_path)
+        rows = []
+        with open(results_path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    values = dict(json.loads(line), task_id=task_id, created_at=created_at)
+                    rows.append(tuple(values.get(column) for column in COLUMNS))
+        for start in range(0, len(rows), self.batch_size):
+            self._write(rows[start:start + self.batch_size])
+        return len(rows)
+
+    def search(self, query: Optional[str] = None, category: Optional[str] = None, task_id: Optional[str] = None,
+               min_score: Optional[float] = None, max_score: Optional[float] = None,
+               since: Optional[float] = None, until: Optional[float] = None,
+               limit: int = 50, cursor: Optional[int] = None) -> tuple:
+        """Newest-first hits and the cursor for the next page (None on the last page).
+
+        `query` is plain text (see fts_query); scores filter cosine_similarity; since/until
+        are Unix times. Raises ValueError for a query FTS5 cannot parse.
+        """
+        conditions, params = [], []
+        match = fts_query(query) if query else None
+        if match:
+            source = "captions_fts JOIN images ON images.id = captions_fts.rowid"
+            conditions.append("captions_fts MATCH ?")
+            params.append(match)
+            key = "captions_fts.rowid"
+        else:
+            source = "images"
+            key = "images.id"
+        for clause, value in (
+            (f"{key} < ?", cursor),
+            ("images.category = ?", category),
+            ("images.task_id = ?", task_id),
+            ("images.cosine_similarity >= ?", min_score),
+            ("images.cosine_similarity <= ?", max_score),
+            ("images.created_at >= ?", since),
+            ("images.created_at < ?", until),
+        ):
+            if value is not None:
+                conditions.append(clause)
+                params.append(value)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        sql = f"SELECT images.* FROM {source} {where} ORDER BY {key} DESC LIMIT ?"
+        try:
+            with self._connect() as conn:
+                rows = conn.execute(sql, params + [limit + 1]).fetchall()
+        except sqlite3.OperationalError as e:
+            raise ValueError(f"Invalid search query: {e}")
+        hits = [
+            CaptionSearchHit(
+                **{key: row[key] for key in row.keys()
+                   if key in CaptionSearchHit.model_fields and key != "created_at" and row[key] is not None},
+                created_at=datetime.fromtimestamp(row["created_at"]).isoformat(),
+            )
+            for row in rows[:limit]
+        ]
+        next_cursor = hits[-1].id if len(rows) > limit else None
+        return hits, next_cursor
+
+
+_store: Optional[CaptionStore] = None
+_store_lock = threading.Lock()
+
+
+# Dibuat saat pertama dipakai supaya import tidak membuat direktori
+def get_caption_store() -> CaptionStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = CaptionStore()
+        return _store
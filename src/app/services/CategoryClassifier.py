@@ -0,0 +1,246 @@
+import logging
+import os
+import random
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.app.config.settings import (
+    CLASSIFIER_PATH,
+    FAST_MODE_AUDIT_RATE,
+    FAST_MODE_HOLDOUT,
+    FAST_MODE_MIN_SAMPLES,
+    FAST_MODE_TARGET_PRECISION,
+    FAST_MODE_TEMPERATURE,
+)
+
+
+class CategoryClassifier:
+    """Nearest-centroid category classifier on L2-normalised ResNet50 features.
+
+    Centroids are the mean feature of every category over past caption-decided
+    images in the embedding index. Confidence is a softmax over the cosine
+    similarities to the centroids; the threshold is calibrated on a held-out
+    FAST_MODE_HOLDOUT share of the rows (not used for the centroids) as the lowest
+    confidence at which agreement with the caption path is still
+    >= FAST_MODE_TARGET_PRECISION. Every process reloads CLASSIFIER_PATH when it
+    changes (see `refresh`), so a retrain reaches pre-forked and queue workers.
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(CategoryClassifier, cls).__new__(cls)
+            cls._instance._lock = threading.Lock()
+            cls._instance._reset()
+            cls._instance.load()
+        return cls._instance
+
+    def _reset(self):
+        self.categories: List[str] = []
+        self.centroids: Optional[np.ndarray] = None
+        self.threshold: float = 1.0
+        self.info: Dict = {}
+        self._mtime: Optional[float] = None
+
+    @property
+    def is_ready(self) -> bool:
+        return self.centroids is not None
+
+    def load(self, path: str = CLASSIFIER_PATH) -> bool:
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return False
+        with np.load(path, allow_pickle=False) as data:
+            with self._lock:
+                self.categories = [str(c) for c in data["categories"]]
+                self.centroids = data["centroids"].astype(np.float32)
+                self.threshold = float(data["threshold"])
+                self.info = {
+                    "trained_at": str(data["trained_at"]),
+                    "samples": int(data["samples"]),
+                    # File lama dikalibrasi pada baris latihnya sendiri
+                    "calibration_samples": int(data["calibration_samples"]) if "calibration_samples" in data.files else None,
+                    "expected_precision": float(data["expected_precision"]),
+                    "expected_coverage": float(data["expected_coverage"]),
+                }
+                self._mtime = mtime
+        return True
+
+    def refresh(self, path: str = CLASSIFIER_PATH) -> bool:
+        """Reload `path` if another process retrained it since it was loaded here; True if ready"""
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return self.is_ready
+        if mtime != self._mtime:
+            self.load(path)
+        return self.is_ready
+
+    def snapshot(self) -> Tuple[List[str], Optional[np.ndarray], float]:
+        """Categories, centroids and threshold as one consistent set (a retrain replaces all three)"""
+        with self._lock:
+            return self.categories, self.centroids, self.threshold
+
+    @staticmethod
+    def _scores(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        sims = vectors @ centroids.T
+        logits = (sims - sims.max(axis=1, keepdims=True)) / FAST_MODE_TEMPERATURE
+        probs = np.exp(logits)
+        return probs / probs.sum(axis=1, keepdims=True)
+
+    @staticmethod
+    def _normalize(features) -> np.ndarray:
+        vectors = np.asarray(features, dtype=np.float32).reshape(len(np.atleast_2d(features)), -1)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def predict(self, features) -> Tuple[str, float]:
+        """(category, confidence) for one feature vector"""
+        categories, centroids, _ = self.snapshot()
+        probs = self._scores(self._normalize(features), centroids)[0]
+        best = int(np.argmax(probs))
+        return categories[best], float(probs[best])
+
+    @staticmethod
+    def _split(label_ids: np.ndarray, categories: int, holdout: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Stratified (fit, calibration) row indices; every category keeps at least one fit row"""
+        rng = np.random.default_rng(0)
+        fit, calibration = [], []
+        for i in range(categories):
+            rows = rng.permutation(np.flatnonzero(label_ids == i))
+            held = min(int(round(len(rows) * holdout)), len(rows) - 1)
+            calibration.append(rows[:held])
+            fit.append(rows[held:])
+        return np.concatenate(fit), np.concatenate(calibration)
+
+    def train(self, vectors: np.ndarray, labels: List[str], path: str = CLASSIFIER_PATH) -> Dict:
+        """Fit centroids and calibrate the confidence threshold, then persist to `path`"""
+        if len(labels) < FAST_MODE_MIN_SAMPLES:
+            raise ValueError(f"Need at least {FAST_MODE_MIN_SAMPLES} caption-decided images to train, got {len(labels)}")
+        vectors = self._normalize(vectors)
+        categories = sorted(set(labels))
+        if len(categories) < 2:
+            raise ValueError("Need images from at least two categories to train")
+        label_ids = np.array([categories.index(label) for label in labels])
+        fit, calibration = self._split(label_ids, len(categories), FAST_MODE_HOLDOUT)
+        if not len(calibration):
+            raise ValueError("Not enough images to hold out a calibration set; lower FAST_MODE_HOLDOUT or add images")
+        centroids = np.stack([vectors[fit][label_ids[fit] == i].mean(axis=0) for i in range(len(categories))])
+        centroids /= np.linalg.norm(centroids, axis=1, keepdims=True)
+
+        # Ambang dikalibrasi pada baris yang tidak ikut membentuk centroid, supaya presisinya tidak terlalu optimis
+        probs = self._scores(vectors[calibration], centroids)
+        predicted = probs.argmax(axis=1)
+        confidence = probs.max(axis=1)
+        correct = predicted == label_ids[calibration]
+
+        # Ambang terendah yang presisi kumulatifnya (confidence >= ambang) masih memenuhi target
+        order = np.argsort(-confidence)
+        cumulative_precision = np.cumsum(correct[order]) / np.arange(1, len(order) + 1)
+        ok = np.nonzero(cumulative_precision >= FAST_MODE_TARGET_PRECISION)[0]
+        if len(ok):
+            cut = ok[-1]
+            threshold = float(confidence[order][cut])
+            coverage = (cut + 1) / len(order)
+            precision = float(cumulative_precision[cut])
+        else:
+            threshold, coverage, precision = 1.01, 0.0, 0.0  # tidak pernah yakin: selalu fallback
+
+        trained_at = datetime.now().isoformat()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        np.savez(
+            path + ".tmp.npz",
+            categories=np.array(categories),
+            centroids=centroids.astype(np.float32),
+            threshold=threshold,
+            trained_at=trained_at,
+            samples=len(labels),
+            calibration_samples=len(calibration),
+            expected_precision=precision,
+            expected_coverage=coverage,
+        )
+        os.replace(path + ".tmp.npz", path)
+        self.load(path)
+        logging.info(
+            f"Fast-mode classifier trained on {len(fit)} images, calibrated on {len(calibration)}: threshold={threshold:.4f}, "
+            f"expected precision={precision:.3f}, coverage={coverage:.3f}"
+        )
+        return self.status()
+
+    def train_from_index(self, index, path: str = CLASSIFIER_PATH) -> Dict:
+        """Train on caption-decided rows stored in the embedding index"""
+        # Baris yang diputuskan classifier tidak dipakai supaya model tidak belajar dari tebakannya sendiri
+        vectors, metas = index.select(
+            lambda meta: meta.get("category") and meta.get("decided_by") in (None, "caption")
+        )
+        return self.train(vectors, [meta["category"] for meta in metas], path)
+
+    def status(self) -> Dict:
+        return {
+            "ready": self.is_ready,
+            "categories": list(self.categories),
+            "threshold": self.threshold if self.is_ready else None,
+            **self.info,
+        }
+
+
+class CascadeJob:
+    """Per-job fast-mode state: classifier decision plus seeded audit sampling.
+
+    The model is pinned when the job starts, so a retrain while it runs does not
+    change the centroids or threshold its decisions (and its summary) are based on.
+    """
+
+    def __init__(self, classifier: CategoryClassifier, audit_rate: float = FAST_MODE_AUDIT_RATE, seed: str = ""):
+        self.categories, self.centroids, self.threshold = classifier.snapshot()
+        self.audit_rate = audit_rate
+        self._rng = random.Random(seed)
+
+    def decide(self, features) -> Tuple[str, float, bool]:
+        """Return (predicted category, confidence, accept) for one image.
+
+        A confident prediction is still sent through captioning for a small
+        random audit sample so agreement can be measured on accepted images too.
+        """
+        probs = CategoryClassifier._scores(CategoryClassifier._normalize(features), self.centroids)[0]
+        best = int(np.argmax(probs))
+        category, confidence = self.categories[best], float(probs[best])
+        accept = confidence >= self.threshold and not (self.audit_rate > 0 and self._rng.random() < self.audit_rate)
+        return category, confidence, accept
+
+
+def summarize_cascade(rows: List[Dict], threshold: float) -> Dict:
+    """Decision counts and classifier/caption agreement for a fast-mode job"""
+    summary = {
+        "images": len(rows),
+        "decided_by_classifier": 0,
+        "decided_by_caption": 0,
+        "fallbacks": 0,
+        "fallback_agreement_rate": None,
+        "audited": 0,
+        "audit_agreement_rate": None,
+        "threshold": threshold,
+    }
+    agreements = {"fallbacks": 0, "audited": 0}
+    for row in rows:
+        summary[f"decided_by_{row['decided_by']}"] += 1
+        if row["decided_by"] != "caption" or row.get("classifier_category") is None:
+            continue
+        # Caption yang confidence-nya di atas ambang hanya terjadi pada sampel audit
+        bucket = "audited" if row["classifier_confidence"] >= threshold else "fallbacks"
+        summary[bucket] += 1
+        agreements[bucket] += int(row["classifier_category"] == row["category"])
+    for bucket, rate in (("fallbacks", "fallback_agreement_rate"), ("audited", "audit_agreement_rate")):
+        if summary[bucket]:
+            summary[rate] = round(agreements[bucket] / summary[bucket], 4)
+    return summary
+
+
+# Singleton instance
+category_classifier = CategoryClassifier()
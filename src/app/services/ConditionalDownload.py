@@ -0,0 +1,114 @@
+import os
+import re
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Iterator, Optional, Tuple
+from urllib.parse import quote
+
+from fastapi import Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+
+from src.app.services.TaskArtifacts import Artifact
+
+CHUNK_SIZE = 1024 * 1024
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def _etag(artifact: Artifact, stat: os.stat_result) -> str:
+    return artifact.etag or f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    """If-None-Match comparison (weak: W/ prefixes are ignored)"""
+    tags = [tag.strip() for tag in header.split(",")]
+    return "*" in tags or etag in (tag[2:] if tag.startswith("W/") else tag for tag in tags)
+
+
+def _not_modified_since(header: Optional[str], stat: os.stat_result) -> bool:
+    if not header:
+        return False
+    try:
+        return int(stat.st_mtime) <= parsedate_to_datetime(header).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+
+def _byte_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """(start, end) inclusive for a single `bytes=` range; None to ignore the header; (-1, -1) if unsatisfiable"""
+    match = _RANGE.match(header.strip())
+    if match is None:
+        return None  # multi-range atau sintaks lain: kirim file utuh (diizinkan RFC 9110)
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        length = int(last)
+        if length == 0:
+            return -1, -1
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or (last and int(last) < start):
+        return -1, -1
+    return start, end
+
+
+def _iter_file(path: str, start: int, end: int) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                return
+            remaining -= len(chunk)
+            yield chunk
+
+
+def _content_disposition(filename: str) -> str:
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"attachment; filename*=utf-8''{quoted}"
+    return f'attachment; filename="{filename}"'
+
+
+def file_response(request: Request, artifact: Artifact) -> Response:
+    """Serve an artifact with ETag/Last-Modified validators and single byte-range support.
+
+    If-None-Match (or If-Modified-Since without it) answers 304. A Range request gets 206
+    with only those bytes, unless If-Range names an older version, in which case the whole
+    file is sent so the client does not splice two versions. Unsatisfiable ranges get 416.
+    """
+    stat = os.stat(artifact.path)
+    etag = _etag(artifact, stat)
+    headers = {
+        "etag": etag,
+        "last-modified": formatdate(stat.st_mtime, usegmt=True),
+        "accept-ranges": "bytes",
+    }
+    if_none_match = request.headers.get("if-none-match")
+    if (_etag_matches(if_none_match, etag) if if_none_match
+            else _not_modified_since(request.headers.get("if-modified-since"), stat)):
+        return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and if_range:
+        # If-Range: ETag kuat atau tanggal; tidak cocok = versi lain, abaikan Range
+        same_version = if_range == etag if if_range.startswith('"') else _not_modified_since(if_range, stat)
+        if not same_version:
+            range_header = None
+    byte_range = _byte_range(range_header, stat.st_size) if range_header else None
+    if byte_range == (-1, -1):
+        return Response(status_code=416, headers=dict(headers, **{"content-range": f"bytes */{stat.st_size}"}))
+    if byte_range is None:
+        return FileResponse(artifact.path, media_type=artifact.media_type, filename=artifact.filename,
+                            headers=headers, stat_result=stat)
+
+    start, end = byte_range
+    headers.update({
+        "content-range": f"bytes {start}-{end}/{stat.st_size}",
+        "content-length": str(end - start + 1),
+        "content-disposition": _content_disposition(artifact.filename),
+    })
+    return StreamingResponse(_iter_file(artifact.path, start, end), status_code=206,
+                             media_type=artifact.media_type, headers=headers)
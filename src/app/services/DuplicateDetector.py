@@ -0,0 +1,115 @@
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+from PIL import Image
+
+from src.app.config.settings import (
+    DEDUP_CONFIRM_WITH_FEATURES,
+    DEDUP_FEATURE_MAX_DISTANCE,
+    DEDUP_HASH_THRESHOLD,
+)
+
+HASH_BITS = 64
+_BAND_BITS = 8
+_BANDS = HASH_BITS // _BAND_BITS
+_BAND_MASK = (1 << _BAND_BITS) - 1
+
+
+def difference_hash(img: Image.Image) -> int:
+    """64-bit dHash: bandingkan piksel bertetangga pada versi grayscale 9x8."""
+    small = np.asarray(img.convert("L").resize((9, 8), Image.BILINEAR), dtype=np.int16)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+class DuplicateIndex:
+    """Per-job index of representative images for near-duplicate lookup.
+
+    Hashes are split into 8-bit bands; two hashes within Hamming distance < 8
+    share at least one identical band, so lookups only compare against images
+    in the same band buckets instead of every image seen so far.
+    """
+
+    def __init__(
+        self,
+        hash_threshold: int = DEDUP_HASH_THRESHOLD,
+        confirm_with_features: bool = DEDUP_CONFIRM_WITH_FEATURES,
+        feature_max_distance: float = DEDUP_FEATURE_MAX_DISTANCE,
+    ):
+        if not 0 <= hash_threshold < _BANDS:
+            raise ValueError(f"hash_threshold must be between 0 and {_BANDS - 1}")
+        self.hash_threshold = hash_threshold
+        self.confirm_with_features = confirm_with_features
+        self.feature_max_distance = feature_max_distance
+        self._entries: List[dict] = []
+        self._bands: List[Dict[int, List[int]]] = [{} for _ in range(_BANDS)]
+        # Dipakai bersama oleh worker paralel (batch CLI)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _band_values(phash: int):
+        for band in range(_BANDS):
+            yield band, (phash >> (band * _BAND_BITS)) & _BAND_MASK
+
+    def candidates(self, phash: int) -> List[dict]:
+        """Representatives whose hash is within the Hamming threshold, closest first"""
+        seen = set()
+        matches = []
+        with self._lock:
+            for band, value in self._band_values(phash):
+                for entry_id in self._bands[band].get(value, ()):
+                    if entry_id in seen:
+                        continue
+                    seen.add(entry_id)
+                    entry = self._entries[entry_id]
+                    distance = hamming_distance(phash, entry["hash"])
+                    if distance <= self.hash_threshold:
+                        matches.append((distance, entry_id, entry))
+        matches.sort(key=lambda m: (m[0], m[1]))
+        return [entry for _, _, entry in matches]
+
+    def confirm(self, candidates: List[dict], features) -> Optional[dict]:
+        """Pick the first candidate whose feature vector is within the cosine distance threshold"""
+        vector = self._normalize(features)
+        for entry in candidates:
+            if entry["features"] is None:
+                continue
+            distance = 1.0 - float(np.dot(vector, entry["features"].astype(np.float32)))
+            if distance <= self.feature_max_distance:
+                return entry
+        return None
+
+    def add(self, phash: int, features, filename: str, result: dict) -> int:
+        """Register a newly analysed image as a representative; returns its entry id"""
+        stored = None
+        if self.confirm_with_features and features is not None:
+            # float16 cukup untuk perbandingan cosine dan memotong memori per gambar jadi 4 KB
+            stored = self._normalize(features).astype(np.float16)
+        with self._lock:
+            entry_id = len(self._entries)
+            self._entries.append({"hash": phash, "features": stored, "filename": filename, "result": result})
+            for band, value in self._band_values(phash):
+                self._bands[band].setdefault(value, []).append(entry_id)
+        return entry_id
+
+    def discard(self, entry_id: int):
+        """Stop offering a representative whose analysis failed after it was added"""
+        with self._lock:
+            for band, value in self._band_values(self._entries[entry_id]["hash"]):
+                bucket = self._bands[band].get(value)
+                if bucket and entry_id in bucket:
+                    bucket.remove(entry_id)
+
+    @staticmethod
+    def _normalize(features):
+        vector = np.asarray(features, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
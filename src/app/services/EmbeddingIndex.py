@@ -0,0 +1,328 @@
+import fcntl
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from src.app.config.settings import (
+    EMBEDDING_DIM,
+    EMBEDDING_DTYPE,
+    EMBEDDING_INDEX_DIR,
+    EMBEDDING_PCA_TRAIN_ROWS,
+    EMBEDDING_RERANK_CANDIDATES,
+    EMBEDDING_SKETCH_DIM,
+)
+
+
+class EmbeddingIndex:
+    """Append-only, memory-mapped index of ResNet50 embeddings with top-k cosine search.
+
+    Layout in EMBEDDING_INDEX_DIR:
+      vectors.bin  N x 2048 L2-normalised vectors (float16 or float32), used for exact scores
+      pca.npz      mean vector and top principal components, fitted once from the first rows
+      sketch.bin   N x (d + 1) float32: PCA coordinates of (v - mean) plus v . mean
+      meta.jsonl   one metadata line per row (filename, task, category, caption, ...)
+      deleted.txt  task ids whose rows are gone (results evicted or discarded), one per line
+
+    For unit vectors v, q:  v . q = (v - m) . (q - m) + v . m + const, so
+    sketch[:, :d] @ U^T(q - m) + sketch[:, d] ranks rows almost like the exact
+    cosine while reading only (d + 1) * 4 bytes per row. A query scans the sketch,
+    keeps the best EMBEDDING_RERANK_CANDIDATES rows and re-scores them exactly.
+    Until EMBEDDING_PCA_TRAIN_ROWS rows exist the index is small enough to scan exactly.
+    Rows of deleted tasks stay in the files but are masked out of every lookup, so row
+    ids never change.
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(EmbeddingIndex, cls).__new__(cls)
+            cls._instance._init(EMBEDDING_INDEX_DIR)
+        return cls._instance
+
+    @classmethod
+    def open(cls, index_dir: str, **kwargs) -> "EmbeddingIndex":
+        """Open an index in another directory (not the shared singleton), e.g. for benchmarks"""
+        index = super(EmbeddingIndex, cls).__new__(cls)
+        index._init(index_dir, **kwargs)
+        return index
+
+    def _init(self, index_dir: str, dim: int = EMBEDDING_DIM, dtype: str = EMBEDDING_DTYPE,
+              sketch_dim: int = EMBEDDING_SKETCH_DIM, pca_train_rows: int = EMBEDDING_PCA_TRAIN_ROWS):
+        self.index_dir = index_dir
+        self.dim = dim
+        self.dtype = np.dtype(dtype)
+        self.sketch_dim = sketch_dim
+        self.pca_train_rows = max(pca_train_rows, sketch_dim + 1)
+        self._lock = threading.Lock()
+        self._vectors_path = os.path.join(index_dir, "vectors.bin")
+        self._sketch_path = os.path.join(index_dir, "sketch.bin")
+        self._pca_path = os.path.join(index_dir, "pca.npz")
+        self._meta_path = os.path.join(index_dir, "meta.jsonl")
+        self._lock_path = os.path.join(index_dir, "index.lock")
+        self._deleted_path = os.path.join(index_dir, "deleted.txt")
+        self._meta: List[dict] = []
+        self._meta_offset = 0
+        self._deleted = set()
+        self._deleted_offset = 0
+        self._alive = None  # mask baris hidup (None = tidak ada yang dihapus)
+        self._mean = None
+        self._components = None
+        self._vectors = None
+        self._sketch = None
+        self._mapped_rows = 0
+        os.makedirs(index_dir, exist_ok=True)
+        self._load_meta()
+
+    def __len__(self):
+        return len(self._meta) - (0 if self._alive is None else int((~self._alive).sum()))
+
+    @property
+    def _sketch_row_bytes(self) -> int:
+        return (self.sketch_dim + 1) * 4
+
+    def _load_pca(self) -> bool:
+        if self._components is None and os.path.exists(self._pca_path):
+            with np.load(self._pca_path) as data:
+                self._mean = data["mean"].astype(np.float32)
+                self._components = data["components"].astype(np.float32)
+        return self._components is not None
+
+    def _rows_on_disk(self) -> int:
+        vectors = os.path.getsize(self._vectors_path) if os.path.exists(self._vectors_path) else 0
+        rows = vectors // (self.dim * self.dtype.itemsize)
+        if self._load_pca():
+            sketch = os.path.getsize(self._sketch_path) if os.path.exists(self._sketch_path) else 0
+            rows = min(rows, sketch // self._sketch_row_bytes)
+        return rows
+
+    def _load_meta(self):
+        """Read metadata lines appended since the last call (also by other processes)"""
+        if not os.path.exists(self._meta_path) or os.path.getsize(self._meta_path) == self._meta_offset:
+            return
+        with open(self._meta_path, "rb") as f:
+            f.seek(self._meta_offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # baris yang sedang ditulis proses lain
+                self._meta_offset += len(line)
+                if line.strip():
+                    self._meta.append(json.loads(line))
+        # Baris terakhir bisa terpotong jika proses mati saat append; pakai jumlah baris yang konsisten
+        rows_on_disk = self._rows_on_disk()
+        if rows_on_disk < len(self._meta):
+            logging.warning(f"Embedding index metadata has {len(self._meta)} rows but vectors only {rows_on_disk}; truncating")
+            self._meta = self._meta[:rows_on_disk]
+
+    def _load_deleted(self) -> bool:
+        """Read task ids deleted since the last call (also by other processes); True if any were new"""
+        if not os.path.exists(self._deleted_path) or os.path.getsize(self._deleted_path) == self._deleted_offset:
+            return False
+        added = False
+        with open(self._deleted_path, "rb") as f:
+            f.seek(self._deleted_offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                self._deleted_offset += len(line)
+                task_id = line.decode("utf-8").strip()
+                if task_id and task_id not in self._deleted:
+                    self._deleted.add(task_id)
+                    added = True
+        return added
+
+    def _is_deleted(self, row_id: int) -> bool:
+        return self._alive is not None and not self._alive[row_id]
+
+    def delete_task(self, task_id: str) -> int:
+        """Tombstone every row of task_id (now and appended later); returns the rows masked"""
+        with self._lock, open(self._lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            self._load_deleted()
+            if task_id not in self._deleted:
+                # Dibaca kembali oleh _mapped seperti tombstone dari proses lain
+                with open(self._deleted_path, "ab") as f:
+                    f.write((task_id + "\n").encode("utf-8"))
+            self._load_meta()
+            return sum(1 for meta in self._meta if meta.get("task_id") == task_id)
+
+    @staticmethod
+    def _normalize(vectors) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, EMBEDDING_DIM)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def _sketch_rows(self, vectors: np.ndarray) -> np.ndarray:
+        coords = (vectors - self._mean) @ self._components
+        offset = (vectors @ self._mean)[:, None]
+        return np.hstack([coords, offset]).astype(np.float32)
+
+    def _fit_pca(self, vectors: np.ndarray):
+        """Randomised PCA on the first rows; fitted once, then fixed for the life of the index"""
+        mean = vectors.mean(axis=0)
+        centered = vectors - mean
+        rng = np.random.default_rng(0)
+        basis = centered.T @ (centered @ rng.standard_normal((self.dim, self.sketch_dim + 16)).astype(np.float32))
+        for _ in range(2):
+            basis, _ = np.linalg.qr(basis)
+            basis = centered.T @ (centered @ basis)
+        basis, _ = np.linalg.qr(basis)
+        _, _, vt = np.linalg.svd(centered @ basis, full_matrices=False)
+        components = (basis @ vt.T)[:, : self.sketch_dim]
+        self._mean = mean.astype(np.float32)
+        self._components = components.astype(np.float32)
+        np.savez(self._pca_path + ".tmp.npz", mean=self._mean, components=self._components)
+        os.replace(self._pca_path + ".tmp.npz", self._pca_path)
+
+    def add(self, features, filename: str, task_id: Optional[str] = None, category: Optional[str] = None,
+            caption: Optional[str] = None, image_path: Optional[str] = None, decided_by: Optional[str] = None) -> int:
+        """Append one embedding and return its row id"""
+        meta = {
+            "filename": filename, "task_id": task_id, "category": category, "caption": caption,
+            "image_path": image_path, "decided_by": decided_by,
+        }
+        return self.add_many(features, [meta])[0]
+
+    def add_many(self, features, metas: List[dict]) -> List[int]:
+        """Append a batch of embeddings (one metadata dict per row) and return their row ids"""
+        vectors = self._normalize(features)
+        if len(vectors) != len(metas):
+            raise ValueError(f"Got {len(vectors)} vectors but {len(metas)} metadata entries")
+        created_at = datetime.now().isoformat()
+        with self._lock, open(self._lock_path, "a") as lock_file:
+            # flock menjaga file tetap sejajar walau beberapa worker menulis bersamaan
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            self._load_meta()
+            first_id = self._rows_on_disk()
+            if first_id != len(self._meta):
+                self._repair(first_id)
+                first_id = len(self._meta)
+            rows = [
+                dict(meta, id=first_id + i, created_at=meta.get("created_at") or created_at)
+                for i, meta in enumerate(metas)
+            ]
+            with open(self._vectors_path, "ab") as f:
+                f.write(vectors.astype(self.dtype).tobytes())
+            if self._load_pca():
+                with open(self._sketch_path, "ab") as f:
+                    f.write(self._sketch_rows(vectors).tobytes())
+            elif first_id + len(vectors) >= self.pca_train_rows:
+                all_vectors = np.fromfile(self._vectors_path, dtype=self.dtype).reshape(-1, self.dim).astype(np.float32)
+                self._fit_pca(all_vectors)
+                with open(self._sketch_path, "wb") as f:
+                    f.write(self._sketch_rows(all_vectors).tobytes())
+            data = "".join(json.dumps(row) + "\n" for row in rows).encode("utf-8")
+            with open(self._meta_path, "ab") as f:
+                f.write(data)
+            self._meta.extend(rows)
+            self._meta_offset += len(data)
+        return [row["id"] for row in rows]
+
+    def _repair(self, rows_on_disk: int):
+        """Truncate files back to a consistent row count after an interrupted append"""
+        rows = min(rows_on_disk, len(self._meta))
+        with open(self._vectors_path, "ab") as f:
+            f.truncate(rows * self.dim * self.dtype.itemsize)
+        if self._load_pca():
+            with open(self._sketch_path, "ab") as f:
+                f.truncate(rows * self._sketch_row_bytes)
+        self._meta = self._meta[:rows]
+        with open(self._meta_path, "w", encoding="utf-8") as f:
+            for meta in self._meta:
+                f.write(json.dumps(meta) + "\n")
+        self._meta_offset = os.path.getsize(self._meta_path)
+        self._mapped_rows = 0
+
+    def _mapped(self):
+        """(Re)map the on-disk matrices when rows were appended or tasks deleted since the last query"""
+        self._load_meta()
+        deleted = self._load_deleted()
+        rows = len(self._meta)
+        if rows != self._mapped_rows or self._vectors is None or deleted:
+            if rows == 0:
+                return None, None, 0
+            if not self._deleted:
+                self._alive = None
+            elif deleted or self._alive is None or len(self._alive) > rows:
+                self._alive = np.fromiter((meta.get("task_id") not in self._deleted for meta in self._meta), bool, rows)
+            elif len(self._alive) < rows:
+                appended = self._meta[len(self._alive):]
+                self._alive = np.concatenate([
+                    self._alive, np.fromiter((meta.get("task_id") not in self._deleted for meta in appended), bool, len(appended)),
+                ])
+            self._vectors = np.memmap(self._vectors_path, dtype=self.dtype, mode="r", shape=(rows, self.dim))
+            self._sketch = None
+            if self._load_pca():
+                self._sketch = np.memmap(self._sketch_path, dtype=np.float32, mode="r", shape=(rows, self.sketch_dim + 1))
+            self._mapped_rows = rows
+        return self._vectors, self._sketch, rows
+
+    def get_vector(self, row_id: int) -> np.ndarray:
+        with self._lock:
+            vectors, _, rows = self._mapped()
+        if not 0 <= row_id < rows or self._is_deleted(row_id):
+            raise KeyError(row_id)
+        return np.asarray(vectors[row_id], dtype=np.float32)
+
+    def get_meta(self, row_id: int) -> dict:
+        with self._lock:
+            _, _, rows = self._mapped()
+        if not 0 <= row_id < rows or self._is_deleted(row_id):
+            raise KeyError(row_id)
+        return self._meta[row_id]
+
+    def select(self, predicate) -> Tuple[np.ndarray, List[dict]]:
+        """Vectors (float32) and metadata of every row whose metadata satisfies `predicate`"""
+        with self._lock:
+            vectors, _, rows = self._mapped()
+        row_ids = [i for i in range(rows) if not self._is_deleted(i) and predicate(self._meta[i])]
+        if not row_ids:
+            return np.empty((0, self.dim), dtype=np.float32), []
+        return np.asarray(vectors[row_ids], dtype=np.float32), [self._meta[i] for i in row_ids]
+
+    def search(self, features, k: int = 10, exclude_id: Optional[int] = None,
+               rerank_candidates: int = EMBEDDING_RERANK_CANDIDATES) -> List[dict]:
+        """Top-k rows by cosine similarity to `features`"""
+        with self._lock:
+            vectors, sketch, rows = self._mapped()
+            alive = self._alive
+        if rows == 0 or k <= 0:
+            return []
+        query = self._normalize(features)[0]
+
+        wanted = k + (1 if exclude_id is not None else 0)
+        n_candidates = max(rerank_candidates, wanted)
+        live_rows = rows if alive is None else int(alive.sum())
+        if sketch is None or n_candidates >= live_rows:
+            candidates = np.arange(rows) if alive is None else np.flatnonzero(alive)
+        else:
+            # Kolom terakhir sketch (v . m) ikut dijumlah lewat koefisien 1: satu matvec kontigu
+            query_coords = np.append((query - self._mean) @ self._components, np.float32(1.0))
+            coarse = sketch @ query_coords
+            if alive is not None:
+                coarse[~alive] = -np.inf
+            candidates = np.argpartition(coarse, -n_candidates)[-n_candidates:]
+            candidates.sort()  # akses memmap berurutan lebih ramah page cache
+        exact = np.asarray(vectors[candidates], dtype=np.float32) @ query
+
+        order = np.argsort(-exact)
+        results = []
+        for position in order:
+            row_id = int(candidates[position])
+            if row_id == exclude_id:
+                continue
+            results.append(dict(self._meta[row_id], score=float(exact[position])))
+            if len(results) == k:
+                break
+        return results
+
+
+# Singleton instance (dibuat saat pertama dipakai supaya import tidak membuat direktori)
+def get_embedding_index() -> EmbeddingIndex:
+    return EmbeddingIndex()
@@ -0,0 +1,56 @@
+import json
+from typing import List
+
+import numpy as np
+
+from src.app.config.settings import EMBEDDING_DIM, FEATURE_MODEL_VERSION
+
+_NPY_MAGIC = b"\x93NUMPY"
+_CHECK_ROWS = 4096
+
+
+def load_vectors(path: str) -> np.ndarray:
+    """Memory-map an uploaded feature file: .npy (float32, N x EMBEDDING_DIM) or raw little-endian float32.
+
+    Rows are read from disk as batches are processed, so a large upload never sits in
+    memory. Raises ValueError for a wrong dtype, shape, truncated file or non-finite value.
+    """
+    with open(path, "rb") as f:
+        is_npy = f.read(len(_NPY_MAGIC)) == _NPY_MAGIC
+    try:
+        if is_npy:
+            vectors = np.load(path, mmap_mode="r", allow_pickle=False)
+        else:
+            vectors = np.memmap(path, dtype="<f4", mode="r")
+    except ValueError as e:
+        raise ValueError(f"Unreadable feature file: {e}")
+    if is_npy:
+        if vectors.dtype != np.dtype("<f4") or vectors.ndim != 2 or vectors.shape[1] != EMBEDDING_DIM:
+            raise ValueError(f"Expected a float32 array of shape (N, {EMBEDDING_DIM}), got {vectors.dtype} {vectors.shape}")
+    else:
+        if vectors.size % EMBEDDING_DIM:
+            raise ValueError(f"Raw feature data must be N x {EMBEDDING_DIM} float32 values ({vectors.size} given)")
+        vectors = vectors.reshape(-1, EMBEDDING_DIM)
+    for start in range(0, len(vectors), _CHECK_ROWS):
+        if not np.isfinite(vectors[start:start + _CHECK_ROWS]).all():
+            raise ValueError("Feature vectors contain NaN or infinite values")
+    return vectors
+
+
+def parse_filenames(value: str, count: int) -> List[str]:
+    """The `filenames` form field: a JSON array with one name per vector"""
+    try:
+        filenames = json.loads(value)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"filenames must be a JSON array of strings: {e}")
+    if not isinstance(filenames, list) or not all(isinstance(name, str) and name for name in filenames):
+        raise ValueError("filenames must be a JSON array of non-empty strings")
+    if len(filenames) != count:
+        raise ValueError(f"{len(filenames)} filenames for {count} feature vectors")
+    return filenames
+
+
+def check_model_version(model_version: str):
+    """Vectors from another backbone or preprocessing would caption as noise: accept only ours"""
+    if model_version != FEATURE_MODEL_VERSION:
+        raise ValueError(f"Unsupported model_version '{model_version}'; this server expects '{FEATURE_MODEL_VERSION}'")
@@ -0,0 +1,116 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from src.app.config.settings import (
+    WATCH_BATCH_SIZE,
+    WATCH_CSV_INTERVAL,
+    WATCH_POLL_INTERVAL,
+    WATCH_SETTLE_SECONDS,
+)
+from src.app.services.BatchRunner import BatchRunner
+
+
+class FolderWatcher:
+    """Poll directories and feed new or changed images to BatchRunner in micro-batches.
+
+    Polling (not inotify) so it also works on NFS/SMB shares where change events are
+    not delivered. A file is picked up only once its size and mtime are unchanged
+    between two polls and it is at least `settle_seconds` old, so images that are
+    still being copied are not read half-written. Results are appended to each
+    runner's results.jsonl; results.csv is rebuilt at most every `csv_interval` seconds.
+    A file that fails is left alone until it is replaced or modified.
+    """
+
+    def __init__(self, runners: List[Tuple[BatchRunner, str]], poll_interval: float = WATCH_POLL_INTERVAL,
+                 settle_seconds: float = WATCH_SETTLE_SECONDS, batch_size: int = WATCH_BATCH_SIZE,
+                 csv_interval: float = WATCH_CSV_INTERVAL):
+        if batch_size < 1:
+            raise ValueError("batch_size must be >= 1")
+        self.poll_interval = poll_interval
+        self.settle_seconds = settle_seconds
+        self.batch_size = batch_size
+        self.csv_interval = csv_interval
+        self._runners = []
+        for runner, input_dir in runners:
+            runner.prepare(input_dir)
+            self._runners.append(runner)
+        # runner -> relpath -> (size, mtime_ns) terakhir terlihat dan belum stabil
+        self._seen: Dict[int, Dict[str, Tuple[int, int]]] = {id(r): {} for r in self._runners}
+        self._dirty: Dict[int, bool] = {id(r): False for r in self._runners}
+        self._last_csv = time.monotonic()
+        self._batches = 0
+        self.stats = {"polls": 0, "batches": 0, "processed": 0, "errors": 0}
+
+    def _ready(self, runner: BatchRunner, todo) -> list:
+        """Filter scan results down to files that were stable since the previous poll"""
+        seen = self._seen[id(runner)]
+        now_ns = time.time_ns()
+        settle_ns = int(self.settle_seconds * 1e9)
+        ready, current = [], {}
+        for path, relpath, stat in todo:
+            key = (stat.st_size, stat.st_mtime_ns)
+            if seen.get(relpath) == key and now_ns - stat.st_mtime_ns >= settle_ns:
+                ready.append((path, relpath, stat))
+            else:
+                current[relpath] = key
+        # Hanya simpan file yang masih menunggu; file yang dihapus ikut terlupakan
+        self._seen[id(runner)] = current
+        return ready
+
+    def poll_once(self) -> Dict[str, int]:
+        """One scan of every directory; processes whatever is ready. Returns counts for this poll"""
+        totals = {"ready": 0, "pending": 0, "processed": 0, "errors": 0}
+        for runner in self._runners:
+            todo, _ = runner.scan()
+            ready = self._ready(runner, todo)
+            totals["ready"] += len(ready)
+            totals["pending"] += len(self._seen[id(runner)])
+            for start in range(0, len(ready), self.batch_size):
+                self._batches += 1
+                batch_id = f"watch-{datetime.now().strftime('%Y%m%dT%H%M%S')}-{self._batches}"
+                counts = runner.process(ready[start:start + self.batch_size], batch_id)
+                totals["processed"] += counts["ok"]
+                totals["errors"] += counts["error"]
+                self._dirty[id(runner)] = True
+                self.stats["batches"] += 1
+        self.stats["polls"] += 1
+        self.stats["processed"] += totals["processed"]
+        self.stats["errors"] += totals["errors"]
+        if time.monotonic() - self._last_csv >= self.csv_interval:
+            self.flush()
+        return totals
+
+    def flush(self):
+        """Rebuild results.csv for runners that processed something since the last flush"""
+        for runner in self._runners:
+            if self._dirty[id(runner)]:
+                runner.write_csv()
+                self._dirty[id(runner)] = False
+        self._last_csv = time.monotonic()
+
+    def run(self, stop_event: Optional[threading.Event] = None, max_polls: Optional[int] = None):
+        """Poll until `stop_event` is set (or `max_polls` polls ran), then flush the CSV reports"""
+        stop_event = stop_event or threading.Event()
+        logging.info(
+            f"Watching {len(self._runners)} director{'y' if len(self._runners) == 1 else 'ies'} "
+            f"every {self.poll_interval}s (batch size {self.batch_size})"
+        )
+        try:
+            while not stop_event.is_set():
+                started = time.monotonic()
+                totals = self.poll_once()
+                if totals["processed"] or totals["errors"]:
+                    logging.info(
+                        f"Watch poll: {totals['processed']} processed, {totals['errors']} errors, "
+                        f"{totals['pending']} waiting to settle"
+                    )
+                if max_polls is not None and self.stats["polls"] >= max_polls:
+                    break
+                stop_event.wait(max(0.0, self.poll_interval - (time.monotonic() - started)))
+        finally:
+            self.flush()
+        return self.stats
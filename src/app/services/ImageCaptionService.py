@@ -1,4 +1,6 @@
 # src/app/services/ImageCaptionService.py
+import io
+import gc
 import os
 import shutil
 from PIL import Image
@@ -6,7 +8,16 @@ import zipfile
 import openpyxl
 import numpy as np
 import pickle
+import tensorflow as tf
 import logging
+import threading
+import time
+import contextvars
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from itertools import islice
+from typing import NamedTuple
 from tensorflow.keras.models import load_model
 from tensorflow.keras.preprocessing.image import load_img, img_to_array
 from tensorflow.keras.preprocessing.sequence import pad_sequences
@@ -23,41 +34,290 @@ from src.app.config.settings import (
     CATEGORY_PRIORITY,
     CATEGORY_KEYWORDS,
     BASE_DIR,
+    DEDUP_ENABLED,
+    EMBEDDING_INDEX_ENABLED,
+    CAPTION_STORE_ENABLED,
+    COMPILED_INFERENCE,
+    FEATURE_BACKBONE,
+    MODEL_PRECISION,
+    MODEL_IDLE_UNLOAD_SECONDS,
 )
 from src.app.services.ProgressTracker import progress_tracker
+from src.app.services.MetricsRegistry import STAGE_LATENCY, IMAGES_PROCESSED, MODEL_CALLS, CACHE_REQUESTS, MODEL_WEIGHTS_BYTES
+from src.app.services.ModelResidency import build_with_dtype, cast_model, footprint
+from src.app.services.Prefork import process_memory
+from src.app.models.ImageModel import MemoryStatus, ModelMemory, RuntimeProfile
+from src.app.services.DuplicateDetector import DuplicateIndex, difference_hash
+from src.app.services.EmbeddingIndex import get_embedding_index
+from src.app.services.CaptionStore import get_caption_store
+from src.app.services.CategoryClassifier import CascadeJob, category_classifier
+from src.app.services.TaskTrace import activate_trace, current_trace, trace_image
+from src.app.services.ProfileCapture import profile_capture
+from src.app.services.TaskScheduler import task_scheduler
+from src.app.services.RuntimeProfile import apply_thread_settings, load_runtime_profile
+from src.app.services.ImageSources import DirectoryScan, count_archive, iter_archive
+from src.app.services.TaskArtifacts import REPORT_FILENAME
+from src.app.services.StructuredLogging import configure_logging, sample_image_log
+from src.app.services.SharedUploads import SharedImage
+from src.app.services.ResultSpill import RESULTS_FILENAME, RESULTS_INDEX_FILENAME, ResultSpill
+from src.app.services.RetentionManager import is_task_id
 
 
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+configure_logging()
+
+
+class Workspace(NamedTuple):
+    """Direktori kerja satu job: upload sementara, output (Excel + ZIP) dan processed_images"""
+    upload_dir: str
+    output_dir: str
+    processed_dir: str
+
 
 class ImageCaptionService:
     _instance = None
     _model = None
     _tokenizer = None
     _feature_extractor = None
+    _feature_fn = None
+    _next_token_fn = None
+    _compiled = COMPILED_INFERENCE
+    _loader = None  # () -> (model, feature_extractor) untuk memuat ulang setelah idle unload
+    _footprints = {}
+    _residency_lock = threading.RLock()
+    _in_use = 0
+    _last_used = None
+    _unloads = 0
+    _idle_thread = None
+    _feature_batch_size = 1
+    _caption_batch_size = 1
+    _decode_workers = 1
+    _decode_pool = None
+    _index_word = {}
     _max_length = 37
     _category_texts = {cat: " ".join(keywords) for cat, keywords in CATEGORY_KEYWORDS.items()}
     _smoothing_function = SmoothingFunction().method1
 
     def __new__(cls):
         if cls._instance is None:
+            cls._load_models()
             cls._instance = super(ImageCaptionService, cls).__new__(cls)
-            model_path = os.path.join(BASE_DIR, "ml_models", "v3_image_captioning_resnet50_lstm.h5")
-            if os.path.exists(model_path):
-                cls._model = load_model(model_path)
-            else:
-                raise FileNotFoundError(f"Model file not found at {model_path}")
-            tokenizer_path = os.path.join(BASE_DIR, "ml_models", "v3_tokenizer.pkl")
-            if os.path.exists(tokenizer_path):
-                with open(tokenizer_path, "rb") as f:
-                    cls._tokenizer = pickle.load(f)
-            else:
-                raise FileNotFoundError(f"Tokenizer file not found at {tokenizer_path}")
-            base_model = ResNet50(weights="imagenet")
-            cls._feature_extractor = Model(inputs=base_model.input, outputs=base_model.layers[-2].output)
         return cls._instance
 
+    @classmethod
+    def _load_models(cls):
+        profile = load_runtime_profile()
+        apply_thread_settings(profile)  # sebelum model pertama menjalankan runtime TF
+        cls.apply_runtime_profile(profile)
+        if cls._tokenizer is None:
+            cls._load_tokenizer()
+        cls._install(*cls._read_models(), loader=cls._read_models)
+
+    @classmethod
+    def apply_runtime_profile(cls, profile: RuntimeProfile):
+        """Ukuran batch fitur/caption dan jumlah thread decode gambar (lihat `cli tune`)."""
+        cls._feature_batch_size = max(1, profile.feature_batch_size)
+        cls._caption_batch_size = max(1, profile.caption_batch_size)
+        if profile.decode_workers != cls._decode_workers and cls._decode_pool is not None:
+            cls._decode_pool.shutdown(wait=False)
+            cls._decode_pool = None
+        cls._decode_workers = max(1, profile.decode_workers)
+
+    @classmethod
+    def _read_models(cls):
+        model_path = os.path.join(BASE_DIR, "ml_models", "v3_image_captioning_resnet50_lstm.h5")
+        if os.path.exists(model_path):
+            model = load_model(model_path)
+        else:
+            raise FileNotFoundError(f"Model file not found at {model_path}")
+        return model, cls._build_feature_extractor()
+
+    @staticmethod
+    def _build_feature_extractor():
+        """ResNet50 sampai global average pooling (fitur 2048-d), langsung dalam MODEL_PRECISION."""
+        with build_with_dtype(MODEL_PRECISION):
+            if FEATURE_BACKBONE == "full":
+                base_model = ResNet50(weights="imagenet")
+                return Model(inputs=base_model.input, outputs=base_model.layers[-2].output)
+            # Tanpa head 1000 kelas: output sama dengan layers[-2] model penuh, tanpa bobot dense yang tidak dipakai
+            return ResNet50(weights="imagenet", include_top=False, pooling="avg", input_shape=(224, 224, 3))
+
+    @classmethod
+    def _install(cls, model, feature_extractor, compiled=None, loader=None):
+        """Pasang model (di-cast ke MODEL_PRECISION), siapkan inferensi dan idle unload."""
+        if MODEL_PRECISION != "float32":
+            model = cast_model(model, MODEL_PRECISION)
+            feature_extractor = cast_model(feature_extractor, MODEL_PRECISION)
+        cls._model = model
+        cls._feature_extractor = feature_extractor
+        cls._loader = loader
+        if compiled is not None:
+            cls._compiled = compiled
+        cls._footprints = {"caption_model": footprint(model), "feature_extractor": footprint(feature_extractor)}
+        for name, info in cls._footprints.items():
+            MODEL_WEIGHTS_BYTES.set(int(info["weights_mb"] * 1024 * 1024), model=name)
+        cls._prepare_inference(cls._compiled)
+        cls._last_used = time.time()
+        if MODEL_IDLE_UNLOAD_SECONDS > 0 and loader is not None:
+            cls._start_idle_unload(MODEL_IDLE_UNLOAD_SECONDS)
+
+    @classmethod
+    def _load_tokenizer(cls):
+        """Tokenizer saja (tanpa TensorFlow), bisa dimuat di proses induk sebelum fork."""
+        tokenizer_path = os.path.join(BASE_DIR, "ml_models", "v3_tokenizer.pkl")
+        if os.path.exists(tokenizer_path):
+            with open(tokenizer_path, "rb") as f:
+                cls._tokenizer = pickle.load(f)
+        else:
+            raise FileNotFoundError(f"Tokenizer file not found at {tokenizer_path}")
+
+    @classmethod
+    def from_components(cls, model, tokenizer, feature_extractor, compiled=COMPILED_INFERENCE, loader=None,
+                        runtime_profile: RuntimeProfile = None):
+        """Pasang model, tokenizer dan feature extractor yang sudah jadi (mis. stub untuk benchmark).
+
+        Tanpa `loader` (() -> (model, feature_extractor)) model tidak pernah di-unload saat idle.
+        `runtime_profile` default: file RUNTIME_PROFILE_PATH (thread TF tidak diubah di sini).
+        """
+        cls.apply_runtime_profile(runtime_profile or load_runtime_profile())
+        cls._tokenizer = tokenizer
+        cls._install(model, feature_extractor, compiled, loader=loader)
+        cls._instance = super(ImageCaptionService, cls).__new__(cls)
+        return cls._instance
+
+    @classmethod
+    @contextmanager
+    def _resident_models(cls):
+        """Pastikan model termuat (muat ulang setelah idle unload) dan tahan dari unload selama blok berjalan."""
+        with cls._residency_lock:
+            if cls._model is None:
+                start = time.perf_counter()
+                cls._install(*cls._loader(), loader=cls._loader)
+                logging.info(f"Models reloaded after idle unload in {time.perf_counter() - start:.2f}s")
+            cls._in_use += 1
+        try:
+            yield
+        finally:
+            with cls._residency_lock:
+                cls._in_use -= 1
+                cls._last_used = time.time()
+
+    @classmethod
+    def unload_models(cls) -> bool:
+        """Lepas model dan graph function dari memori (tokenizer tetap); False jika sedang dipakai."""
+        with cls._residency_lock:
+            if cls._model is None or cls._in_use or cls._loader is None:
+                return False
+            cls._model = None
+            cls._feature_extractor = None
+            cls._feature_fn = None
+            cls._next_token_fn = None
+            tf.keras.backend.clear_session()
+            gc.collect()
+            cls._unloads += 1
+            for name in cls._footprints:
+                MODEL_WEIGHTS_BYTES.set(0, model=name)
+        logging.info("Models unloaded after idle timeout")
+        return True
+
+    @classmethod
+    def _start_idle_unload(cls, timeout: float):
+        if cls._idle_thread is not None and cls._idle_thread.is_alive():
+            return
+
+        def run():
+            while True:
+                time.sleep(min(timeout / 4, 30.0))
+                if cls._model is not None and cls._in_use == 0 and time.time() - cls._last_used >= timeout:
+                    cls.unload_models()
+
+        cls._idle_thread = threading.Thread(target=run, name="model-idle-unload", daemon=True)
+        cls._idle_thread.start()
+
+    @classmethod
+    def memory_status(cls) -> MemoryStatus:
+        """RSS proses dan ukuran bobot tiap model (termuat atau tidak)"""
+        memory = process_memory(os.getpid())
+        loaded = cls._model is not None
+        return MemoryStatus(
+            rss_mb=memory.get("rss_mb"),
+            pss_mb=memory.get("pss_mb"),
+            private_mb=memory.get("private_mb"),
+            backbone=FEATURE_BACKBONE,
+            precision=MODEL_PRECISION,
+            idle_unload_seconds=MODEL_IDLE_UNLOAD_SECONDS,
+            idle_seconds=round(time.time() - cls._last_used, 1) if cls._last_used and not cls._in_use else None,
+            unloads=cls._unloads,
+            models=[ModelMemory(name=name, loaded=loaded, **info) for name, info in cls._footprints.items()],
+        )
+
+    @classmethod
+    def _prepare_inference(cls, compiled=COMPILED_INFERENCE):
+        """Siapkan lookup kata dan (opsional) graph function dengan signature tetap, lalu warm up."""
+        cls._index_word = dict(getattr(cls._tokenizer, "index_word", None) or
+                               {index: word for word, index in cls._tokenizer.word_index.items()})
+        cls._feature_fn = None
+        cls._next_token_fn = None
+        if not compiled:
+            return
+
+        feature_extractor = cls._feature_extractor
+        model = cls._model
+        # Batch dibiarkan None supaya batch-of-one dan batch besar memakai satu trace yang sama
+        feature_spec = [tf.TensorSpec((None,) + tuple(feature_extractor.inputs[0].shape[1:]), feature_extractor.inputs[0].dtype)]
+        caption_spec = [tf.TensorSpec((None,) + tuple(t.shape[1:]), t.dtype) for t in model.inputs]
+
+        @tf.function(input_signature=feature_spec)
+        def feature_fn(images):
+            return feature_extractor(images, training=False)
+
+        @tf.function(input_signature=caption_spec)
+        def next_token_fn(image_feature, sequence):
+            # argmax di dalam graph: hanya id token yang disalin balik, bukan distribusi vocab
+            return tf.argmax(model([image_feature, sequence], training=False), axis=-1, output_type=tf.int32)
+
+        start = time.perf_counter()
+        feature_fn(tf.zeros([1] + feature_spec[0].shape[1:].as_list(), feature_spec[0].dtype))
+        next_token_fn(*[tf.zeros([1] + spec.shape[1:].as_list(), spec.dtype) for spec in caption_spec])
+        logging.info(f"Compiled inference functions traced and warmed up in {time.perf_counter() - start:.2f}s")
+        # staticmethod: tf.function adalah descriptor dan akan ter-bind ke instance jika disimpan langsung
+        cls._feature_fn = staticmethod(feature_fn)
+        cls._next_token_fn = staticmethod(next_token_fn)
+
+    @contextmanager
+    def _stage(self, name):
+        """Catat durasi satu tahap pipeline ke histogram metrik."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            STAGE_LATENCY.observe(end - start, stage=name)
+            trace = current_trace.get()
+            if trace is not None:
+                trace.record_stage(name, start, end)
+
+    @contextmanager
+    def _task_scope(self, task_id):
+        """Trace task aktif selama job; sesi profiling yang terikat ke task ditutup saat job selesai."""
+        try:
+            with activate_trace(progress_tracker.get_trace(task_id)):
+                yield
+        finally:
+            profile_capture.task_finished(task_id)
+            if CAPTION_STORE_ENABLED:
+                get_caption_store().flush()
+
+    def _count_model_call(self, model):
+        MODEL_CALLS.inc(model=model)
+        trace = current_trace.get()
+        if trace is not None:
+            trace.count_model_call(model)
+
     def _cleanup_all_directories(self):
-        """Hapus semua file dan folder dari direktori upload, output, dan processed images"""
+        """Hapus semua file dan folder dari direktori upload, output, dan processed images.
+
+        Subfolder <task_id>/ (hasil task yang dikelola RetentionManager) dan dotfile dibiarkan.
+        """
         directories_to_clean = [UPLOAD_DIR, OUTPUT_DIR, PROCESSED_IMAGES_DIR]
         
         for directory in directories_to_clean:
@@ -65,6 +325,8 @@ class ImageCaptionService:
                 try:
                     
                     for item in os.listdir(directory):
+                        if item.startswith(".") or is_task_id(item):
+                            continue
                         item_path = os.path.join(directory, item)
                         if os.path.isdir(item_path):
                             shutil.rmtree(item_path, ignore_errors=True)
@@ -74,8 +336,27 @@ class ImageCaptionService:
                 except Exception as e:
                     logging.error(f"Error cleaning directory {directory}: {e}")
 
+    def _workspace(self, task_id: str = None, scoped: bool = False) -> Workspace:
+        """Direktori kerja untuk job.
+
+        Default: direktori global yang dikosongkan dulu (satu job per proses API).
+        scoped=True (worker antrean): subfolder per task_id, sehingga beberapa worker
+        di host yang sama tidak saling menghapus hasil.
+        """
+        if scoped and task_id:
+            workspace = Workspace(*(os.path.join(d, task_id) for d in (UPLOAD_DIR, OUTPUT_DIR, PROCESSED_IMAGES_DIR)))
+            for directory in workspace:
+                shutil.rmtree(directory, ignore_errors=True)  # sisa percobaan sebelumnya (retry)
+            return workspace
+        self._cleanup_all_directories()
+        return Workspace(UPLOAD_DIR, OUTPUT_DIR, PROCESSED_IMAGES_DIR)
+
     def categorize_image_by_cosine(self, caption):
         """Menentukan kategori berdasarkan cosine similarity dengan prioritas."""
+        with self._stage("categorization"):
+            return self._categorize_image_by_cosine(caption)
+
+    def _categorize_image_by_cosine(self, caption):
         caption_lower = caption.lower()
 
         
@@ -97,40 +378,379 @@ class ImageCaptionService:
                 max_similarity = similarity_dict[cat]
                 selected_category = cat
 
-        
-        logging.info(f"Caption: '{caption}', Similarity scores: {similarity_dict}")
-
-        
         if max_similarity < 0.05:
-            logging.info(f"Caption: '{caption}' categorized as 'tidak dikategorikan' (score: {max_similarity:.4f})")
-            return "tidak dikategorikan", max_similarity
-        logging.info(f"Caption: '{caption}' categorized as '{selected_category}' (score: {max_similarity:.4f})")
+            selected_category = "tidak dikategorikan"
+        if sample_image_log():
+            logging.info("Caption categorized", extra={
+                "caption": caption,
+                "category": selected_category,
+                "score": round(float(max_similarity), 4),
+                "similarities": {cat: round(float(score), 4) for cat, score in similarity_dict.items()},
+            })
         return selected_category, max_similarity
 
     def _compute_bleu_score(self, caption, category):
         """Menghitung BLEU-1 score untuk caption terhadap kata kunci kategori."""
-        caption_tokens = caption.lower().split()
+        with self._stage("bleu"):
+            caption_tokens = caption.lower().split()
 
-        
-        if category == "tidak dikategorikan":
-            reference_tokens = [word for keywords in CATEGORY_KEYWORDS.values() for word in keywords]
-            references = [reference_tokens]  
-        else:
-            references = [CATEGORY_KEYWORDS[category]]  
+            
+            if category == "tidak dikategorikan":
+                reference_tokens = [word for keywords in CATEGORY_KEYWORDS.values() for word in keywords]
+                references = [reference_tokens]  
+            else:
+                references = [CATEGORY_KEYWORDS[category]]  
 
-        
-        bleu_score = sentence_bleu(references, caption_tokens, weights=(1, 0, 0, 0), smoothing_function=self._smoothing_function)
+            
+            bleu_score = sentence_bleu(references, caption_tokens, weights=(1, 0, 0, 0), smoothing_function=self._smoothing_function)
         return bleu_score
 
+    def _decode_image(self, image_path):
+        """Decode file gambar dan resize ke ukuran input ResNet50."""
+        with self._stage("decode"):
+            if isinstance(image_path, SharedImage):
+                return image_path.load()  # dari shared memory, atau tensor yang sudah di-decode API
+            return load_img(image_path, target_size=(224, 224))
+
+    def _prepare_input(self, img):
+        with self._stage("preprocess"):
+            img_array = img_to_array(img)
+            img_array = np.expand_dims(img_array, axis=0)
+            return preprocess_input(img_array)
+
+    def _extract_features(self, img_array):
+        with self._resident_models(), self._stage("feature_extraction"):
+            self._count_model_call("feature_extractor")
+            if self._feature_fn is not None:
+                features = self._feature_fn(tf.convert_to_tensor(img_array, self._feature_fn.input_signature[0].dtype)).numpy()
+            else:
+                features = self._feature_extractor.predict(img_array.astype(self._feature_extractor.inputs[0].dtype.name), verbose=0)
+            if MODEL_PRECISION != "float32" and not np.isfinite(features).all():
+                raise ValueError(f"Feature extractor overflowed in {MODEL_PRECISION}; set MODEL_PRECISION=float32")
+            # Indeks embedding, classifier dan dedup bekerja dalam float32 apa pun presisi model
+            return features.astype(np.float32, copy=False)
+
     def _preprocess_image(self, image_path):
-        img = load_img(image_path, target_size=(224, 224))
-        img_array = img_to_array(img)
-        img_array = np.expand_dims(img_array, axis=0)
-        img_array = preprocess_input(img_array)
-        features = self._feature_extractor.predict(img_array, verbose=0)
+        img = self._decode_image(image_path)
+        img_array = self._prepare_input(img)
+        features = self._extract_features(img_array)
         return features
 
+    def _analyze_image(self, image_path, filename, dedup_index=None, on_step=None, cascade=None):
+        """Jalankan decode, fitur, caption, kategori dan BLEU untuk satu gambar.
+
+        Jika `dedup_index` diberikan, gambar yang hampir identik dengan gambar
+        sebelumnya di job yang sama memakai ulang hasil gambar tersebut.
+        Jika `cascade` diberikan (mode cepat), classifier centroid menentukan
+        kategori langsung dari fitur dan caption hanya dibuat saat tidak yakin.
+        """
+        img = self._decode_image(image_path)
+        phash = None
+        candidates = []
+        if dedup_index is not None:
+            with self._stage("dedup"):
+                phash = difference_hash(img)
+                candidates = dedup_index.candidates(phash)
+            if candidates and not dedup_index.confirm_with_features:
+                return self._reuse_duplicate(candidates[0], None, on_step)
+
+        image_feature = self._extract_features(self._prepare_input(img))
+        if candidates:
+            with self._stage("dedup"):
+                representative = dedup_index.confirm(candidates, image_feature)
+            if representative is not None:
+                return self._reuse_duplicate(representative, image_feature, on_step)
+        if dedup_index is not None:
+            CACHE_REQUESTS.inc(cache="dedup", result="miss")
+
+        predicted, confidence, accept = None, None, False
+        if cascade is not None:
+            with self._stage("fast_classifier"):
+                predicted, confidence, accept = cascade.decide(image_feature)
+
+        if accept:
+            if on_step:
+                on_step("captioned")
+                on_step("categorized")
+            result = {
+                "caption": "",
+                "category": predicted,
+                "cosine_similarity": 0.0,
+                "bleu_score": 0.0,
+                "decided_by": "classifier",
+            }
+        else:
+            caption = self._generate_caption(image_feature)
+            if on_step:
+                on_step("captioned")
+            category, cosine_similarity = self.categorize_image_by_cosine(caption)
+            bleu_score = self._compute_bleu_score(caption, category)
+            if on_step:
+                on_step("categorized")
+            result = {
+                "caption": caption,
+                "category": category,
+                "cosine_similarity": cosine_similarity,
+                "bleu_score": bleu_score,
+                "decided_by": "caption",
+            }
+        result.update(duplicate_of=None, classifier_category=predicted, classifier_confidence=confidence)
+        if dedup_index is not None:
+            dedup_index.add(phash, image_feature, filename, result)
+        return dict(result, features=image_feature)
+
+    def _reuse_duplicate(self, representative, image_feature=None, on_step=None):
+        CACHE_REQUESTS.inc(cache="dedup", result="hit")
+        if on_step:
+            on_step("captioned")
+            on_step("categorized")
+        return dict(representative["result"], duplicate_of=representative["filename"], features=image_feature)
+
+    @property
+    def analysis_batch_size(self):
+        """Jumlah gambar yang dianalisis bersama (1 = jalur per gambar _analyze_image)"""
+        return max(self._feature_batch_size, self._caption_batch_size)
+
+    def _iter_batches(self, items):
+        iterator = iter(items)
+        while True:
+            batch = list(islice(iterator, self.analysis_batch_size))
+            if not batch:
+                return
+            yield batch
+
+    def _decode_images(self, sources):
+        """Decode beberapa gambar, paralel jika decode_workers > 1; error per gambar dikembalikan sebagai Exception."""
+        def decode(source):
+            try:
+                return self._decode_image(source)
+            except Exception as e:
+                return e
+
+        if self._decode_workers == 1 or len(sources) == 1:
+            return [decode(source) for source in sources]
+        cls = type(self)
+        if cls._decode_pool is None:
+            cls._decode_pool = ThreadPoolExecutor(max_workers=cls._decode_workers, thread_name_prefix="decode")
+        # Satu salinan context per gambar supaya stage decode tetap tercatat di trace task
+        futures = [cls._decode_pool.submit(contextvars.copy_context().run, decode, source) for source in sources]
+        return [future.result() for future in futures]
+
+    def _analyze_batch(self, sources, filenames, dedup_index=None, on_step=None, cascade=None):
+        """_analyze_image untuk beberapa gambar: fitur dalam batch feature_batch_size, caption dalam batch caption_batch_size.
+
+        Hasil sama dengan memanggil _analyze_image berurutan, termasuk duplikat di dalam batch
+        yang sama. Mengembalikan daftar analysis (atau Exception untuk gambar yang gagal), urut sesuai input.
+        """
+        results = [None] * len(sources)
+        images = self._decode_images(sources)
+        phashes = [None] * len(sources)
+        pending = []
+        for i, img in enumerate(images):
+            if isinstance(img, Exception):
+                results[i] = img
+                continue
+            if dedup_index is not None:
+                with self._stage("dedup"):
+                    phashes[i] = difference_hash(img)
+                    candidates = dedup_index.candidates(phashes[i])
+                if candidates and not dedup_index.confirm_with_features:
+                    results[i] = self._reuse_duplicate(candidates[0])
+                    continue
+            pending.append(i)
+
+        features = {}
+        for start in range(0, len(pending), self._feature_batch_size):
+            chunk = pending[start:start + self._feature_batch_size]
+            try:
+                arrays = [self._prepare_input(images[i]) for i in chunk]
+                batch_features = self._extract_features(np.concatenate(arrays))
+            except Exception as e:
+                for i in chunk:
+                    results[i] = e
+                continue
+            for i, feature in zip(chunk, batch_features):
+                features[i] = feature[np.newaxis, :]
+
+        # Urut sesuai input: gambar sebelumnya di batch ini sudah ada di dedup_index (hasilnya diisi setelah caption)
+        duplicates, to_caption, entry_ids = {}, [], {}
+        for i in pending:
+            if i not in features:
+                continue
+            image_feature = features[i]
+            if dedup_index is not None:
+                with self._stage("dedup"):
+                    candidates = dedup_index.candidates(phashes[i])
+                    if candidates and not dedup_index.confirm_with_features:
+                        representative = candidates[0]
+                    else:
+                        representative = dedup_index.confirm(candidates, image_feature) if candidates else None
+                if representative is not None:
+                    duplicates[i] = representative
+                    continue
+                CACHE_REQUESTS.inc(cache="dedup", result="miss")
+            predicted, confidence, accept = None, None, False
+            if cascade is not None:
+                with self._stage("fast_classifier"):
+                    predicted, confidence, accept = cascade.decide(image_feature)
+            if accept:
+                result = {"caption": "", "category": predicted, "cosine_similarity": 0.0, "bleu_score": 0.0,
+                          "decided_by": "classifier"}
+            else:
+                result = {}
+                to_caption.append(i)
+            result.update(duplicate_of=None, classifier_category=predicted, classifier_confidence=confidence)
+            if dedup_index is not None:
+                entry_ids[i] = dedup_index.add(phashes[i], image_feature, filenames[i], result)
+            results[i] = result
+
+        for start in range(0, len(to_caption), self._caption_batch_size):
+            chunk = to_caption[start:start + self._caption_batch_size]
+            try:
+                captions = self._generate_captions(np.concatenate([features[i] for i in chunk]))
+            except Exception as e:
+                for i in chunk:
+                    results[i] = e
+                    if i in entry_ids:
+                        # Tanpa kategori; duplikat di batch berikutnya dianalisis sendiri
+                        dedup_index.discard(entry_ids[i])
+                continue
+            for i, caption in zip(chunk, captions):
+                category, cosine_similarity = self.categorize_image_by_cosine(caption)
+                # Update di tempat: dict yang sama dipegang dedup_index untuk duplikat berikutnya
+                results[i].update(
+                    caption=caption,
+                    category=category,
+                    cosine_similarity=cosine_similarity,
+                    bleu_score=self._compute_bleu_score(caption, category),
+                    decided_by="caption",
+                )
+
+        for i in pending:
+            if i in duplicates:
+                if "category" not in duplicates[i]["result"]:
+                    results[i] = RuntimeError(f"Duplicate of {duplicates[i]['filename']}, which failed")
+                else:
+                    results[i] = self._reuse_duplicate(duplicates[i], features[i])
+            elif i in features and not isinstance(results[i], Exception):
+                results[i] = dict(results[i], features=features[i])
+        if on_step:
+            on_step("captioned")
+            on_step("categorized")
+        return results
+
+    def _analyze_features(self, features, cascade=None):
+        """Tahap setelah ResNet50 untuk fitur yang sudah jadi (mis. dihitung di perangkat): mode cepat, caption, kategori, BLEU.
+
+        `features` berbentuk (N, EMBEDDING_DIM); caption dibuat dalam batch caption_batch_size.
+        """
+        results, to_caption = [], []
+        for i, feature in enumerate(features):
+            image_feature = feature[np.newaxis, :]
+            predicted, confidence, accept = None, None, False
+            if cascade is not None:
+                with self._stage("fast_classifier"):
+                    predicted, confidence, accept = cascade.decide(image_feature)
+            if accept:
+                result = {"caption": "", "category": predicted, "cosine_similarity": 0.0, "bleu_score": 0.0,
+                          "decided_by": "classifier"}
+            else:
+                result = {}
+                to_caption.append(i)
+            result.update(duplicate_of=None, classifier_category=predicted, classifier_confidence=confidence,
+                          features=image_feature)
+            results.append(result)
+
+        for start in range(0, len(to_caption), self._caption_batch_size):
+            chunk = to_caption[start:start + self._caption_batch_size]
+            for i, caption in zip(chunk, self._generate_captions(features[chunk])):
+                category, cosine_similarity = self.categorize_image_by_cosine(caption)
+                results[i].update(
+                    caption=caption,
+                    category=category,
+                    cosine_similarity=cosine_similarity,
+                    bleu_score=self._compute_bleu_score(caption, category),
+                    decided_by="caption",
+                )
+        return results
+
+    def _index_embedding(self, analysis, row, task_id=None):
+        """Simpan fitur ResNet50 ke indeks gambar serupa (jika fitur tersedia)."""
+        if not EMBEDDING_INDEX_ENABLED or analysis.get("features") is None:
+            return
+        try:
+            with self._stage("embedding_index"):
+                get_embedding_index().add(
+                    analysis["features"],
+                    filename=row["filename"],
+                    task_id=task_id,
+                    category=row["category"],
+                    caption=row["caption"],
+                    image_path=row["image_path"],
+                    decided_by=row["decided_by"],
+                )
+        except OSError as e:
+            logging.error(f"Failed to index embedding for {row['filename']}: {e}")
+
+    def _store_caption(self, row, task_id=None):
+        """Simpan baris hasil ke riwayat caption yang bisa dicari (ditulis per batch)."""
+        if not CAPTION_STORE_ENABLED:
+            return
+        with self._stage("caption_store"):
+            get_caption_store().add(row, task_id)
+
+    def extract_features_from_bytes(self, data: bytes):
+        """Hitung fitur ResNet50 dari bytes gambar (mis. upload untuk pencarian gambar serupa)."""
+        img = self._decode_image(io.BytesIO(data))
+        return self._extract_features(self._prepare_input(img))
+
+    def _new_dedup_index(self):
+        return DuplicateIndex() if DEDUP_ENABLED else None
+
+    def _new_cascade(self, fast_mode, task_id=None):
+        """State mode cepat untuk satu job, atau None jika mode cepat tidak dipakai."""
+        if not fast_mode:
+            return None
+        if not category_classifier.refresh():  # dilatih ulang di proses lain sejak terakhir dimuat
+            logging.warning("Fast mode requested but no trained classifier is available; captioning every image")
+            return None
+        return CascadeJob(category_classifier, seed=task_id or "")
+
+    def _first_image_steps(self, task_id, caption_step):
+        """Hook progress untuk gambar pertama: caption_step -> kategorisasi -> organisasi."""
+        if not task_id:
+            return None
+
+        def on_step(event):
+            if event == "captioned":
+                progress_tracker.update_step(task_id, caption_step, "completed")
+                progress_tracker.update_step(task_id, caption_step + 1, "processing")
+            elif event == "categorized":
+                progress_tracker.update_step(task_id, caption_step + 1, "completed")
+                progress_tracker.update_step(task_id, caption_step + 2, "processing")
+
+        return on_step
+
+    @staticmethod
+    def _build_row(filename, analysis, image_path):
+        return {
+            "filename": filename,
+            "caption": analysis["caption"],
+            "category": analysis["category"],
+            "cosine_similarity": round(analysis["cosine_similarity"], 4),
+            "bleu_score": round(analysis["bleu_score"], 4),
+            "image_path": image_path,
+            "duplicate_of": analysis["duplicate_of"],
+            "decided_by": analysis["decided_by"],
+            "classifier_category": analysis["classifier_category"],
+            "classifier_confidence": analysis["classifier_confidence"],
+        }
+
     def _generate_caption(self, image_feature):
+        with self._resident_models(), self._stage("caption_decode"):
+            return self._decode_caption(image_feature)
+
+    def _decode_caption(self, image_feature):
         in_text = "startseq"
         for _ in range(self._max_length):
             sequence = self._tokenizer.texts_to_sequences([in_text])[0]
@@ -143,8 +763,8 @@ class ImageCaptionService:
                 sequence_input = sequence
             else:
                 raise ValueError(f"Unexpected sequence shape: {sequence.shape}")
-            yhat = self._model.predict([image_feature_input, sequence_input], verbose=0)
-            yhat = np.argmax(yhat)
+            self._count_model_call("caption_model")
+            yhat = self._next_token(image_feature_input, sequence_input)
             word = self._idx_to_word(yhat)
             if word is None or word == "endseq":
                 break
@@ -152,38 +772,103 @@ class ImageCaptionService:
         caption = in_text.replace("startseq", "").strip()
         return caption
 
+    def _generate_captions(self, image_features):
+        with self._resident_models(), self._stage("caption_decode"):
+            return self._decode_captions(image_features)
+
+    def _decode_captions(self, image_features):
+        """Greedy decoding beberapa gambar sekaligus: satu panggilan model per langkah untuk semua caption yang belum selesai."""
+        texts = ["startseq"] * len(image_features)
+        active = list(range(len(image_features)))
+        for _ in range(self._max_length):
+            sequences = pad_sequences(self._tokenizer.texts_to_sequences([texts[i] for i in active]), maxlen=self._max_length)
+            self._count_model_call("caption_model")
+            token_ids = self._next_tokens(image_features[active], sequences)
+            still_active = []
+            for i, token_id in zip(active, token_ids):
+                word = self._idx_to_word(int(token_id))
+                if word is None or word == "endseq":
+                    continue
+                texts[i] += " " + word
+                still_active.append(i)
+            active = still_active
+            if not active:
+                break
+        return [text.replace("startseq", "").strip() for text in texts]
+
+    def _next_token(self, image_feature, sequence):
+        """Id token berikutnya untuk satu gambar."""
+        return int(self._next_tokens(image_feature, sequence)[0])
+
+    def _next_tokens(self, image_features, sequences):
+        """Id token berikutnya untuk setiap baris batch."""
+        if self._next_token_fn is not None:
+            image_spec, sequence_spec = self._next_token_fn.input_signature
+            return self._next_token_fn(
+                tf.convert_to_tensor(image_features, image_spec.dtype),
+                tf.convert_to_tensor(sequences, sequence_spec.dtype),
+            ).numpy()
+        yhat = self._model.predict([image_features, sequences], verbose=0)
+        return np.argmax(yhat, axis=-1)
+
     def _idx_to_word(self, integer):
-        for word, index in self._tokenizer.word_index.items():
-            if index == integer:
-                return word
-        return None
+        return self._index_word.get(integer)
 
-    def _save_processed_image(self, source_path, filename, category):
+    @staticmethod
+    def _place_file(source_path, dest_path, data=None):
+        """Salin file sumber, atau tulis bytes (member arsip), ke dest_path."""
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+        if data is not None:
+            with open(dest_path, "wb") as f:
+                f.write(data)
+        else:
+            shutil.copy2(source_path, dest_path)
+
+    def _save_processed_image(self, source_path, filename, category, processed_dir=PROCESSED_IMAGES_DIR, data=None):
         """Simpan gambar ke direktori processed_images untuk response"""
         
-        os.makedirs(PROCESSED_IMAGES_DIR, exist_ok=True)
+        os.makedirs(processed_dir, exist_ok=True)
         
         
-        category_dir = os.path.join(PROCESSED_IMAGES_DIR, category)
+        category_dir = os.path.join(processed_dir, category)
         os.makedirs(category_dir, exist_ok=True)
         
         
         dest_path = os.path.join(category_dir, filename)
-        shutil.copy2(source_path, dest_path)
-        
+        self._place_file(source_path, dest_path, data)
         
-        return f"processed_images/{category}/{filename}"
+        # URL relatif terhadap mount /processed_images (termasuk subfolder task jika scoped)
+        relpath = os.path.relpath(dest_path, PROCESSED_IMAGES_DIR)
+        if relpath.startswith(".."):
+            relpath = os.path.join(category, filename)
+        return "processed_images/" + relpath.replace(os.sep, "/")
+
+    def _organize_image(self, source_path, filename, category, output_dir=OUTPUT_DIR, processed_dir=PROCESSED_IMAGES_DIR, data=None):
+        """Salin gambar ke folder kategori di output dan ke processed_images.
+
+        `filename` boleh berisi subfolder (path relatif dari arsip); `data` dipakai
+        sebagai isi file jika gambar tidak ada di disk.
+        """
+        with self._stage("file_organization"):
+            folder_path = os.path.join(output_dir, category)
+            os.makedirs(folder_path, exist_ok=True)
+            self._place_file(source_path, os.path.join(folder_path, filename), data)
+            return self._save_processed_image(source_path, filename, category, processed_dir, data)
 
-    def process_images(self, files, task_id: str = None):
+    def process_images(self, files, task_id: str = None, fast_mode: bool = False, scoped: bool = False):
+        with self._task_scope(task_id):
+            return self._process_images(files, task_id, fast_mode, scoped)
+
+    def _process_images(self, files, task_id: str = None, fast_mode: bool = False, scoped: bool = False):
         
-        self._cleanup_all_directories()
+        workspace = self._workspace(task_id, scoped)
         
         if task_id:
             progress_tracker.update_step(task_id, 0, "processing")  
         
-        os.makedirs(UPLOAD_DIR, exist_ok=True)
-        os.makedirs(OUTPUT_DIR, exist_ok=True)
-        os.makedirs(PROCESSED_IMAGES_DIR, exist_ok=True)
+        os.makedirs(workspace.upload_dir, exist_ok=True)
+        os.makedirs(workspace.output_dir, exist_ok=True)
+        os.makedirs(workspace.processed_dir, exist_ok=True)
 
         if task_id:
             progress_tracker.update_step(task_id, 0, "completed")
@@ -194,123 +879,183 @@ class ImageCaptionService:
             progress_tracker.update_step(task_id, 1, "completed")
             progress_tracker.update_step(task_id, 2, "processing")  
 
-        image_data = []
-        total_files = len(files)
+        image_data = ResultSpill(os.path.join(workspace.output_dir, RESULTS_FILENAME))
+        dedup_index = self._new_dedup_index()
+        cascade = self._new_cascade(fast_mode, task_id)
+        image_data.fast_mode_threshold = cascade.threshold if cascade is not None else None
+        categories = Counter()
+        started = time.perf_counter()
         
-        for i, file in enumerate(files):
-            file_path = os.path.join(UPLOAD_DIR, file.filename)
-            with open(file_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
+        i = 0
+        for batch in self._iter_batches(files):
+            task_scheduler.checkpoint(task_id)  # batal, atau beri giliran ke task interaktif
+            batch_analyses = None
+            if len(batch) > 1:
+                sources = [self._upload_source(file, workspace.upload_dir) for file in batch]
+                if task_id and i == 0:
+                    progress_tracker.update_step(task_id, 2, "completed")
+                    progress_tracker.update_step(task_id, 3, "processing")
+                on_step = self._first_image_steps(task_id, 3) if i == 0 else None
+                batch_analyses = self._analyze_batch(sources, [file.filename for file in batch], dedup_index, on_step, cascade)
+            for n, file in enumerate(batch):
+                with trace_image(file.filename), profile_capture.image(task_id):
+                    if batch_analyses is None:
+                        source = self._upload_source(file, workspace.upload_dir)
 
-            
-            if task_id and i == 0:
-                progress_tracker.update_step(task_id, 2, "completed")
-                progress_tracker.update_step(task_id, 3, "processing")  
+                        if task_id and i == 0:
+                            progress_tracker.update_step(task_id, 2, "completed")
+                            progress_tracker.update_step(task_id, 3, "processing")  
 
-            image_feature = self._preprocess_image(file_path)
-            caption = self._generate_caption(image_feature)
-            
-            
-            if task_id and i == 0:
-                progress_tracker.update_step(task_id, 3, "completed")
-                progress_tracker.update_step(task_id, 4, "processing")  
-
-            category, cosine_similarity = self.categorize_image_by_cosine(caption)
-            bleu_score = self._compute_bleu_score(caption, category)
+                        on_step = self._first_image_steps(task_id, 3) if i == 0 else None
+                        analysis = self._analyze_image(source, file.filename, dedup_index, on_step, cascade)
+                    else:
+                        source = sources[n]
+                        analysis = batch_analyses[n]
+                        if isinstance(analysis, Exception):
+                            raise analysis
 
-            
-            if task_id and i == 0:
-                progress_tracker.update_step(task_id, 4, "completed")
-                progress_tracker.update_step(task_id, 5, "processing")  
-
-            
-            folder_path = os.path.join(OUTPUT_DIR, category)
-            os.makedirs(folder_path, exist_ok=True)
-            shutil.copy2(file_path, os.path.join(folder_path, file.filename))
-            
-            
-            processed_image_path = self._save_processed_image(file_path, file.filename, category)
+                    shared = isinstance(source, SharedImage)
+                    processed_image_path = self._organize_image(
+                        None if shared else source, file.filename, analysis["category"], workspace.output_dir,
+                        workspace.processed_dir, data=source.data if shared else None,
+                    )
 
-            image_data.append({
-                "filename": file.filename,
-                "caption": caption,
-                "category": category,
-                "cosine_similarity": round(cosine_similarity, 4),
-                "bleu_score": round(bleu_score, 4),
-                "image_path": processed_image_path  
-            })
+                    row = self._build_row(file.filename, analysis, processed_image_path)
+                    image_data.append(row)
+                    self._index_embedding(analysis, row, task_id)
+                    self._store_caption(row, task_id)
+                    categories[row["category"]] += 1
+                    IMAGES_PROCESSED.inc(job_type="images", status="ok")
+                i += 1
+        image_data.close()
+        self._log_job_summary("images", task_id, categories, 0, started)
 
         if task_id:
             progress_tracker.update_step(task_id, 5, "completed")
             progress_tracker.update_step(task_id, 6, "processing")  
 
-        self._generate_excel(image_data)
+        self._generate_excel(image_data, workspace.output_dir)
         
         if task_id:
             progress_tracker.update_step(task_id, 6, "completed")
             progress_tracker.update_step(task_id, 7, "processing")  
 
-        zip_path = self._generate_zip()
+        zip_path = self._generate_zip(workspace.output_dir)
 
         if task_id:
             progress_tracker.update_step(task_id, 7, "completed")
             progress_tracker.update_step(task_id, 8, "processing")  
 
         
-        for item in os.listdir(OUTPUT_DIR):
-            item_path = os.path.join(OUTPUT_DIR, item)
-            if item_path != zip_path:
-                if os.path.isdir(item_path):
-                    shutil.rmtree(item_path)
-                elif os.path.isfile(item_path) and not item.endswith('.zip'):
-                    os.remove(item_path)
+        self._clear_output(workspace.output_dir, zip_path)
 
         
-        if os.path.exists(UPLOAD_DIR):
-            shutil.rmtree(UPLOAD_DIR, ignore_errors=True)
-            os.makedirs(UPLOAD_DIR, exist_ok=True)
+        if os.path.exists(workspace.upload_dir):
+            shutil.rmtree(workspace.upload_dir, ignore_errors=True)
+            if not scoped:
+                os.makedirs(workspace.upload_dir, exist_ok=True)
 
         if task_id:
             progress_tracker.update_step(task_id, 8, "completed")
 
         return zip_path, image_data
 
-    def _generate_excel(self, image_data):
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "Image Categorization"
-        ws.append(["Filename", "Caption", "Category", "Cosine Similarity Score", "BLEU-1 Score"])
+    def _upload_source(self, file, upload_dir):
+        """Sumber decode untuk satu upload: path setelah disimpan, atau SharedImage apa adanya (tanpa tulis ke disk)."""
+        if isinstance(file, SharedImage):
+            return file
+        return self._save_upload(file, upload_dir)
+
+    @staticmethod
+    def _save_upload(file, upload_dir):
+        file_path = os.path.join(upload_dir, file.filename)
+        with open(file_path, "wb") as buffer:
+            shutil.copyfileobj(file.file, buffer)
+        return file_path
+
+    @staticmethod
+    def _clear_output(output_dir, zip_path):
+        """Hapus isi output kecuali ZIP hasil, laporan Excel dan results.jsonl (+ indeksnya)"""
+        for item in os.listdir(output_dir):
+            item_path = os.path.join(output_dir, item)
+            if item_path != zip_path and item not in (RESULTS_FILENAME, RESULTS_INDEX_FILENAME, REPORT_FILENAME):
+                if os.path.isdir(item_path):
+                    shutil.rmtree(item_path)
+                elif os.path.isfile(item_path) and not item.endswith('.zip'):
+                    os.remove(item_path)
+
+    def _generate_excel(self, image_data, output_dir=OUTPUT_DIR):
+        with self._stage("excel"):
+            self._write_excel(image_data, output_dir)
+
+    def _write_excel(self, image_data, output_dir):
+        # write_only: baris langsung di-stream ke file, bukan disimpan sebagai sel di memori
+        wb = openpyxl.Workbook(write_only=True)
+        ws = wb.create_sheet("Image Categorization")
+        ws.append([
+            "Filename", "Caption", "Category", "Cosine Similarity Score", "BLEU-1 Score", "Duplicate Of",
+            "Decided By", "Classifier Category", "Classifier Confidence",
+        ])
         for data in image_data:
+            confidence = data.get("classifier_confidence")
             ws.append([
                 data["filename"],
                 data["caption"],
                 data["category"],
                 data["cosine_similarity"],
-                data["bleu_score"]
+                data["bleu_score"],
+                data.get("duplicate_of") or "",
+                data.get("decided_by", "caption"),
+                data.get("classifier_category") or "",
+                round(confidence, 4) if confidence is not None else "",
             ])
-        wb.save(os.path.join(OUTPUT_DIR, "detail_folderisasi.xlsx"))
+        wb.save(os.path.join(output_dir, REPORT_FILENAME))
 
-    def _generate_zip(self):
-        zip_path = os.path.join(OUTPUT_DIR, "hasil_folderisasi.zip")
+    def _generate_zip(self, output_dir=OUTPUT_DIR):
+        with self._stage("zip"):
+            return self._write_zip(output_dir)
+
+    def _write_zip(self, output_dir):
+        zip_path = os.path.join(output_dir, "hasil_folderisasi.zip")
         with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zipf:
-            for root, _, files in os.walk(OUTPUT_DIR):
+            for root, _, files in os.walk(output_dir):
                 for file in files:
                     file_path = os.path.join(root, file)
-                    if file_path != zip_path:
-                        arcname = os.path.relpath(file_path, OUTPUT_DIR)
+                    if file_path != zip_path and os.path.relpath(file_path, output_dir) not in (
+                            RESULTS_FILENAME, RESULTS_INDEX_FILENAME):
+                        arcname = os.path.relpath(file_path, output_dir)
                         zipf.write(file_path, arcname)
         return zip_path
 
-    def process_folder(self, folder_path: str, task_id: str = None):
+    def process_folder(self, folder_path: str, task_id: str = None, fast_mode: bool = False, scoped: bool = False):
         """Process all images in a folder and its subdirectories"""
+        with self._task_scope(task_id):
+            workspace = self._start_folder_job(task_id, scoped)
+            # Satu pass: gambar diproses sambil direktori dibaca, total berjalan ada di scan.found
+            return self._process_source(DirectoryScan(folder_path), None, task_id, fast_mode, workspace)
+
+    def process_archive(self, archive, filename: str, task_id: str = None, fast_mode: bool = False,
+                        scoped: bool = False):
+        """Process image members of a ZIP/tar archive (path or file object) without extracting it.
+
+        Relative paths inside the archive are kept in the output tree and report.
+        """
+        with self._task_scope(task_id):
+            workspace = self._start_folder_job(task_id, scoped)
+            total_images = count_archive(archive, filename)
+            if hasattr(archive, "seek"):
+                archive.seek(0)
+            return self._process_source(iter_archive(archive, filename), total_images, task_id, fast_mode, workspace)
+
+    def _start_folder_job(self, task_id: str = None, scoped: bool = False) -> Workspace:
         
-        self._cleanup_all_directories()
+        workspace = self._workspace(task_id, scoped)
         
         if task_id:
             progress_tracker.update_step(task_id, 0, "processing")  
             
-        os.makedirs(OUTPUT_DIR, exist_ok=True)
-        os.makedirs(PROCESSED_IMAGES_DIR, exist_ok=True)
+        os.makedirs(workspace.output_dir, exist_ok=True)
+        os.makedirs(workspace.processed_dir, exist_ok=True)
         
         if task_id:
             progress_tracker.update_step(task_id, 0, "completed")
@@ -320,103 +1065,200 @@ class ImageCaptionService:
         if task_id:
             progress_tracker.update_step(task_id, 1, "completed")
             progress_tracker.update_step(task_id, 2, "processing")  
-        
-        image_extensions = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.webp'}
-        image_data = []
+
+        return workspace
+
+    def _process_source(self, images, total_images, task_id: str = None, fast_mode: bool = False,
+                        workspace: Workspace = None):
+        """Kategorikan setiap SourceImage (file di disk atau member arsip) lalu buat Excel dan ZIP."""
+        workspace = workspace or Workspace(UPLOAD_DIR, OUTPUT_DIR, PROCESSED_IMAGES_DIR)
+        image_data = ResultSpill(os.path.join(workspace.output_dir, RESULTS_FILENAME))
         processed_count = 0
-        
-        
-        total_images = 0
-        for root, dirs, files in os.walk(folder_path):
-            for filename in files:
-                file_ext = os.path.splitext(filename)[1].lower()
-                if file_ext in image_extensions:
-                    total_images += 1
+        errors = 0
+        dedup_index = self._new_dedup_index()
+        cascade = self._new_cascade(fast_mode, task_id)
+        image_data.fast_mode_threshold = cascade.threshold if cascade is not None else None
+        categories = Counter()
+        started = time.perf_counter()
         
         if task_id:
             progress_tracker.update_step(task_id, 2, "completed")
             progress_tracker.update_step(task_id, 3, "processing")  
         
-        for root, dirs, files in os.walk(folder_path):
-            for filename in files:
-                file_ext = os.path.splitext(filename)[1].lower()
-                if file_ext in image_extensions:
-                    file_path = os.path.join(root, filename)
-                    
+        for batch in self._iter_batches(images):
+            task_scheduler.checkpoint(task_id)  # batal, atau beri giliran ke task interaktif
+            batch_analyses = None
+            if len(batch) > 1:
+                if task_id and processed_count == 0:
+                    progress_tracker.update_step(task_id, 3, "completed")
+                    progress_tracker.update_step(task_id, 4, "processing")
+                on_step = self._first_image_steps(task_id, 4) if processed_count == 0 else None
+                sources = [image.path if image.path is not None else io.BytesIO(image.data) for image in batch]
+                try:
+                    batch_analyses = self._analyze_batch(sources, [image.name for image in batch], dedup_index, on_step, cascade)
+                except Exception as e:
+                    batch_analyses = [e] * len(batch)
+
+            for n, image in enumerate(batch):
+                filename = image.name
+                with trace_image(filename), profile_capture.image(task_id):
                     try:
-                        
-                        if task_id and processed_count == 0:
-                            progress_tracker.update_step(task_id, 3, "completed")
-                            progress_tracker.update_step(task_id, 4, "processing")  
-                        
-                        image_feature = self._preprocess_image(file_path)
-                        caption = self._generate_caption(image_feature)
-                        
-                        
-                        if task_id and processed_count == 0:
-                            progress_tracker.update_step(task_id, 4, "completed")
-                            progress_tracker.update_step(task_id, 5, "processing")  
-                        
-                        category, cosine_similarity = self.categorize_image_by_cosine(caption)
-                        bleu_score = self._compute_bleu_score(caption, category)
-
-                        
-                        if task_id and processed_count == 0:
-                            progress_tracker.update_step(task_id, 5, "completed")
-                            progress_tracker.update_step(task_id, 6, "processing")  
-
-                        
-                        folder_path_out = os.path.join(OUTPUT_DIR, category)
-                        os.makedirs(folder_path_out, exist_ok=True)
-                        shutil.copy2(file_path, os.path.join(folder_path_out, filename))
-                        
-                        
-                        processed_image_path = self._save_processed_image(file_path, filename, category)
-
-                        image_data.append({
-                            "filename": filename,
-                            "caption": caption,
-                            "category": category,
-                            "cosine_similarity": round(cosine_similarity, 4),
-                            "bleu_score": round(bleu_score, 4),
-                            "image_path": processed_image_path
-                        })
+                        if batch_analyses is not None:
+                            analysis = batch_analyses[n]
+                            if isinstance(analysis, Exception):
+                                raise analysis
+                        else:
+                            if task_id and processed_count == 0:
+                                progress_tracker.update_step(task_id, 3, "completed")
+                                progress_tracker.update_step(task_id, 4, "processing")  
+
+                            on_step = self._first_image_steps(task_id, 4) if processed_count == 0 else None
+                            source = image.path if image.path is not None else io.BytesIO(image.data)
+                            analysis = self._analyze_image(source, filename, dedup_index, on_step, cascade)
+
+                        processed_image_path = self._organize_image(
+                            image.path, filename, analysis["category"], workspace.output_dir, workspace.processed_dir,
+                            data=image.data,
+                        )
+
+                        row = self._build_row(filename, analysis, processed_image_path)
+                        image_data.append(row)
+                        self._index_embedding(analysis, row, task_id)
+                        self._store_caption(row, task_id)
                         processed_count += 1
-                        logging.info(f"Processed: {filename} ({processed_count}/{total_images})")
-                        
+                        categories[row["category"]] += 1
+                        IMAGES_PROCESSED.inc(job_type="folder", status="ok")
+                        if sample_image_log():
+                            logging.info(f"Processed: {filename} ({processed_count}/{self._running_total(images, total_images)})",
+                                         extra={"image": filename, "category": row["category"]})
+
                     except Exception as e:
-                        logging.error(f"Error processing {filename}: {e}")
+                        errors += 1
+                        IMAGES_PROCESSED.inc(job_type="folder", status="error")
+                        logging.error(f"Error processing {filename}: {e}", extra={"image": filename})
                         continue
+        image_data.close()
+        self._log_job_summary("folder", task_id, categories, errors, started)
 
         if image_data:
             if task_id:
                 progress_tracker.update_step(task_id, 6, "completed")
                 progress_tracker.update_step(task_id, 7, "processing")  
                 
-            self._generate_excel(image_data)
+            self._generate_excel(image_data, workspace.output_dir)
             
             if task_id:
                 progress_tracker.update_step(task_id, 7, "completed")
                 progress_tracker.update_step(task_id, 8, "processing")  
                 
-            zip_path = self._generate_zip()
+            zip_path = self._generate_zip(workspace.output_dir)
 
             if task_id:
                 progress_tracker.update_step(task_id, 8, "completed")
                 progress_tracker.update_step(task_id, 9, "processing")  
 
             
-            for item in os.listdir(OUTPUT_DIR):
-                item_path = os.path.join(OUTPUT_DIR, item)
-                if item_path != zip_path:
-                    if os.path.isdir(item_path):
-                        shutil.rmtree(item_path)
-                    elif os.path.isfile(item_path) and not item.endswith('.zip'):
-                        os.remove(item_path)
+            self._clear_output(workspace.output_dir, zip_path)
 
             if task_id:
                 progress_tracker.update_step(task_id, 9, "completed")
 
             return zip_path, processed_count, image_data
         
-        return None, 0, []
\ No newline at end of file
+        image_data.remove()
+        return None, 0, []
+
+    def process_features(self, vectors, filenames, task_id: str = None, fast_mode: bool = False, scoped: bool = False):
+        """Kategorikan vektor fitur ResNet50 dari perangkat: tanpa decode gambar dan ekstraksi fitur.
+
+        Hasilnya baris ImageCategorization yang sama (image_path kosong karena tidak ada gambar),
+        laporan Excel dan ZIP berisi laporan tersebut.
+        """
+        with self._task_scope(task_id):
+            return self._process_features(vectors, filenames, task_id, fast_mode, scoped)
+
+    def _process_features(self, vectors, filenames, task_id: str = None, fast_mode: bool = False, scoped: bool = False):
+        workspace = self._workspace(task_id, scoped)
+        os.makedirs(workspace.output_dir, exist_ok=True)
+        if task_id:
+            for step in (0, 1, 2):
+                progress_tracker.update_step(task_id, step, "completed")
+            progress_tracker.update_step(task_id, 3, "processing")
+
+        image_data = ResultSpill(os.path.join(workspace.output_dir, RESULTS_FILENAME))
+        cascade = self._new_cascade(fast_mode, task_id)
+        image_data.fast_mode_threshold = cascade.threshold if cascade is not None else None
+        processed_count = 0
+        errors = 0
+        categories = Counter()
+        started = time.perf_counter()
+        captioned = False
+        # Batch baca memmap + titik pembatalan; caption tetap dibuat per caption_batch_size
+        batch_size = max(self._caption_batch_size, 32)
+        for start in range(0, len(vectors), batch_size):
+            task_scheduler.checkpoint(task_id)  # batal, atau beri giliran ke task interaktif
+            names = filenames[start:start + batch_size]
+            try:
+                # Salinan float32 hanya untuk batch ini; sisanya tetap di file (memmap)
+                analyses = self._analyze_features(np.array(vectors[start:start + batch_size], dtype=np.float32), cascade)
+            except Exception as e:
+                errors += len(names)
+                IMAGES_PROCESSED.inc(len(names), job_type="features", status="error")
+                logging.error(f"Error processing feature vectors {start}-{start + len(names) - 1}: {e}")
+                continue
+            for filename, analysis in zip(names, analyses):
+                row = self._build_row(filename, analysis, None)
+                image_data.append(row)
+                self._index_embedding(analysis, row, task_id)
+                self._store_caption(row, task_id)
+                processed_count += 1
+                categories[row["category"]] += 1
+                IMAGES_PROCESSED.inc(job_type="features", status="ok")
+            if task_id and not captioned:
+                progress_tracker.update_step(task_id, 3, "completed")
+                progress_tracker.update_step(task_id, 4, "processing")
+            captioned = True
+        image_data.close()
+        self._log_job_summary("features", task_id, categories, errors, started)
+
+        if not image_data:
+            image_data.remove()
+            return None, 0, []
+        if task_id:
+            progress_tracker.update_step(task_id, 4, "completed")
+            progress_tracker.update_step(task_id, 5, "processing")
+        self._generate_excel(image_data, workspace.output_dir)
+        if task_id:
+            progress_tracker.update_step(task_id, 5, "completed")
+            progress_tracker.update_step(task_id, 6, "processing")
+        zip_path = self._generate_zip(workspace.output_dir)
+        self._clear_output(workspace.output_dir, zip_path)
+        if task_id:
+            progress_tracker.update_step(task_id, 6, "completed")
+            progress_tracker.update_step(task_id, 7, "completed")
+        return zip_path, processed_count, image_data
+
+    @staticmethod
+    def _log_job_summary(job_type, task_id, categories, errors, started):
+        """Satu baris ringkasan per job (log per gambar hanya sampel, lihat LOG_IMAGE_SAMPLE_RATE)."""
+        elapsed = time.perf_counter() - started
+        images = sum(categories.values())
+        logging.info(f"Job {task_id or '-'} categorized {images} images ({errors} errors) in {elapsed:.2f}s", extra={
+            "job_type": job_type,
+            "task_id": task_id,
+            "images": images,
+            "errors": errors,
+            "categories": dict(categories),
+            "elapsed_s": round(elapsed, 3),
+            "images_per_s": round(images / elapsed, 3) if elapsed > 0 and images else None,
+        })
+
+    @staticmethod
+    def _running_total(images, total_images):
+        """Total gambar untuk log: diketahui di awal (ZIP), berjalan (scan direktori), atau '?'"""
+        if total_images is not None:
+            return total_images
+        found = getattr(images, "found", None)
+        if found is None:
+            return "?"
+        return found if images.complete else f"{found}+"
@@ -0,0 +1,177 @@
+import logging
+import os
+import posixpath
+import tarfile
+import zipfile
+from typing import IO, Iterator, NamedTuple, Optional, Union
+
+from src.app.config.settings import ARCHIVE_MAX_MEMBER_BYTES
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.webp'}
+ARCHIVE_SUFFIXES = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+
+
+class SourceImage(NamedTuple):
+    """One image to process: `name` is used for the output tree and report.
+
+    Directory images have a `path` on disk; archive members carry their bytes in `data`.
+    """
+    name: str
+    path: Optional[str] = None
+    data: Optional[bytes] = None
+
+
+def is_image_name(name: str) -> bool:
+    return os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+
+
+def is_archive(filename: str) -> bool:
+    return (filename or "").lower().endswith(ARCHIVE_SUFFIXES)
+
+
+class DirectoryScan:
+    """Images under folder_path (all subdirectories), named by their basename.
+
+    A single lazy os.scandir pass in os.walk order (top-down, symlinked directories
+    not followed): images are yielded as directories are read, without a counting
+    pass first. `found` is the running total; it is the final count once `complete`.
+    """
+
+    def __init__(self, folder_path: str):
+        self.folder_path = folder_path
+        self.found = 0
+        self.complete = False
+
+    def __iter__(self) -> Iterator[SourceImage]:
+        pending = [self.folder_path]
+        while pending:
+            try:
+                entries = os.scandir(pending.pop())
+            except OSError as e:
+                logging.warning(f"Cannot read directory: {e}")
+                continue
+            subdirs = []
+            with entries:
+                for entry in entries:
+                    try:
+                        is_dir = entry.is_dir()
+                    except OSError:
+                        continue
+                    if is_dir:
+                        if not entry.is_symlink():
+                            subdirs.append(entry.path)
+                    elif is_image_name(entry.name):
+                        self.found += 1
+                        yield SourceImage(entry.name, path=entry.path)
+            pending.extend(reversed(subdirs))
+        self.complete = True
+
+
+def iter_directory(folder_path: str) -> Iterator[SourceImage]:
+    return iter(DirectoryScan(folder_path))
+
+
+def count_directory(folder_path: str) -> int:
+    return sum(1 for _ in iter_directory(folder_path))
+
+
+def _member_relpath(name: str) -> Optional[str]:
+    """Normalised relative path of an archive member, or None if it must be skipped"""
+    name = name.replace("\\", "/")
+    relpath = posixpath.normpath(name).lstrip("/")
+    if relpath in ("", ".") or relpath.startswith("../") or relpath == "..":
+        logging.warning(f"Skipping archive member with unsafe path: {name}")
+        return None
+    base = posixpath.basename(relpath)
+    # Metadata resource-fork macOS dan file tersembunyi bukan gambar
+    if relpath.startswith("__MACOSX/") or base.startswith("."):
+        return None
+    if not is_image_name(base):
+        return None
+    return relpath
+
+
+def _read_limited(stream: IO[bytes], name: str) -> Optional[bytes]:
+    # Ukuran di header bisa bohong (zip bomb): baca maksimal batas + 1 byte
+    data = stream.read(ARCHIVE_MAX_MEMBER_BYTES + 1)
+    if len(data) > ARCHIVE_MAX_MEMBER_BYTES:
+        logging.warning(f"Skipping archive member larger than {ARCHIVE_MAX_MEMBER_BYTES} bytes: {name}")
+        return None
+    return data
+
+
+def iter_archive(archive: Union[str, IO[bytes]], filename: str = "") -> Iterator[SourceImage]:
+    """Stream image members of a ZIP or tar archive without extracting to disk.
+
+    `archive` is a path or a binary file object (a ZIP needs it to be seekable;
+    tar members are read sequentially). Members are named by their relative path
+    inside the archive. Raises ValueError for unreadable archives.
+    """
+    name = (filename or (archive if isinstance(archive, str) else "")).lower()
+    if name.endswith(".zip"):
+        yield from _iter_zip(archive)
+    else:
+        yield from _iter_tar(archive)
+
+
+def _iter_zip(archive) -> Iterator[SourceImage]:
+    try:
+        zf = zipfile.ZipFile(archive)
+    except (zipfile.BadZipFile, OSError) as e:
+        raise ValueError(f"Invalid ZIP archive: {e}")
+    with zf:
+        for info in zf.infolist():
+            if info.is_dir():
+                continue
+            relpath = _member_relpath(info.filename)
+            if relpath is None:
+                continue
+            if info.file_size > ARCHIVE_MAX_MEMBER_BYTES:
+                logging.warning(f"Skipping archive member larger than {ARCHIVE_MAX_MEMBER_BYTES} bytes: {relpath}")
+                continue
+            with zf.open(info) as member:
+                data = _read_limited(member, relpath)
+            if data is not None:
+                yield SourceImage(relpath, data=data)
+
+
+def _iter_tar(archive) -> Iterator[SourceImage]:
+    try:
+        # Mode stream "r|*": member dibaca berurutan, kompresi gz/bz2/xz terdeteksi otomatis
+        if isinstance(archive, str):
+            tf = tarfile.open(archive, mode="r|*")
+        else:
+            tf = tarfile.open(fileobj=archive, mode="r|*")
+    except (tarfile.TarError, OSError) as e:
+        raise ValueError(f"Invalid tar archive: {e}")
+    with tf:
+        try:
+            for member in tf:
+                if not member.isfile():
+                    continue  # symlink/hardlink/device di dalam tar tidak diikuti
+                relpath = _member_relpath(member.name)
+                if relpath is None:
+                    continue
+                if member.size > ARCHIVE_MAX_MEMBER_BYTES:
+                    logging.warning(f"Skipping archive member larger than {ARCHIVE_MAX_MEMBER_BYTES} bytes: {relpath}")
+                    continue
+                stream = tf.extractfile(member)
+                if stream is None:
+                    continue
+                data = _read_limited(stream, relpath)
+                if data is not None:
+                    yield SourceImage(relpath, data=data)
+        except tarfile.TarError as e:
+            raise ValueError(f"Invalid tar archive: {e}")
+
+
+def count_archive(archive: Union[str, IO[bytes]], filename: str = "") -> Optional[int]:
+    """Number of image members for ZIPs (from the central directory); None for tar streams"""
+    name = (filename or (archive if isinstance(archive, str) else "")).lower()
+    if not name.endswith(".zip"):
+        return None
+    try:
+        with zipfile.ZipFile(archive) as zf:
+            return sum(1 for info in zf.infolist() if not info.is_dir() and _member_relpath(info.filename))
+    except (zipfile.BadZipFile, OSError) as e:
+        raise ValueError(f"Invalid ZIP archive: {e}")
@@ -0,0 +1,360 @@
+import json
+import logging
+import os
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Dict, Iterable, NamedTuple, Optional
+
+from src.app.config.settings import (
+    INTERACTIVE_MAX_IMAGES,
+    JOB_LEASE_SECONDS,
+    JOB_MAX_ATTEMPTS,
+    JOB_QUEUE_BACKEND,
+    JOB_QUEUE_PATH,
+)
+
+JOB_STATUSES = ("queued", "running", "done", "failed", "cancelled")
+
+# Urutan claim: angka kecil duluan
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 1
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_BULK: "bulk"}
+
+
+def job_priority(job_type: str, payload: dict) -> int:
+    """Small image / feature uploads are interactive; folders, archives and large uploads are bulk"""
+    if job_type in ("images", "features") and len(payload.get("files") or payload.get("filenames") or ()) <= INTERACTIVE_MAX_IMAGES:
+        return PRIORITY_INTERACTIVE
+    return PRIORITY_BULK
+
+
+class Job(NamedTuple):
+    """A claimed job: `payload` is the JSON-decoded dict given to enqueue"""
+    id: str
+    job_type: str
+    payload: dict
+    attempts: int
+    priority: int = 1  # PRIORITY_BULK
+
+
+class JobQueue(ABC):
+    """Durable queue of image/folder jobs shared by the API and worker processes.
+
+    Jobs are keyed by task_id and claimed by priority, then age. A worker claims a job
+    under a lease and must call `heartbeat` before it runs out; jobs whose lease expired (worker killed or host
+    lost) are handed out again until JOB_MAX_ATTEMPTS, then marked failed. Progress
+    is stored as the serialized ProcessingProgress so any API process can answer
+    /v1/progress for any job; the final TaskTraceReport (JSON) is stored the same way for
+    /v1/progress/{id}/trace. Cancelling a running job only sets a flag; the worker
+    polls `cancel_requested` and stops between images. Implementations only need these methods, so a real
+    broker (Redis, SQS, ...) can replace the SQLite one without touching callers; a backend missing
+    one fails when it is constructed.
+    """
+
+    @abstractmethod
+    def enqueue(self, job_id: str, job_type: str, payload: dict, progress: Optional[str] = None,
+                priority: int = PRIORITY_BULK, images: int = 0, size_bytes: int = 0):
+        ...
+
+    @abstractmethod
+    def claim(self, worker_id: str, lease_seconds: float = JOB_LEASE_SECONDS) -> Optional[Job]:
+        ...
+
+    @abstractmethod
+    def heartbeat(self, job_id: str, worker_id: str, lease_seconds: float = JOB_LEASE_SECONDS) -> bool:
+        ...
+
+    @abstractmethod
+    def save_progress(self, job_id: str, progress: str):
+        ...
+
+    @abstractmethod
+    def finish(self, job_id: str, worker_id: str, progress: str, failed: bool = False,
+               cancelled: bool = False, trace: Optional[str] = None) -> bool:
+        ...
+
+    @abstractmethod
+    def cancel(self, job_id: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    def cancel_requested(self, job_id: str) -> bool:
+        ...
+
+    @abstractmethod
+    def queue_position(self, job_id: str) -> Optional[int]:
+        ...
+
+    @abstractmethod
+    def backlog(self) -> Dict[str, int]:
+        ...
+
+    @abstractmethod
+    def recent_throughput(self, limit: int) -> Optional[tuple]:
+        ...
+
+    @abstractmethod
+    def get(self, job_id: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    def get_trace(self, job_id: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    def counts(self) -> Dict[str, int]:
+        ...
+
+    @abstractmethod
+    def purge(self, older_than: float, job_ids: Iterable[str] = ()) -> int:
+        ...
+
+
+class SQLiteJobQueue(JobQueue):
+    """JobQueue in one SQLite file (WAL mode).
+
+    Claims run inside BEGIN IMMEDIATE, so concurrent workers on the same host never
+    receive the same job. Across hosts the file must sit on storage with working
+    POSIX locks; otherwise swap in a broker-backed JobQueue.
+    """
+
+    def __init__(self, path: str = JOB_QUEUE_PATH, max_attempts: int = JOB_MAX_ATTEMPTS):
+        self.path = path
+        self.max_attempts = max_attempts
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    job_type TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'queued',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    max_attempts INTEGER NOT NULL,
+                    worker_id TEXT,
+                    lease_expires_at REAL,
+                    progress TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    priority INTEGER NOT NULL DEFAULT 1,
+                    cancel_requested INTEGER NOT NULL DEFAULT 0,
+                    images INTEGER NOT NULL DEFAULT 0,
+                    size_bytes INTEGER NOT NULL DEFAULT 0,
+                    trace TEXT
+                )
+            """)
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for column in ("priority", "cancel_requested", "images", "size_bytes"):
+                if column not in columns:  # file antrean dari versi sebelumnya
+                    default = PRIORITY_BULK if column == "priority" else 0
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} INTEGER NOT NULL DEFAULT {default}")
+            if "trace" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN trace TEXT")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status_priority ON jobs (status, priority, created_at)")
+
+    @contextmanager
+    def _connect(self):
+        # Satu koneksi per operasi (autocommit): aman dipakai dari banyak thread dan setelah fork
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def enqueue(self, job_id: str, job_type: str, payload: dict, progress: Optional[str] = None,
+                priority: int = PRIORITY_BULK, images: int = 0, size_bytes: int = 0):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, job_type, payload, max_attempts, progress, created_at, priority, images, size_bytes) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, job_type, json.dumps(payload), self.max_attempts, progress, time.time(), priority,
+                 images, size_bytes),
+            )
+
+    def _expire_leases(self, conn: sqlite3.Connection, now: float):
+        """Requeue running jobs whose worker stopped heartbeating, or fail them when out of attempts"""
+        expired = conn.execute(
+            "SELECT id, attempts, max_attempts, worker_id FROM jobs WHERE status = 'running' AND lease_expires_at < ?",
+            (now,),
+        ).fetchall()
+        for row in expired:
+            if row["attempts"] >= row["max_attempts"]:
+                logging.warning(f"Job {row['id']} failed: lease expired on attempt {row['attempts']} (worker {row['worker_id']})")
+                conn.execute(
+                    "UPDATE jobs SET status = 'failed', worker_id = NULL, finished_at = ?, error = ? WHERE id = ?",
+                    (now, f"Worker stopped responding ({row['attempts']} attempts)", row["id"]),
+                )
+            else:
+                logging.warning(f"Job {row['id']} requeued: lease expired (worker {row['worker_id']})")
+                conn.execute("UPDATE jobs SET status = 'queued', worker_id = NULL WHERE id = ?", (row["id"],))
+
+    def claim(self, worker_id: str, lease_seconds: float = JOB_LEASE_SECONDS) -> Optional[Job]:
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._expire_leases(conn, now)
+                row = conn.execute(
+                    "SELECT id, job_type, payload, attempts, priority FROM jobs WHERE status = 'queued' "
+                    "ORDER BY priority, created_at LIMIT 1"
+                ).fetchone()
+                if row is not None:
+                    conn.execute(
+                        "UPDATE jobs SET status = 'running', worker_id = ?, attempts = attempts + 1, "
+                        "lease_expires_at = ?, started_at = ?, error = NULL WHERE id = ?",
+                        (worker_id, now + lease_seconds, now, row["id"]),
+                    )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        return Job(row["id"], row["job_type"], json.loads(row["payload"]), row["attempts"] + 1, row["priority"])
+
+    def heartbeat(self, job_id: str, worker_id: str, lease_seconds: float = JOB_LEASE_SECONDS) -> bool:
+        """Extend the lease; False when the job is no longer owned by this worker"""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET lease_expires_at = ? WHERE id = ? AND worker_id = ? AND status = 'running'",
+                (time.time() + lease_seconds, job_id, worker_id),
+            )
+            return cursor.rowcount == 1
+
+    def save_progress(self, job_id: str, progress: str):
+        with self._connect() as conn:
+            conn.execute("UPDATE jobs SET progress = ? WHERE id = ?", (progress, job_id))
+
+    def finish(self, job_id: str, worker_id: str, progress: str, failed: bool = False,
+               cancelled: bool = False, trace: Optional[str] = None) -> bool:
+        """Store the final progress and trace; False if the lease was lost (the job ran again elsewhere)"""
+        status = "cancelled" if cancelled else "failed" if failed else "done"
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, progress = ?, trace = ?, worker_id = NULL, lease_expires_at = NULL, "
+                "finished_at = ? WHERE id = ? AND worker_id = ?",
+                (status, progress, trace, time.time(), job_id, worker_id),
+            )
+            return cursor.rowcount == 1
+
+    def cancel(self, job_id: str) -> Optional[str]:
+        """Cancel a job: "cancelled" if it had not started, "cancelling" if a worker runs it,
+        its final status if it already finished, None if unknown"""
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+                if row is None:
+                    result = None
+                elif row["status"] == "queued":
+                    conn.execute(
+                        "UPDATE jobs SET status = 'cancelled', cancel_requested = 1, finished_at = ? WHERE id = ?",
+                        (time.time(), job_id),
+                    )
+                    result = "cancelled"
+                elif row["status"] == "running":
+                    conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ?", (job_id,))
+                    result = "cancelling"
+                else:
+                    result = row["status"]
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return result
+
+    def cancel_requested(self, job_id: str) -> bool:
+        with self._connect() as conn:
+            row = conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row["cancel_requested"])
+
+    def queue_position(self, job_id: str) -> Optional[int]:
+        """1-based place in claim order among queued jobs; None once claimed or finished"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT 1 + (SELECT COUNT(*) FROM jobs AS ahead WHERE ahead.status = 'queued' AND "
+                "(ahead.priority < jobs.priority OR (ahead.priority = jobs.priority AND ahead.created_at < jobs.created_at))) "
+                "AS position FROM jobs WHERE id = ? AND status = 'queued'",
+                (job_id,),
+            ).fetchone()
+        return row["position"] if row is not None else None
+
+    def backlog(self) -> Dict[str, int]:
+        """Jobs, images and spooled bytes not finished yet (queued + running)"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT COUNT(*) AS jobs, COALESCE(SUM(status = 'running'), 0) AS running, "
+                "COALESCE(SUM(images), 0) AS images, COALESCE(SUM(size_bytes), 0) AS bytes "
+                "FROM jobs WHERE status IN ('queued', 'running')"
+            ).fetchone()
+        return dict(row)
+
+    def recent_throughput(self, limit: int) -> Optional[tuple]:
+        """(images, seconds of processing) over the last `limit` successful jobs; None if there are none"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT SUM(images) AS images, SUM(finished_at - started_at) AS seconds FROM ("
+                "SELECT images, started_at, finished_at FROM jobs WHERE status = 'done' AND images > 0 "
+                "AND started_at IS NOT NULL ORDER BY finished_at DESC LIMIT ?)",
+                (limit,),
+            ).fetchone()
+        if not row["images"] or not row["seconds"]:
+            return None
+        return row["images"], row["seconds"]
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT id, job_type, status, attempts, worker_id, progress, error, created_at, started_at, finished_at, "
+                "priority, cancel_requested "
+                "FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        return dict(row) if row is not None else None
+
+    def get_trace(self, job_id: str) -> Optional[str]:
+        """Final trace report (JSON) of a finished job; None while it runs or if it has none"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT trace FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row["trace"] if row is not None else None
+
+    def counts(self) -> Dict[str, int]:
+        counts = dict.fromkeys(JOB_STATUSES, 0)
+        with self._connect() as conn:
+            for row in conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status"):
+                counts[row["status"]] = row["n"]
+        return counts
+
+    def purge(self, older_than: float, job_ids: Iterable[str] = ()) -> int:
+        """Delete finished, failed and cancelled jobs that ended before `older_than` (epoch seconds),
+        plus those in `job_ids` whatever their age; queued and running jobs are kept. Returns rows deleted"""
+        job_ids = list(job_ids)
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed', 'cancelled') AND (finished_at < ? "
+                f"OR id IN ({', '.join('?' * len(job_ids))}))",
+                (older_than, *job_ids),
+            )
+            return cursor.rowcount
+
+
+_queue: Optional[JobQueue] = None
+
+
+def get_job_queue() -> Optional[JobQueue]:
+    """Configured queue, or None when jobs run inline in the API process (JOB_QUEUE_BACKEND=inline)"""
+    global _queue
+    if JOB_QUEUE_BACKEND == "inline":
+        return None
+    if _queue is None:
+        if JOB_QUEUE_BACKEND != "sqlite":
+            raise ValueError(f"Unknown JOB_QUEUE_BACKEND: {JOB_QUEUE_BACKEND}")
+        _queue = SQLiteJobQueue()
+    return _queue
@@ -0,0 +1,208 @@
+import itertools
+import logging
+import os
+import shutil
+import socket
+import threading
+import time
+import uuid
+from typing import Optional
+
+from src.app.config.settings import JOB_LEASE_SECONDS, RESULT_INLINE_ROWS, WORKER_POLL_INTERVAL
+from src.app.models.ImageModel import UploadResponse
+from src.app.services.CategoryClassifier import summarize_cascade
+from src.app.services.FeatureVectors import load_vectors
+from src.app.services.SharedUploads import SharedArena, SharedImage, unlink as unlink_shared
+from src.app.services.JobQueue import Job, JobQueue
+from src.app.services.ProgressTracker import progress_tracker
+from src.app.services.RetentionManager import retention_manager
+from src.app.services.TaskScheduler import TaskCancelled, task_scheduler
+
+# job_type di antrean -> task_type ProgressTracker (menentukan daftar step)
+TASK_TYPES = {
+    "images": "image_processing",
+    "folder": "folder_processing",
+    "archive": "folder_processing",
+    "features": "feature_processing",
+}
+
+
+class SpooledFile:
+    """An uploaded image saved to disk, shaped like UploadFile for ImageCaptionService.process_images"""
+
+    def __init__(self, path: str, filename: str):
+        self.path = path
+        self.filename = filename
+        self._handle = None
+
+    @property
+    def file(self):
+        if self._handle is None:
+            self._handle = open(self.path, "rb")
+        return self._handle
+
+    def close(self):
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+
+
+def build_upload_response(message: str, zip_path, processed_count: int, image_data) -> UploadResponse:
+    """UploadResponse for a finished job, with fast-mode stats when the classifier ran.
+
+    `image_data` is a list or a ResultSpill. Only the first RESULT_INLINE_ROWS rows are
+    inlined; the full list is in the Excel report inside the ZIP.
+    """
+    fast_mode = None
+    threshold = getattr(image_data, "fast_mode_threshold", None)
+    if threshold is not None and any(row.get("classifier_category") for row in image_data):
+        # Ambang job itu sendiri: classifier bisa saja sudah dilatih ulang sejak job dimulai
+        fast_mode = summarize_cascade(image_data, threshold)
+    spreadsheet_data = list(itertools.islice(image_data, RESULT_INLINE_ROWS))
+    return UploadResponse(
+        message=message,
+        zip_path=zip_path,
+        processed_count=processed_count,
+        spreadsheet_data=spreadsheet_data,
+        spreadsheet_truncated=len(image_data) > len(spreadsheet_data),
+        fast_mode=fast_mode,
+    )
+
+
+def run_job(service, job_type: str, payload: dict, task_id: str = None, scoped: bool = False) -> UploadResponse:
+    """Run one spooled upload job and return its result; the spool directory is removed afterwards.
+
+    Payloads: images {"files": [{"path", "filename"}]} (or {"shm", "files": [{"filename", "offset",
+    "size", "tensor_offset"}]} when handed over in shared memory), folder {"folder"},
+    archive {"archive", "filename"}, features {"vectors", "filenames", "model_version"};
+    all with "fast_mode" and "spool_dir".
+    Raises ValueError when nothing could be processed.
+    """
+    fast_mode = payload.get("fast_mode", False)
+    try:
+        if job_type == "images":
+            arena = SharedArena.attach(payload["shm"]) if payload.get("shm") else None
+            if arena is not None:
+                files = [SharedImage(arena, **f) for f in payload["files"]]
+            else:
+                files = [SpooledFile(f["path"], f["filename"]) for f in payload["files"]]
+            try:
+                zip_path, image_data = service.process_images(files, task_id, fast_mode, scoped)
+            finally:
+                for file in files:
+                    file.close()
+                if arena is not None:
+                    arena.close()
+            return build_upload_response("Images processed successfully", zip_path, len(files), image_data)
+
+        if job_type == "folder":
+            zip_path, processed_count, image_data = service.process_folder(payload["folder"], task_id, fast_mode, scoped)
+        elif job_type == "features":
+            zip_path, processed_count, image_data = service.process_features(
+                load_vectors(payload["vectors"]), payload["filenames"], task_id, fast_mode, scoped
+            )
+        elif job_type == "archive":
+            zip_path, processed_count, image_data = service.process_archive(
+                payload["archive"], payload["filename"], task_id, fast_mode, scoped
+            )
+        else:
+            raise ValueError(f"Unknown job type: {job_type}")
+        if processed_count == 0:
+            raise ValueError(f"No valid {'feature vectors' if job_type == 'features' else 'images'} found in the uploaded {job_type}")
+        return build_upload_response(f"{job_type.capitalize()} processed successfully", zip_path, processed_count, image_data)
+    finally:
+        if payload.get("shm"):
+            # Job selesai: segmen dihapus berapa pun refcount-nya (percobaan yang crash tidak pernah melepas
+            # referensinya, dan spool berisi marker ikut dihapus di bawah)
+            unlink_shared(payload["shm"])
+        if payload.get("spool_dir"):
+            shutil.rmtree(payload["spool_dir"], ignore_errors=True)
+
+
+class JobWorker:
+    """Pull jobs from a JobQueue and run them through ImageCaptionService, one at a time.
+
+    Start as many worker processes as the host (or cluster) can feed; each loads its
+    own models. Jobs run in task-scoped output directories, so workers on one host do
+    not clean up each other's results. Step progress is written back to the queue as
+    it happens; a heartbeat thread keeps the lease alive while a job runs and polls
+    for cancellation, which stops the job at its next image and removes its files.
+    """
+
+    def __init__(self, queue: JobQueue, service, worker_id: Optional[str] = None,
+                 poll_interval: float = WORKER_POLL_INTERVAL, lease_seconds: float = JOB_LEASE_SECONDS):
+        self.queue = queue
+        self.service = service
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.stats = {"jobs": 0, "succeeded": 0, "failed": 0, "cancelled": 0}
+
+    def _heartbeat(self, job: Job, done: threading.Event):
+        next_heartbeat = time.monotonic() + self.lease_seconds / 3
+        while not done.wait(min(self.poll_interval, self.lease_seconds / 3)):
+            try:
+                if self.queue.cancel_requested(job.id):
+                    task_scheduler.request_cancel(job.id)
+                if time.monotonic() < next_heartbeat:
+                    continue
+                next_heartbeat = time.monotonic() + self.lease_seconds / 3
+                if not self.queue.heartbeat(job.id, self.worker_id, self.lease_seconds):
+                    logging.warning(f"Worker {self.worker_id} lost the lease on job {job.id}")
+                    return
+            except Exception as e:
+                logging.error(f"Heartbeat for job {job.id} failed: {e}")
+
+    def process(self, job: Job) -> bool:
+        """Run a claimed job and report its outcome to the queue; True on success"""
+        task_id = job.id
+        progress_tracker.create_task(TASK_TYPES.get(job.job_type, "folder_processing"), task_id, job.priority)
+        progress_tracker.attach_sink(task_id, lambda progress: self.queue.save_progress(task_id, progress.model_dump_json()))
+        done = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job, done), name=f"heartbeat-{task_id[:8]}", daemon=True)
+        heartbeat.start()
+        logging.info(f"Worker {self.worker_id} started {job.job_type} job {task_id} (attempt {job.attempts})")
+        cancelled = False
+        try:
+            with task_scheduler.running(task_id, job.priority):
+                result = run_job(self.service, job.job_type, job.payload, task_id, scoped=True)
+            progress_tracker.complete_task(task_id, result)
+            ok = True
+        except TaskCancelled:
+            logging.info(f"Job {task_id} cancelled")
+            retention_manager.discard(task_id)
+            progress_tracker.complete_task(task_id, error="Task cancelled", cancelled=True)
+            ok, cancelled = False, True
+        except Exception as e:
+            logging.error(f"Job {task_id} failed: {e}")
+            progress_tracker.complete_task(task_id, error=str(e))
+            ok = False
+        finally:
+            done.set()
+            heartbeat.join()
+        progress = progress_tracker.get_progress(task_id).model_dump_json()
+        # Trace hanya ada di proses worker ini: disimpan di antrean supaya API bisa menyajikannya
+        trace = progress_tracker.get_trace(task_id)
+        trace = trace.to_report().model_dump_json() if trace is not None else None
+        if not self.queue.finish(task_id, self.worker_id, progress, failed=not ok, cancelled=cancelled, trace=trace):
+            logging.warning(f"Job {task_id} finished after its lease expired; result not recorded")
+        progress_tracker.cleanup_task(task_id)
+        self.stats["jobs"] += 1
+        self.stats["cancelled" if cancelled else "succeeded" if ok else "failed"] += 1
+        return ok
+
+    def run(self, stop_event: Optional[threading.Event] = None, max_jobs: Optional[int] = None, burst: bool = False):
+        """Claim and run jobs until stop_event is set, max_jobs ran, or (burst) the queue is empty"""
+        stop_event = stop_event or threading.Event()
+        logging.info(f"Worker {self.worker_id} polling {type(self.queue).__name__}")
+        while not stop_event.is_set():
+            job = self.queue.claim(self.worker_id, self.lease_seconds)
+            if job is None:
+                if burst:
+                    break
+                stop_event.wait(self.poll_interval)
+                continue
+            self.process(job)
+            if max_jobs is not None and self.stats["jobs"] >= max_jobs:
+                break
+        return self.stats
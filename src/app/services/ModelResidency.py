@@ -0,0 +1,45 @@
+import logging
+from contextlib import contextmanager
+
+import numpy as np
+import tensorflow as tf
+
+
+def cast_model(model, dtype: str):
+    """Salinan model Keras fungsional dengan bobot dan komputasi dalam `dtype` (mis. float16).
+
+    Model dibangun ulang dari config dengan dtype setiap layer diganti, lalu bobot float32
+    di-cast. BatchNormalization tetap menyimpan parameternya dalam float32 (perilaku Keras).
+    Selama cast kedua salinan ada di memori; untuk model besar lebih hemat `build_with_dtype`.
+    """
+    if model.dtype == dtype:
+        return model
+    config = model.get_config()
+    for layer in config["layers"]:
+        layer["config"]["dtype"] = dtype
+    cast = model.__class__.from_config(config)
+    cast.set_weights([w.astype(dtype) if w.dtype == np.float32 else w for w in model.get_weights()])
+    logging.info(f"Model {model.name} cast to {dtype}: {footprint(model)['weights_mb']} MB -> {footprint(cast)['weights_mb']} MB")
+    return cast
+
+
+@contextmanager
+def build_with_dtype(dtype: str):
+    """Layer yang dibuat di dalam blok memakai `dtype` langsung (bobot dimuat tanpa salinan float32)"""
+    previous = tf.keras.mixed_precision.global_policy()
+    tf.keras.mixed_precision.set_global_policy(dtype)
+    try:
+        yield
+    finally:
+        tf.keras.mixed_precision.set_global_policy(previous)
+
+
+def footprint(model) -> dict:
+    """Jumlah parameter, dtype dan ukuran bobot (MB) sebuah model Keras"""
+    weights = model.weights
+    dtypes = sorted({w.dtype.name for w in weights})
+    return {
+        "parameters": int(sum(int(np.prod(w.shape)) for w in weights)),
+        "dtype": "/".join(dtypes) if dtypes else None,
+        "weights_mb": round(sum(int(np.prod(w.shape)) * w.dtype.size for w in weights) / (1024 * 1024), 2),
+    }
@@ -0,0 +1,211 @@
+import gc
+import logging
+import os
+import select
+import signal
+import time
+from typing import Callable, Dict, Optional
+
+MEMORY_FIELDS = {"Rss": "rss_mb", "Pss": "pss_mb", "Shared_Clean": "shared_clean_mb",
+                 "Shared_Dirty": "shared_dirty_mb", "Private_Clean": "private_clean_mb",
+                 "Private_Dirty": "private_dirty_mb"}
+
+
+def process_memory(pid: int) -> Dict[str, float]:
+    """RSS/PSS and shared vs private memory of a process in MB (Linux /proc/<pid>/smaps_rollup)"""
+    memory = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in MEMORY_FIELDS:
+                    memory[MEMORY_FIELDS[key]] = round(int(value.split()[0]) / 1024.0, 1)
+    except OSError:
+        return {}
+    memory["private_mb"] = round(memory.get("private_clean_mb", 0.0) + memory.get("private_dirty_mb", 0.0), 1)
+    return memory
+
+
+def preload_service():
+    """Work done once in the parent before forking: heavy imports and the tokenizer.
+
+    TensorFlow itself must not be initialised here: once the TF runtime has run
+    anything, graph functions deadlock in forked children, and TF copies weights
+    into its own allocations anyway. So each child still loads the models; what
+    is shared copy-on-write is the imported TF/Keras/scikit-learn/NLTK code and
+    module state, plus the unpickled tokenizer.
+    """
+    from src.app.services.ImageCaptionService import ImageCaptionService
+
+    ImageCaptionService._load_tokenizer()
+
+
+class PreforkSupervisor:
+    """Fork `workers` children that each run `target(ready)` and keep them running.
+
+    `preload` runs once in the parent before the first fork; `target` runs in each
+    child and must call `ready()` once it can serve (models loaded), which is how
+    per-worker startup time is measured. Children that die are re-forked; SIGTERM
+    or SIGINT on the parent is forwarded to all children. After every worker
+    reported ready the parent logs a startup and memory report (see `report`).
+    """
+
+    def __init__(self, workers: int, target: Callable[[Callable[[], None]], None],
+                 preload: Optional[Callable[[], None]] = None, respawn: bool = True,
+                 on_ready: Optional[Callable[[dict], None]] = None):
+        if workers < 1:
+            raise ValueError("workers must be >= 1")
+        self.workers = workers
+        self.target = target
+        self.preload = preload
+        self.respawn = respawn
+        self.on_ready = on_ready
+        self.report: dict = {}
+        self._children: Dict[int, dict] = {}  # pid -> {"started": t, "ready_fd": fd, "ready_s": s}
+        self._stopping = False
+        self._boot_failed = False
+
+    def _spawn(self):
+        read_fd, write_fd = os.pipe()
+        started = time.perf_counter()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            code = 0
+
+            def ready():
+                os.write(write_fd, b"1")
+                os.close(write_fd)
+
+            try:
+                self.target(ready)
+            except BaseException:
+                logging.exception(f"Prefork worker {os.getpid()} crashed")
+                code = 1
+            finally:
+                os._exit(code)
+        os.close(write_fd)
+        self._children[pid] = {"started": started, "ready_fd": read_fd, "ready_s": None}
+        return pid
+
+    def _collect_ready(self, timeout: float):
+        fds = {child["ready_fd"]: pid for pid, child in self._children.items() if child["ready_fd"] is not None}
+        if not fds:
+            return
+        readable, _, _ = select.select(list(fds), [], [], timeout)
+        for fd in readable:
+            child = self._children[fds[fd]]
+            signalled = os.read(fd, 1)
+            os.close(fd)
+            child["ready_fd"] = None
+            if not signalled:
+                continue  # pipe tertutup tanpa sinyal: worker mati saat startup (ditangani _reap)
+            child["ready_s"] = time.perf_counter() - child["started"]
+            logging.info(f"Prefork worker {fds[fd]} ready in {child['ready_s']:.2f}s")
+
+    def _reap(self, block: bool = False):
+        while self._children:
+            try:
+                pid, status = os.waitpid(-1, 0 if block else os.WNOHANG)
+            except ChildProcessError:
+                self._children.clear()
+                return
+            if pid == 0:
+                return
+            child = self._children.pop(pid, None)
+            if child is None:
+                continue
+            if child["ready_fd"] is not None:
+                os.close(child["ready_fd"])
+            if self._stopping:
+                continue
+            code = os.waitstatus_to_exitcode(status)
+            if child["ready_s"] is None:
+                # Gagal saat startup (mis. model tidak ada): respawn hanya akan berulang tanpa henti
+                logging.error(f"Prefork worker {pid} exited with status {code} before it was ready; stopping")
+                self._boot_failed = True
+                self._stop()
+            else:
+                logging.warning(f"Prefork worker {pid} exited with status {code}")
+                if self.respawn:
+                    self._spawn()
+
+    def _stop(self, *_):
+        self._stopping = True
+        for pid in list(self._children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def _build_report(self, preload_s: float, startup_s: float) -> dict:
+        workers = []
+        for pid, child in sorted(self._children.items()):
+            workers.append({"pid": pid, "ready_s": round(child["ready_s"], 3), **process_memory(pid)})
+        parent = process_memory(os.getpid())
+        return {
+            "workers": len(workers),
+            "preload_s": round(preload_s, 3),
+            "startup_s": round(startup_s, 3),
+            "parent": parent,
+            "per_worker": workers,
+            "total_pss_mb": round(parent.get("pss_mb", 0.0) + sum(w.get("pss_mb", 0.0) for w in workers), 1),
+            "mean_private_mb": round(sum(w.get("private_mb", 0.0) for w in workers) / max(1, len(workers)), 1),
+        }
+
+    def run(self):
+        """Preload, fork the workers and supervise them until SIGTERM/SIGINT; returns the report.
+
+        Raises RuntimeError if a worker died before it became ready.
+        """
+        start = time.perf_counter()
+        if self.preload is not None:
+            self.preload()
+        preload_s = time.perf_counter() - start
+        # Objek hasil preload dipindah ke generasi permanen: GC anak tidak menulis ke halaman bersama
+        gc.freeze()
+
+        previous = {sig: signal.signal(sig, self._stop) for sig in (signal.SIGTERM, signal.SIGINT)}
+        try:
+            for _ in range(self.workers):
+                self._spawn()
+            reported = False
+            while self._children:
+                self._collect_ready(timeout=0.5)
+                self._reap()
+                if self._stopping:
+                    # Tunggu anak selesai (request/job yang berjalan dituntaskan dulu)
+                    self._reap(block=True)
+                    continue
+                if not reported and all(child["ready_s"] is not None for child in self._children.values()):
+                    reported = True
+                    self.report = self._build_report(preload_s, time.perf_counter() - start)
+                    logging.info(
+                        f"Prefork: {self.report['workers']} workers ready in {self.report['startup_s']:.2f}s "
+                        f"(preload {self.report['preload_s']:.2f}s), total PSS {self.report['total_pss_mb']} MB, "
+                        f"private {self.report['mean_private_mb']} MB per worker"
+                    )
+                    if self.on_ready is not None:
+                        self.on_ready(self.report)
+        finally:
+            for sig, handler in previous.items():
+                signal.signal(sig, handler)
+        if self._boot_failed:
+            raise RuntimeError("A worker failed to start; see the log above")
+        return self.report
+
+
+def intra_op_threads(workers: int) -> int:
+    """CPU threads per worker so N workers do not oversubscribe the cores"""
+    return max(1, (os.cpu_count() or 1) // workers)
+
+
+def configure_worker_threads(threads: int):
+    """Limit TF thread pools in a freshly forked worker (before its TF runtime starts)"""
+    import tensorflow as tf
+
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(max(2, threads))
+
@@ -0,0 +1,210 @@
+import cProfile
+import io
+import logging
+import os
+import pstats
+import shutil
+import threading
+import tracemalloc
+import uuid
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from src.app.config.settings import (
+    PROFILE_DIR,
+    PROFILE_KEEP_SESSIONS,
+    PROFILE_MAX_IMAGES,
+    PROFILE_TRACEMALLOC_FRAMES,
+    PROFILING_ENABLED,
+)
+from src.app.models.ImageModel import ProfileSession
+
+_NOT_PROFILED = nullcontext()
+
+
+class ProfileCapture:
+    """On-demand cProfile + tracemalloc capture of the next N images (of one task or of any task).
+
+    One session is armed at a time. While nothing is armed, `image()` is a flag check
+    returning a shared no-op context, so the image loop pays nothing. Each captured image
+    runs under the session's profiler (images of other threads are skipped meanwhile).
+    When N images are done, or the task ends, the session writes its artifacts to
+    PROFILE_DIR/<session_id>/:
+
+      profile.pstats                     cProfile stats (`python -m pstats`, snakeviz)
+      profile.txt                        top functions by cumulative time
+      tracemalloc-start/end.snapshot     tracemalloc.Snapshot.dump() around the capture
+      tracemalloc.txt                    allocations still alive at the end, by line
+
+    Sessions live in the process that armed them: with several server processes or
+    queue workers, arm the process that runs the task.
+    """
+
+    _instance = None
+    _lock = threading.Lock()
+    _sessions: Dict[str, dict] = {}
+    _active: Optional[dict] = None
+    armed = False
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(ProfileCapture, cls).__new__(cls)
+        return cls._instance
+
+    def arm(self, task_id: Optional[str] = None, images: int = 5, memory: bool = True) -> ProfileSession:
+        """Profile the next `images` images of task_id (any task if None)"""
+        if not PROFILING_ENABLED:
+            raise PermissionError("Profiling is disabled; set PROFILING_ENABLED=true")
+        if not 1 <= images <= PROFILE_MAX_IMAGES:
+            raise ValueError(f"images must be between 1 and {PROFILE_MAX_IMAGES}")
+        with self._lock:
+            if self._active is not None:
+                raise RuntimeError(f"Profile session {self._active['session_id']} is still {self._active['status']}")
+            session = {
+                "session_id": str(uuid.uuid4()),
+                "task_id": task_id,
+                "images": images,
+                "memory": memory,
+                "status": "armed",
+                "captured": 0,
+                "created_at": datetime.now().isoformat(),
+                "completed_at": None,
+                "peak_traced_mb": None,
+                "artifacts": [],
+                "profile": cProfile.Profile(),
+                "image_lock": threading.Lock(),
+                "snapshot": None,
+                "owns_tracing": False,
+            }
+            self._sessions[session["session_id"]] = session
+            ProfileCapture._active = session
+            ProfileCapture.armed = True
+            self._prune()
+        logging.info(f"Profile session {session['session_id']} armed for {images} images of task {task_id or 'any'}")
+        return self._public(session)
+
+    def image(self, task_id: Optional[str]):
+        """Context manager around one image: profiles it if an armed session wants it"""
+        if not self.armed:
+            return _NOT_PROFILED
+        session = self._active
+        if session is None or (session["task_id"] is not None and session["task_id"] != task_id):
+            return _NOT_PROFILED
+        if not session["image_lock"].acquire(blocking=False):
+            return _NOT_PROFILED
+        if session["status"] not in ("armed", "capturing"):
+            session["image_lock"].release()
+            return _NOT_PROFILED
+        return self._capture(session)
+
+    @contextmanager
+    def _capture(self, session: dict):
+        try:
+            if session["status"] == "armed":
+                session["status"] = "capturing"
+                if session["memory"]:
+                    session["owns_tracing"] = not tracemalloc.is_tracing()
+                    if session["owns_tracing"]:
+                        tracemalloc.start(PROFILE_TRACEMALLOC_FRAMES)
+                    tracemalloc.reset_peak()
+                    session["snapshot"] = tracemalloc.take_snapshot()
+            session["profile"].enable()
+            try:
+                yield
+            finally:
+                session["profile"].disable()
+                session["captured"] += 1
+            if session["captured"] >= session["images"]:
+                self._finish(session, "completed")
+        finally:
+            session["image_lock"].release()
+
+    def task_finished(self, task_id: Optional[str]):
+        """End a session bound to task_id with whatever was captured"""
+        session = self._active
+        if session is None or session["task_id"] is None or session["task_id"] != task_id:
+            return
+        with session["image_lock"]:
+            if session["status"] in ("armed", "capturing"):
+                self._finish(session, "completed" if session["captured"] else "cancelled")
+
+    def stop(self, session_id: str) -> Optional[ProfileSession]:
+        """Stop a session now (artifacts are written if anything was captured); None if unknown"""
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        with session["image_lock"]:
+            if session["status"] in ("armed", "capturing"):
+                self._finish(session, "completed" if session["captured"] else "cancelled")
+        return self._public(session)
+
+    def _finish(self, session: dict, status: str):
+        if session["status"] == "capturing":
+            try:
+                self._write_artifacts(session)
+            except OSError as e:
+                logging.error(f"Could not write profile artifacts for {session['session_id']}: {e}")
+        session["status"] = status
+        session["completed_at"] = datetime.now().isoformat()
+        session["profile"] = None
+        session["snapshot"] = None
+        with self._lock:
+            if self._active is session:
+                ProfileCapture._active = None
+                ProfileCapture.armed = False
+        logging.info(f"Profile session {session['session_id']} {status} after {session['captured']} images")
+
+    def _write_artifacts(self, session: dict):
+        directory = os.path.join(PROFILE_DIR, session["session_id"])
+        os.makedirs(directory, exist_ok=True)
+        artifacts = []
+        profile = session["profile"]
+        profile.dump_stats(os.path.join(directory, "profile.pstats"))
+        text = io.StringIO()
+        pstats.Stats(profile, stream=text).strip_dirs().sort_stats("cumulative").print_stats(60)
+        with open(os.path.join(directory, "profile.txt"), "w") as f:
+            f.write(text.getvalue())
+        artifacts += ["profile.pstats", "profile.txt"]
+
+        if session["snapshot"] is not None and tracemalloc.is_tracing():
+            end = tracemalloc.take_snapshot()
+            session["peak_traced_mb"] = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 2)
+            if session["owns_tracing"]:
+                tracemalloc.stop()
+            session["snapshot"].dump(os.path.join(directory, "tracemalloc-start.snapshot"))
+            end.dump(os.path.join(directory, "tracemalloc-end.snapshot"))
+            with open(os.path.join(directory, "tracemalloc.txt"), "w") as f:
+                f.write(f"Peak traced memory during capture: {session['peak_traced_mb']} MB\n\n")
+                f.write("Allocations still alive at the end of the capture, by line:\n")
+                for stat in end.compare_to(session["snapshot"], "lineno")[:40]:
+                    f.write(f"{stat}\n")
+            artifacts += ["tracemalloc-start.snapshot", "tracemalloc-end.snapshot", "tracemalloc.txt"]
+        session["artifacts"] = artifacts
+
+    def _prune(self):
+        finished = [s for s in self._sessions.values() if s["status"] in ("completed", "cancelled")]
+        for session in sorted(finished, key=lambda s: s["created_at"])[:max(0, len(self._sessions) - PROFILE_KEEP_SESSIONS)]:
+            del self._sessions[session["session_id"]]
+            shutil.rmtree(os.path.join(PROFILE_DIR, session["session_id"]), ignore_errors=True)
+
+    @staticmethod
+    def _public(session: dict) -> ProfileSession:
+        return ProfileSession(**{k: v for k, v in session.items() if k in ProfileSession.model_fields})
+
+    def get(self, session_id: str) -> Optional[ProfileSession]:
+        session = self._sessions.get(session_id)
+        return self._public(session) if session is not None else None
+
+    def list(self) -> List[ProfileSession]:
+        return [self._public(s) for s in sorted(self._sessions.values(), key=lambda s: s["created_at"], reverse=True)]
+
+    def artifact_path(self, session_id: str, name: str) -> Optional[str]:
+        session = self._sessions.get(session_id)
+        if session is None or name not in session["artifacts"]:
+            return None
+        return os.path.join(PROFILE_DIR, session_id, name)
+
+
+# Singleton instance
+profile_capture = ProfileCapture()
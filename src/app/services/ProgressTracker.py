@@ -1,22 +1,37 @@
 import uuid
 import asyncio
+import time
 from datetime import datetime
-from typing import Dict, List
-from src.app.models.ImageModel import ProcessingProgress, ProcessingStep
+from typing import Callable, Dict, List, Optional, Union
+from src.app.config.settings import TASK_HISTORY_MAX, TASK_HISTORY_SECONDS
+from src.app.models.ImageModel import ProcessingProgress, ProcessingStep, TaskTraceReport
+from src.app.services.JobQueue import PRIORITY_NAMES, get_job_queue
+from src.app.services.MetricsRegistry import metrics_registry, TASKS_FINISHED
+from src.app.services.TaskScheduler import task_scheduler
+from src.app.services.TaskTrace import StoredTrace, TaskTrace
 
 class ProgressTracker:
     _instance = None
     _progress_store: Dict[str, ProcessingProgress] = {}
+    _trace_store: Dict[str, TaskTrace] = {}
+    _sinks: Dict[str, Callable[[ProcessingProgress], None]] = {}
+    _finished_at: Dict[str, float] = {}
 
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(ProgressTracker, cls).__new__(cls)
         return cls._instance
 
-    def create_task(self, task_type: str = "image_processing") -> str:
+    def create_task(self, task_type: str = "image_processing", task_id: Optional[str] = None,
+                    priority: Optional[int] = None) -> str:
         """Create a new processing task and return task ID"""
-        task_id = str(uuid.uuid4())
-        
+        progress = self.new_progress(task_type, task_id or str(uuid.uuid4()), priority)
+        self._progress_store[progress.task_id] = progress
+        self._trace_store[progress.task_id] = TaskTrace(progress.task_id)
+        return progress.task_id
+
+    def new_progress(self, task_type: str, task_id: str, priority: Optional[int] = None) -> ProcessingProgress:
+        """Initial (all pending) progress for a task type, without registering it"""
         # Define processing steps based on task type
         if task_type == "image_processing":
             steps = [
@@ -30,6 +45,17 @@ class ProgressTracker:
                 ProcessingStep(step_id=7, text="Generating ZIP file...", status="pending"),
                 ProcessingStep(step_id=8, text="Processing completed!", status="pending")
             ]
+        elif task_type == "feature_processing":
+            steps = [
+                ProcessingStep(step_id=0, text="Initializing feature processing...", status="pending"),
+                ProcessingStep(step_id=1, text="Loading AI models...", status="pending"),
+                ProcessingStep(step_id=2, text="Reading feature vectors...", status="pending"),
+                ProcessingStep(step_id=3, text="Generating captions...", status="pending"),
+                ProcessingStep(step_id=4, text="Categorizing images...", status="pending"),
+                ProcessingStep(step_id=5, text="Creating Excel report...", status="pending"),
+                ProcessingStep(step_id=6, text="Generating ZIP file...", status="pending"),
+                ProcessingStep(step_id=7, text="Processing completed!", status="pending")
+            ]
         else:  # folder_processing
             steps = [
                 ProcessingStep(step_id=0, text="Initializing folder processing...", status="pending"),
@@ -44,16 +70,18 @@ class ProgressTracker:
                 ProcessingStep(step_id=9, text="Processing completed!", status="pending")
             ]
 
-        progress = ProcessingProgress(
+        return ProcessingProgress(
             task_id=task_id,
             current_step=0,
             total_steps=len(steps),
             steps=steps,
-            is_completed=False
+            is_completed=False,
+            priority=PRIORITY_NAMES.get(priority),
         )
-        
-        self._progress_store[task_id] = progress
-        return task_id
+
+    def attach_sink(self, task_id: str, sink: Callable[[ProcessingProgress], None]):
+        """Call `sink(progress)` after every step update of task_id (worker -> job queue)"""
+        self._sinks[task_id] = sink
 
     def update_step(self, task_id: str, step_id: int, status: str = "processing") -> bool:
         """Update the status of a specific step"""
@@ -65,27 +93,39 @@ class ProgressTracker:
         if step_id < len(progress.steps):
             progress.steps[step_id].status = status
             progress.steps[step_id].timestamp = datetime.now().isoformat()
+            trace = self._trace_store.get(task_id)
+            if trace is not None:
+                trace.step(step_id, progress.steps[step_id].text, status)
             
             if status == "processing":
                 progress.current_step = step_id
             elif status == "completed":
                 progress.current_step = step_id + 1
+
+            sink = self._sinks.get(task_id)
+            if sink is not None:
+                sink(progress)
                 
         return True
 
-    def complete_task(self, task_id: str, result=None, error: str = None) -> bool:
-        """Mark task as completed with result or error"""
+    def complete_task(self, task_id: str, result=None, error: str = None, cancelled: bool = False) -> bool:
+        """Mark task as completed with result or error (cancelled: stopped on request, error is the reason)"""
         if task_id not in self._progress_store:
             return False
         
         progress = self._progress_store[task_id]
         progress.is_completed = True
+        progress.cancelled = cancelled
+        TASKS_FINISHED.inc(outcome="cancelled" if cancelled else "error" if error else "success")
         
         if error:
             progress.error = error
             # Mark current step as error
             if progress.current_step < len(progress.steps):
                 progress.steps[progress.current_step].status = "error"
+                trace = self._trace_store.get(task_id)
+                if trace is not None:
+                    trace.step(progress.current_step, progress.steps[progress.current_step].text, "error")
         else:
             progress.result = result
             # Mark all steps as completed
@@ -94,23 +134,115 @@ class ProgressTracker:
                     step.status = "completed"
                     step.timestamp = datetime.now().isoformat()
             progress.current_step = len(progress.steps)
-            
+
+        trace = self._trace_store.get(task_id)
+        if trace is not None:
+            trace.finish()
+        self._finished_at[task_id] = time.monotonic()
         return True
 
     def get_progress(self, task_id: str) -> ProcessingProgress:
-        """Get current progress for a task"""
-        return self._progress_store.get(task_id)
+        """Get current progress for a task (from the job queue if it runs in a worker process)"""
+        progress = self._progress_store.get(task_id)
+        if progress is not None:
+            progress.queue_position = None if progress.is_completed else task_scheduler.queue_position(task_id)
+            return progress
+        queue = get_job_queue()
+        if queue is not None:
+            job = queue.get(task_id)
+            progress = self._queued_progress(job)
+            if progress is not None and job["status"] == "queued":
+                progress.queue_position = queue.queue_position(task_id)
+        return progress
+
+    @staticmethod
+    def _queued_progress(job: Optional[dict]) -> Optional[ProcessingProgress]:
+        if job is None or not job["progress"]:
+            return None
+        progress = ProcessingProgress.model_validate_json(job["progress"])
+        if job["status"] in ("failed", "cancelled") and not progress.is_completed:
+            # Worker mati dan percobaan habis, atau dibatalkan sebelum diambil worker:
+            # tidak ada yang akan menulis status akhir
+            progress.is_completed = True
+            progress.cancelled = job["status"] == "cancelled"
+            progress.error = "Task cancelled" if progress.cancelled else job["error"]
+            if progress.current_step < len(progress.steps):
+                progress.steps[progress.current_step].status = "error"
+        return progress
+
+    def get_trace(self, task_id: str) -> Optional[Union[TaskTrace, StoredTrace]]:
+        """Get the timing trace for a task (from the job queue once a worker process finished it)"""
+        if task_id is None:
+            return None
+        trace = self._trace_store.get(task_id)
+        if trace is not None:
+            return trace
+        queue = get_job_queue()
+        if queue is not None:
+            report = queue.get_trace(task_id)
+            if report:
+                return StoredTrace(TaskTraceReport.model_validate_json(report))
+        return None
 
     def cleanup_task(self, task_id: str) -> bool:
         """Remove task from store (optional cleanup)"""
+        self._trace_store.pop(task_id, None)
+        self._sinks.pop(task_id, None)
+        self._finished_at.pop(task_id, None)
         if task_id in self._progress_store:
             del self._progress_store[task_id]
             return True
         return False
 
+    def prune(self, max_age: float = TASK_HISTORY_SECONDS, max_finished: int = TASK_HISTORY_MAX) -> int:
+        """Forget finished tasks older than max_age seconds, and the oldest beyond max_finished.
+
+        Progress and trace of inline tasks live in this process only; without pruning a
+        long-running API process keeps every one (a trace holds up to 500 image samples).
+        Returns the number of tasks removed.
+        """
+        now = time.monotonic()
+        finished = sorted(self._finished_at.items(), key=lambda item: item[1])
+        overflow = max(0, len(finished) - max(0, max_finished))
+        expired = [task_id for n, (task_id, at) in enumerate(finished) if n < overflow or now - at > max_age]
+        for task_id in expired:
+            self.cleanup_task(task_id)
+        return len(expired)
+
     def get_all_tasks(self) -> Dict[str, ProcessingProgress]:
         """Get all tasks (for debugging)"""
         return self._progress_store.copy()
 
+    def count_queued(self) -> int:
+        """Tasks that were created but have not started any step yet"""
+        queue = get_job_queue()
+        if queue is not None:
+            return queue.counts()["queued"]
+        return sum(
+            1 for p in list(self._progress_store.values())
+            if not p.is_completed and all(step.status == "pending" for step in p.steps)
+        )
+
+    def count_active(self) -> int:
+        """Tasks that are currently running"""
+        queue = get_job_queue()
+        if queue is not None:
+            return queue.counts()["running"]
+        return sum(
+            1 for p in list(self._progress_store.values())
+            if not p.is_completed and any(step.status != "pending" for step in p.steps)
+        )
+
 # Singleton instance
 progress_tracker = ProgressTracker()
+
+metrics_registry.gauge(
+    "foldering_queue_depth",
+    "Tasks waiting to start.",
+    callback=progress_tracker.count_queued,
+)
+metrics_registry.gauge(
+    "foldering_active_tasks",
+    "Tasks currently being processed.",
+    callback=progress_tracker.count_active,
+)
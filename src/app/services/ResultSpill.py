@@ -0,0 +1,88 @@
+import itertools
+import json
+import os
+import struct
+from typing import Dict, Iterator, List, Optional, Tuple
+
+RESULTS_FILENAME = "results.jsonl"
+RESULTS_INDEX_FILENAME = "results.idx"
+
+_OFFSET = struct.Struct("<Q")
+
+
+def index_path(results_path: str) -> str:
+    return os.path.join(os.path.dirname(results_path), RESULTS_INDEX_FILENAME)
+
+
+class ResultSpill:
+    """Per-image result rows of one job, appended to a JSONL file instead of kept in a list.
+
+    Supports len() and repeated iteration (each pass reads the file again), so it can
+    stand in for the old `image_data` list in the Excel writer and fast-mode summary
+    while memory stays flat however many images a job has. Rows are flushed as they
+    are appended, so the file can be read while the job is still running; next to it a
+    fixed-width index (8-byte start offset per row, written after the row) lets
+    `read_since` jump straight to row N. `fast_mode_threshold` is the confidence threshold
+    of the job's fast-mode classifier, for its summary (None without fast mode).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.fast_mode_threshold: Optional[float] = None
+        self._count = 0
+        self._offset = 0
+        self._file = open(path, "wb")
+        self._index = open(index_path(path), "wb")
+
+    def append(self, row: Dict):
+        line = (json.dumps(row, ensure_ascii=False) + "\n").encode("utf-8")
+        self._file.write(line)
+        self._file.flush()
+        # Offset ditulis setelah barisnya: pembaca hanya melihat baris yang sudah lengkap
+        self._index.write(_OFFSET.pack(self._offset))
+        self._index.flush()
+        self._offset += len(line)
+        self._count += 1
+
+    def close(self):
+        for f in (self._file, self._index):
+            if not f.closed:
+                f.close()
+
+    def remove(self):
+        self.close()
+        for path in (self.path, index_path(self.path)):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def head(self, limit: int) -> List[Dict]:
+        return list(itertools.islice(self, limit))
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self) -> Iterator[Dict]:
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    @staticmethod
+    def read_since(path: str, since: int, limit: int) -> Tuple[List[Dict], int]:
+        """Rows since..since+limit of a (possibly still growing) results file and the rows available"""
+        try:
+            with open(index_path(path), "rb") as index:
+                available = os.fstat(index.fileno()).st_size // _OFFSET.size
+                if since >= available:
+                    return [], available
+                index.seek(since * _OFFSET.size)
+                (start,) = _OFFSET.unpack(index.read(_OFFSET.size))
+            count = min(limit, available - since)
+            with open(path, "rb") as f:
+                f.seek(start)
+                rows = [json.loads(f.readline()) for _ in range(count)]
+        except FileNotFoundError:
+            return [], 0
+        return rows, available
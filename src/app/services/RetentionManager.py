@@ -0,0 +1,300 @@
+import fcntl
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import List, Optional
+
+from src.app.config.settings import (
+    CAPTION_STORE_ENABLED,
+    EMBEDDING_INDEX_ENABLED,
+    JOB_SPOOL_DIR,
+    OUTPUT_DIR,
+    PROCESSED_IMAGES_DIR,
+    RETENTION_MAX_AGE_HOURS,
+    RETENTION_LOCK_PATH,
+    RETENTION_ORPHAN_GRACE,
+    RETENTION_QUOTA_MB,
+    RETENTION_SWEEP_INTERVAL,
+    TASK_HISTORY_SECONDS,
+    UPLOAD_DIR,
+)
+from src.app.models.ImageModel import StorageStatus, SweepResult
+from src.app.services.CaptionStore import get_caption_store
+from src.app.services.EmbeddingIndex import get_embedding_index
+from src.app.services.JobQueue import get_job_queue
+from src.app.services.SharedUploads import MARKER_FILENAME as SHARED_MEMORY_MARKER, unlink as unlink_shared
+from src.app.services.MetricsRegistry import ARTIFACTS_REMOVED, metrics_registry
+from src.app.services.ProgressTracker import progress_tracker
+
+ACCESS_MARKER = ".last_download"
+
+
+def is_task_id(name: str) -> bool:
+    try:
+        return str(uuid.UUID(name)) == name
+    except ValueError:
+        return False
+
+
+def _tree_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for filename in files:
+            try:
+                total += os.lstat(os.path.join(root, filename)).st_size
+            except OSError:
+                pass
+    return total
+
+
+def _mtime(path: str) -> Optional[float]:
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+class RetentionManager:
+    """Bound the disk used by task results (folderisasi/<task_id>/ + processed_images/<task_id>/).
+
+    A sweep removes, in order: spool/upload directories of tasks that are no longer
+    running (left behind by crashes) once older than RETENTION_ORPHAN_GRACE; results
+    not used for RETENTION_MAX_AGE_HOURS; then least-recently-used results until the
+    total is under RETENTION_QUOTA_MB. "Used" is the later of creation and last ZIP
+    download. Tasks still queued or running are never touched. Sweeps are serialised
+    across processes with a lock file, so every API worker can run the sweeper. Each
+    sweep also drops this process's in-memory progress of long-finished tasks and, with
+    a job queue, the rows of jobs that ended more than TASK_HISTORY_SECONDS ago or whose
+    results it just removed.
+    """
+
+    _instance = None
+    _lock = threading.Lock()
+    _thread: Optional[threading.Thread] = None
+    _stop_event: Optional[threading.Event] = None
+    _last_sweep: Optional[SweepResult] = None
+    _last_total_bytes = 0
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(RetentionManager, cls).__new__(cls)
+        return cls._instance
+
+    def touch(self, task_id: str):
+        """Record a download of task_id's results (moves it to the back of the eviction order)"""
+        task_dir = os.path.join(OUTPUT_DIR, task_id)
+        if os.path.isdir(task_dir):
+            marker = os.path.join(task_dir, ACCESS_MARKER)
+            with open(marker, "a"):
+                pass
+            os.utime(marker)
+
+    def discard(self, task_id: str):
+        """Remove everything a cancelled task left behind: spool, uploads, partial results, embeddings and stored captions.
+
+        Its job row stays for TASK_HISTORY_SECONDS so /v1/progress can still report the cancellation;
+        the next sweep after that purges it.
+        """
+        roots = (JOB_SPOOL_DIR, UPLOAD_DIR, OUTPUT_DIR, PROCESSED_IMAGES_DIR)
+        paths = [p for p in (os.path.join(root, task_id) for root in roots) if os.path.isdir(p)]
+        if paths:
+            self._remove(paths, "cancelled")
+        self._drop_embeddings(task_id)
+        if CAPTION_STORE_ENABLED:
+            get_caption_store().delete_task(task_id)
+
+    def artifacts(self) -> List[dict]:
+        """Result directories per task with size and last-used time, least recently used first"""
+        task_ids = set()
+        for root in (OUTPUT_DIR, PROCESSED_IMAGES_DIR):
+            if os.path.isdir(root):
+                task_ids.update(name for name in os.listdir(root) if is_task_id(name))
+        artifacts = []
+        for task_id in task_ids:
+            paths = [p for p in (os.path.join(OUTPUT_DIR, task_id), os.path.join(PROCESSED_IMAGES_DIR, task_id)) if os.path.isdir(p)]
+            created = min(filter(None, (_mtime(p) for p in paths)), default=time.time())
+            downloaded = _mtime(os.path.join(OUTPUT_DIR, task_id, ACCESS_MARKER))
+            artifacts.append({
+                "task_id": task_id,
+                "paths": paths,
+                "bytes": sum(_tree_size(p) for p in paths),
+                "last_used": max(created, downloaded or 0.0),
+            })
+        artifacts.sort(key=lambda a: a["last_used"])
+        return artifacts
+
+    def latest_zip(self) -> Optional[str]:
+        """ZIP of the most recently used task that has one (for the legacy /v1/download)"""
+        for artifact in reversed(self.artifacts()):
+            zip_path = os.path.join(OUTPUT_DIR, artifact["task_id"], "hasil_folderisasi.zip")
+            if os.path.exists(zip_path):
+                return zip_path
+        return None
+
+    @staticmethod
+    def _is_active(task_id: str) -> bool:
+        progress = progress_tracker.get_progress(task_id)
+        return progress is not None and not progress.is_completed
+
+    @staticmethod
+    def _drop_embeddings(task_id: str):
+        """Mask the task's rows in the similar-image index (their image_path no longer exists)"""
+        if not EMBEDDING_INDEX_ENABLED:
+            return
+        try:
+            get_embedding_index().delete_task(task_id)
+        except OSError as e:
+            logging.error(f"Failed to drop embeddings of task {task_id}: {e}")
+
+    def _remove(self, paths: List[str], reason: str) -> int:
+        freed = sum(_tree_size(p) for p in paths)
+        for path in paths:
+            marker = os.path.join(path, SHARED_MEMORY_MARKER)
+            if os.path.isfile(marker):
+                with open(marker) as f:
+                    unlink_shared(f.read().strip())  # upload yang diserahkan lewat shared memory
+            shutil.rmtree(path, ignore_errors=True)
+        ARTIFACTS_REMOVED.inc(reason=reason)
+        return freed
+
+    @staticmethod
+    def _purge_jobs(now: float, evicted: List[str]):
+        """Delete queue rows of jobs finished long ago or whose results were just evicted"""
+        queue = get_job_queue()
+        if queue is None:
+            return
+        try:
+            purged = queue.purge(now - TASK_HISTORY_SECONDS, evicted)
+        except Exception as e:
+            logging.error(f"Failed to purge finished jobs from the queue: {e}")
+            return
+        if purged:
+            logging.info(f"Purged {purged} finished jobs from the queue")
+
+    def _sweep_orphans(self, now: float) -> tuple:
+        removed, freed = 0, 0
+        for root in (JOB_SPOOL_DIR, UPLOAD_DIR):
+            if not os.path.isdir(root):
+                continue
+            for name in os.listdir(root):
+                path = os.path.join(root, name)
+                if not is_task_id(name) or not os.path.isdir(path):
+                    continue
+                mtime = _mtime(path)
+                if mtime is None or now - mtime < RETENTION_ORPHAN_GRACE or self._is_active(name):
+                    continue
+                logging.info(f"Removing orphaned temp directory {path}")
+                freed += self._remove([path], "orphan")
+                removed += 1
+        return removed, freed
+
+    def sweep(self) -> Optional[SweepResult]:
+        """Run one retention pass; None if another process is sweeping right now"""
+        start = time.perf_counter()
+        progress_tracker.prune()  # memori per proses: dijalankan juga saat proses lain memegang lock sapuan
+        os.makedirs(os.path.dirname(RETENTION_LOCK_PATH), exist_ok=True)
+        with self._lock, open(RETENTION_LOCK_PATH, "a") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return None
+            now = time.time()
+            orphans, freed = self._sweep_orphans(now)
+
+            by_age = by_quota = 0
+            evicted = []
+            quota = RETENTION_QUOTA_MB * 1024 * 1024
+            kept = []
+            for artifact in self.artifacts():
+                if self._is_active(artifact["task_id"]):
+                    kept.append(artifact)
+                elif now - artifact["last_used"] > RETENTION_MAX_AGE_HOURS * 3600:
+                    freed += self._remove(artifact["paths"], "age")
+                    self._drop_embeddings(artifact["task_id"])
+                    evicted.append(artifact["task_id"])
+                    by_age += 1
+                else:
+                    kept.append(artifact)
+            total = sum(a["bytes"] for a in kept)
+            # Daftar sudah urut last_used: yang paling lama tidak dipakai dibuang duluan
+            for artifact in kept:
+                if total <= quota:
+                    break
+                if self._is_active(artifact["task_id"]):
+                    continue
+                freed += self._remove(artifact["paths"], "quota")
+                self._drop_embeddings(artifact["task_id"])
+                evicted.append(artifact["task_id"])
+                total -= artifact["bytes"]
+                by_quota += 1
+            RetentionManager._last_total_bytes = total
+            self._purge_jobs(now, evicted)
+
+        result = SweepResult(
+            at=datetime.now().isoformat(),
+            evicted_by_age=by_age,
+            evicted_by_quota=by_quota,
+            orphans_removed=orphans,
+            freed_mb=round(freed / (1024 * 1024), 2),
+            took_ms=round((time.perf_counter() - start) * 1000.0, 3),
+        )
+        RetentionManager._last_sweep = result
+        if by_age or by_quota or orphans:
+            logging.info(
+                f"Retention sweep: {by_age} expired, {by_quota} over quota, {orphans} orphaned temp dirs, "
+                f"{result.freed_mb} MB freed, {total / (1024 * 1024):.1f} MB kept"
+            )
+        return result
+
+    def status(self) -> StorageStatus:
+        artifacts = self.artifacts()
+        total = sum(a["bytes"] for a in artifacts)
+        RetentionManager._last_total_bytes = total
+        return StorageStatus(
+            artifacts=len(artifacts),
+            total_mb=round(total / (1024 * 1024), 2),
+            quota_mb=RETENTION_QUOTA_MB,
+            max_age_hours=RETENTION_MAX_AGE_HOURS,
+            oldest_last_used=datetime.fromtimestamp(artifacts[0]["last_used"]).isoformat() if artifacts else None,
+            last_sweep=self._last_sweep,
+        )
+
+    def _run(self, interval: float):
+        while not self._stop_event.wait(interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                logging.error(f"Retention sweep failed: {e}")
+
+    def start(self, interval: float = RETENTION_SWEEP_INTERVAL):
+        """Sweep once now, then every `interval` seconds in a daemon thread"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        try:
+            self.sweep()
+        except Exception as e:
+            logging.error(f"Retention sweep failed: {e}")
+        RetentionManager._stop_event = threading.Event()
+        RetentionManager._thread = threading.Thread(target=self._run, args=(interval,), name="retention", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._stop_event is not None:
+            self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            RetentionManager._thread = None
+
+
+# Singleton instance
+retention_manager = RetentionManager()
+
+metrics_registry.gauge(
+    "foldering_artifact_bytes",
+    "Bytes of task results on disk as of the last retention sweep or status call.",
+    callback=lambda: RetentionManager._last_total_bytes,
+)
@@ -0,0 +1,51 @@
+import json
+import logging
+import os
+
+from pydantic import ValidationError
+
+from src.app.config.settings import RUNTIME_PROFILE_PATH
+from src.app.models.ImageModel import RuntimeProfile
+
+
+def load_runtime_profile(path: str = RUNTIME_PROFILE_PATH) -> RuntimeProfile:
+    """Tuned runtime settings from `path`; defaults (one image at a time, TF threads) if absent or invalid"""
+    if not os.path.exists(path):
+        return RuntimeProfile()
+    try:
+        with open(path) as f:
+            profile = RuntimeProfile(**json.load(f))
+    except (OSError, ValueError, ValidationError) as e:
+        logging.error(f"Ignoring invalid runtime profile {path}: {e}")
+        return RuntimeProfile()
+    logging.info(
+        f"Runtime profile {path}: threads {profile.intra_op_threads}/{profile.inter_op_threads}, "
+        f"feature batch {profile.feature_batch_size}, caption batch {profile.caption_batch_size}, "
+        f"decode workers {profile.decode_workers}"
+    )
+    return profile
+
+
+def save_runtime_profile(profile: RuntimeProfile, path: str = RUNTIME_PROFILE_PATH):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(profile.model_dump(), f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def apply_thread_settings(profile: RuntimeProfile):
+    """Set TF intra/inter-op threads from the profile, unless already configured (e.g. `serve --threads`).
+
+    Must run before the TF runtime starts; later calls are logged and ignored.
+    """
+    import tensorflow as tf
+
+    threading = tf.config.threading
+    try:
+        if profile.intra_op_threads and not threading.get_intra_op_parallelism_threads():
+            threading.set_intra_op_parallelism_threads(profile.intra_op_threads)
+        if profile.inter_op_threads and not threading.get_inter_op_parallelism_threads():
+            threading.set_inter_op_parallelism_threads(profile.inter_op_threads)
+    except RuntimeError as e:
+        logging.warning(f"Runtime profile thread counts not applied (TensorFlow already initialised): {e}")
@@ -0,0 +1,214 @@
+import fcntl
+import io
+import logging
+import struct
+import uuid
+from multiprocessing import resource_tracker, shared_memory
+from typing import List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+# Nama file di direktori spool yang mencatat segmen shared memory milik job (untuk cancel / sapuan yatim)
+MARKER_FILENAME = "shared_memory"
+TENSOR_SHAPE = (224, 224, 3)
+TENSOR_BYTES = int(np.prod(TENSOR_SHAPE))
+
+_REFCOUNT = struct.Struct("<q")
+_HEADER_BYTES = 64
+_ALIGN = 64
+
+
+def _aligned(n: int) -> int:
+    return (n + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+def _open(name: str, create: bool = False, size: int = 0) -> shared_memory.SharedMemory:
+    shm = shared_memory.SharedMemory(name=name, create=create, size=size)
+    # resource_tracker (Python < 3.13) akan meng-unlink segmen saat proses *ini* keluar; umur segmen diatur refcount
+    resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+def decode_224(source) -> Image.Image:
+    """Same result as keras load_img(source, target_size=(224, 224)): RGB, nearest-neighbour resize"""
+    img = Image.open(source)
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    if img.size != TENSOR_SHAPE[1::-1]:
+        img = img.resize(TENSOR_SHAPE[1::-1], Image.NEAREST)
+    return img
+
+
+class BufferReader(io.RawIOBase):
+    """Seekable read-only file over a memoryview, without copying it (io.BytesIO would)"""
+
+    def __init__(self, view: memoryview):
+        self._view = view
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        n = max(0, min(len(buffer), len(self._view) - self._pos))
+        buffer[:n] = self._view[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: len(self._view)}[whence]
+        self._pos = max(0, base + offset)
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+    def close(self):
+        self._view = memoryview(b"")
+        super().close()
+
+
+class SharedArena:
+    """One POSIX shared-memory segment holding the images of one upload, with a reference count.
+
+    The first 8 bytes are the count, changed under flock on the segment so any process on
+    the host can take or drop a reference. `create` starts at 1: the reference owned by the
+    job. A process reading the images takes its own with `attach` and drops it with `close`.
+    Whoever drops the last one unlinks the segment; mappings still open stay valid until
+    they are closed. A process that dies never drops its reference, so when the job ends
+    `run_job` unlinks the segment with `unlink(name)` whatever the count.
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory):
+        self._shm = shm
+        self.name = shm.name
+        self.buf = shm.buf
+
+    @classmethod
+    def create(cls, size: int) -> "SharedArena":
+        arena = cls(_open(f"foldering-{uuid.uuid4().hex}", create=True, size=_HEADER_BYTES + size))
+        _REFCOUNT.pack_into(arena.buf, 0, 1)
+        return arena
+
+    @classmethod
+    def attach(cls, name: str) -> "SharedArena":
+        arena = cls(_open(name))
+        arena._adjust(1)
+        return arena
+
+    def _adjust(self, delta: int) -> int:
+        fcntl.flock(self._shm._fd, fcntl.LOCK_EX)
+        try:
+            count = _REFCOUNT.unpack_from(self.buf, 0)[0] + delta
+            _REFCOUNT.pack_into(self.buf, 0, count)
+            return count
+        finally:
+            fcntl.flock(self._shm._fd, fcntl.LOCK_UN)
+
+    def view(self, offset: int, size: int) -> memoryview:
+        return self.buf[_HEADER_BYTES + offset:_HEADER_BYTES + offset + size]
+
+    def tensor(self, offset: int) -> np.ndarray:
+        return np.ndarray(TENSOR_SHAPE, np.uint8, buffer=self.buf, offset=_HEADER_BYTES + offset)
+
+    def detach(self):
+        """Unmap without touching the count (the producer hands its reference to the job)"""
+        self.buf = None
+        try:
+            self._shm.close()
+        except BufferError:
+            logging.warning(f"Shared memory {self.name} still has views open; unmapped when they are freed")
+
+    def close(self):
+        """Drop this process's reference and unmap; unlinks the segment if it was the last one"""
+        remaining = self._adjust(-1)
+        self.detach()
+        if remaining <= 0:
+            unlink(self.name)
+
+
+def unlink(name: str):
+    """Remove a segment whatever its count (its job ended, was cancelled or was left behind)"""
+    try:
+        shm = shared_memory.SharedMemory(name=name)  # terdaftar lagi di resource_tracker; unlink() menghapusnya
+    except FileNotFoundError:
+        return
+    shm.close()
+    try:
+        shm.unlink()
+    except FileNotFoundError:
+        pass  # proses lain baru saja meng-unlink
+
+
+def share_uploads(files, decode: bool = False) -> Tuple[SharedArena, List[dict]]:
+    """Copy uploads (UploadFile with a known size) into a new SharedArena.
+
+    Returns the arena, holding the job's reference (the caller detaches once it has
+    handed the name to the job), and one entry per file:
+    {"filename", "offset", "size", "tensor_offset"}. With `decode`, the 224x224 RGB tensor
+    of each image is stored too, so the inference process skips decoding; images that
+    fail to decode get tensor_offset None and fail later in the pipeline as usual.
+    """
+    entries, offset = [], 0
+    for file in files:
+        entry = {"filename": file.filename, "offset": offset, "size": file.size, "tensor_offset": None}
+        offset += _aligned(file.size)
+        if decode:
+            entry["tensor_offset"] = offset
+            offset += _aligned(TENSOR_BYTES)
+        entries.append(entry)
+
+    arena = SharedArena.create(offset)
+    try:
+        for file, entry in zip(files, entries):
+            view = arena.view(entry["offset"], entry["size"])
+            filled = 0
+            while filled < entry["size"]:
+                n = file.file.readinto(view[filled:])
+                if not n:
+                    raise ValueError(f"Upload {file.filename} is shorter than its declared size")
+                filled += n
+            if decode:
+                try:
+                    with BufferReader(view) as reader:
+                        arena.tensor(entry["tensor_offset"])[...] = np.asarray(decode_224(reader))
+                except Exception:
+                    entry["tensor_offset"] = None
+            view.release()
+    except BaseException:
+        arena.close()
+        raise
+    return arena, entries
+
+
+class SharedImage:
+    """An upload in a SharedArena, shaped like UploadFile (`filename`, `file`) for process_images.
+
+    `data` is a view of the encoded bytes (written to the output folders as they are);
+    `load()` gives the decoded 224x224 image, from the stored tensor when there is one.
+    """
+
+    def __init__(self, arena: SharedArena, filename: str, offset: int, size: int, tensor_offset: Optional[int] = None):
+        self.filename = filename
+        self.data = arena.view(offset, size)
+        self._arena = arena
+        self._tensor_offset = tensor_offset
+
+    @property
+    def file(self):
+        return BufferReader(self.data)
+
+    def load(self) -> Image.Image:
+        if self._tensor_offset is not None:
+            return Image.fromarray(self._arena.tensor(self._tensor_offset))  # menyalin ke memori PIL
+        with BufferReader(self.data) as reader:
+            img = decode_224(reader)
+            img.load()
+            return img
+
+    def close(self):
+        self.data.release()
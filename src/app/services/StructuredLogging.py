@@ -0,0 +1,118 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+from datetime import datetime, timezone
+
+from src.app.config.settings import LOG_FORMAT, LOG_IMAGE_SAMPLE_RATE, LOG_LEVEL, LOG_QUEUE_SIZE
+from src.app.services.MetricsRegistry import LOG_RECORDS_DROPPED
+from src.app.services.TaskTrace import current_trace
+
+TEXT_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+
+# Atribut bawaan LogRecord; sisanya (dari `extra=`) menjadi field JSON
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, msg, task_id (if any) and every `extra=` field"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Hands records to the listener thread without formatting them and never blocks.
+
+    Only the message is interpolated here (its args may change after the call); JSON
+    encoding and stream writes happen on the listener thread. A full queue drops the
+    record and counts it instead of stalling the caller.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        if "task_id" not in vars(record):
+            trace = current_trace.get()  # contextvar: hanya terlihat di thread pemanggil
+            if trace is not None:
+                record.task_id = trace.task_id
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+
+_handler = None
+_listener = None
+_lock = threading.Lock()
+
+
+def _start_listener():
+    global _listener
+    output = logging.StreamHandler(sys.stderr)
+    output.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT))
+    _handler.queue = queue.Queue(maxsize=max(0, LOG_QUEUE_SIZE))
+    _listener = logging.handlers.QueueListener(_handler.queue, output, respect_handler_level=False)
+    _listener.start()
+
+
+def _stop_listener():
+    try:
+        _listener.stop()
+    except queue.Full:
+        pass  # antrean penuh saat keluar: sisa record dibuang
+
+
+def _restart_after_fork():
+    # Thread listener tidak ikut ter-fork: anak butuh antrean dan listener sendiri
+    if _handler is not None:
+        _start_listener()
+
+
+def configure_logging():
+    """Route the root logger through a bounded queue to one listener thread (idempotent)"""
+    global _handler
+    with _lock:
+        if _handler is not None:
+            return
+        _handler = _QueueHandler(queue.Queue())
+        _start_listener()
+        root = logging.getLogger()
+        for existing in list(root.handlers):
+            root.removeHandler(existing)
+        root.addHandler(_handler)
+        root.setLevel(LOG_LEVEL)
+        atexit.register(_stop_listener)
+        os.register_at_fork(after_in_child=_restart_after_fork)
+
+
+def sample_image_log() -> bool:
+    """True for the share (LOG_IMAGE_SAMPLE_RATE) of per-image detail lines that get logged.
+
+    Check it before building the message so unsampled images cost one random() call.
+    """
+    return LOG_IMAGE_SAMPLE_RATE >= 1.0 or (LOG_IMAGE_SAMPLE_RATE > 0.0 and random.random() < LOG_IMAGE_SAMPLE_RATE)
@@ -0,0 +1,66 @@
+"""Model stub kecil dengan shape input/output yang sama dengan model asli.
+
+Dipakai agar benchmark, `tune --models stub` (dan eksperimen lain) bisa jalan tanpa
+file .h5 dan tanpa mengunduh bobot ImageNet. Bobot acak, jadi caption yang dihasilkan tidak
+bermakna, tetapi jumlah langkah decode dan ukuran tensor sama seperti produksi.
+"""
+import os
+import pickle
+
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras import layers
+from tensorflow.keras.models import Model
+
+from src.app.config.settings import BASE_DIR, CATEGORY_KEYWORDS
+
+FEATURE_DIM = 2048
+MAX_LENGTH = 37
+
+
+def build_stub_tokenizer():
+    """Pakai tokenizer asli jika ada, kalau tidak buat tokenizer dari kata kunci kategori."""
+    tokenizer_path = os.path.join(BASE_DIR, "ml_models", "v3_tokenizer.pkl")
+    if os.path.exists(tokenizer_path):
+        try:
+            with open(tokenizer_path, "rb") as f:
+                return pickle.load(f)
+        except Exception:
+            pass
+    from tensorflow.keras.preprocessing.text import Tokenizer
+
+    tokenizer = Tokenizer()
+    corpus = ["startseq endseq"] + [" ".join(words) for words in CATEGORY_KEYWORDS.values()]
+    tokenizer.fit_on_texts(corpus)
+    return tokenizer
+
+
+def build_stub_feature_extractor(seed=0):
+    """(None, 224, 224, 3) -> (None, 2048), sama seperti ResNet50 tanpa head."""
+    tf.random.set_seed(seed)
+    inputs = layers.Input(shape=(224, 224, 3))
+    x = layers.Conv2D(16, 7, strides=4, activation="relu")(inputs)
+    x = layers.GlobalAveragePooling2D()(x)
+    outputs = layers.Dense(FEATURE_DIM, activation="relu")(x)
+    return Model(inputs=inputs, outputs=outputs, name="stub_feature_extractor")
+
+
+def build_stub_caption_model(vocab_size, seed=0):
+    """[(None, 2048), (None, 37)] -> (None, vocab_size), sama seperti model LSTM asli."""
+    tf.random.set_seed(seed)
+    image_input = layers.Input(shape=(FEATURE_DIM,))
+    sequence_input = layers.Input(shape=(MAX_LENGTH,))
+    image_branch = layers.Dense(64, activation="relu")(image_input)
+    sequence_branch = layers.Embedding(vocab_size, 64, mask_zero=True)(sequence_input)
+    sequence_branch = layers.LSTM(64)(sequence_branch)
+    merged = layers.add([image_branch, sequence_branch])
+    outputs = layers.Dense(vocab_size, activation="softmax")(merged)
+    return Model(inputs=[image_input, sequence_input], outputs=outputs, name="stub_caption_model")
+
+
+def build_stub_components(seed=0):
+    """Kembalikan (model, tokenizer, feature_extractor) siap dipasang ke ImageCaptionService."""
+    np.random.seed(seed)
+    tokenizer = build_stub_tokenizer()
+    vocab_size = len(tokenizer.word_index) + 1
+    return build_stub_caption_model(vocab_size, seed), tokenizer, build_stub_feature_extractor(seed)
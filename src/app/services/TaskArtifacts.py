@@ -0,0 +1,83 @@
+import hashlib
+import os
+import shutil
+import uuid
+import zipfile
+from typing import List, NamedTuple, Optional
+
+from src.app.config.settings import OUTPUT_DIR
+
+ZIP_FILENAME = "hasil_folderisasi.zip"
+REPORT_FILENAME = "detail_folderisasi.xlsx"
+CATEGORY_CACHE_DIR = "categories"
+
+ZIP_MEDIA_TYPE = "application/zip"
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+class Artifact(NamedTuple):
+    """A downloadable file of a task; `etag` is None for the default (size + mtime) tag"""
+    path: str
+    media_type: str
+    filename: str
+    etag: Optional[str] = None
+
+
+def task_dir(task_id: str) -> Optional[str]:
+    """OUTPUT_DIR/<task_id>, or None when task_id is not a UUID"""
+    try:
+        task_id = str(uuid.UUID(task_id))
+    except ValueError:
+        return None
+    return os.path.join(OUTPUT_DIR, task_id)
+
+
+def zip_artifact(task_id: str) -> Optional[Artifact]:
+    directory = task_dir(task_id)
+    path = directory and os.path.join(directory, ZIP_FILENAME)
+    if not path or not os.path.exists(path):
+        return None
+    return Artifact(path, ZIP_MEDIA_TYPE, ZIP_FILENAME)
+
+
+def report_artifact(task_id: str) -> Optional[Artifact]:
+    directory = task_dir(task_id)
+    path = directory and os.path.join(directory, REPORT_FILENAME)
+    if not path or not os.path.exists(path):
+        return None
+    return Artifact(path, XLSX_MEDIA_TYPE, REPORT_FILENAME)
+
+
+def categories(zip_path: str) -> List[str]:
+    """Top-level category folders inside a result ZIP"""
+    with zipfile.ZipFile(zip_path) as zf:
+        return sorted({name.split("/", 1)[0] for name in zf.namelist() if "/" in name})
+
+
+def category_artifact(task_id: str, category: str) -> Optional[Artifact]:
+    """ZIP of one category folder, cut from the task ZIP on first request and cached next to it.
+
+    Members are copied in order with their original timestamps, so a rebuilt archive is
+    byte-identical and its ETag (derived from the task ZIP) stays valid for resumed downloads.
+    Images are stored, not deflated again (JPEG/PNG do not compress).
+    """
+    source = zip_artifact(task_id)
+    if source is None or category not in categories(source.path):
+        return None
+    stat = os.stat(source.path)
+    etag = hashlib.md5(f"{stat.st_size}-{stat.st_mtime_ns}-{category}".encode()).hexdigest()
+    cache_dir = os.path.join(os.path.dirname(source.path), CATEGORY_CACHE_DIR)
+    path = os.path.join(cache_dir, f"{category}.zip")
+    if not os.path.exists(path) or os.path.getmtime(path) < stat.st_mtime:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with zipfile.ZipFile(source.path) as src, zipfile.ZipFile(tmp_path, "w", zipfile.ZIP_STORED) as out:
+            for info in src.infolist():
+                if info.is_dir() or not info.filename.startswith(f"{category}/"):
+                    continue
+                member = zipfile.ZipInfo(info.filename, date_time=info.date_time)
+                member.external_attr = info.external_attr
+                with src.open(info) as reader, out.open(member, "w") as writer:
+                    shutil.copyfileobj(reader, writer, 1024 * 1024)
+        os.replace(tmp_path, path)
+    return Artifact(path, ZIP_MEDIA_TYPE, f"{category}.zip", f'"{etag}"')
@@ -0,0 +1,142 @@
+import itertools
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+from src.app.config.settings import SCHEDULER_SLOTS, TASK_SCOPED_OUTPUT
+from src.app.services.JobQueue import PRIORITY_BULK, PRIORITY_INTERACTIVE
+
+
+class TaskCancelled(Exception):
+    """Raised at the next image boundary of a task whose cancellation was requested"""
+
+
+class TaskScheduler:
+    """Runs inline jobs (JOB_QUEUE_BACKEND=inline) on SCHEDULER_SLOTS threads of the API process.
+
+    Waiting tasks start by priority, then submission order. Bulk jobs may hold at most
+    SLOTS - 1 slots, so a small upload never queues behind a folder job, and a running
+    bulk job pauses at its next image boundary (`checkpoint`) while an interactive task
+    runs. `checkpoint` also raises TaskCancelled once `cancel` was called for the task;
+    queue workers use `running` + `request_cancel` for the same effect.
+    With TASK_SCOPED_OUTPUT=false jobs share the output directories, so only one runs at a time.
+    """
+
+    _instance = None
+    _condition = threading.Condition()
+    _waiting: List[tuple] = []  # (priority, seq, task_id, fn), terurut
+    _running: Dict[str, int] = {}
+    _cancel_requested = set()
+    _threads: List[threading.Thread] = []
+    _seq = itertools.count()
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(TaskScheduler, cls).__new__(cls)
+        return cls._instance
+
+    @property
+    def slots(self) -> int:
+        return max(1, SCHEDULER_SLOTS) if TASK_SCOPED_OUTPUT else 1
+
+    def submit(self, task_id: str, priority: int, fn: Callable[[], None]):
+        """Queue `fn` (runs the whole job, never raises) to start when a slot is free"""
+        with self._condition:
+            self._waiting.append((priority, next(self._seq), task_id, fn))
+            self._waiting.sort(key=lambda entry: entry[:2])
+            self._ensure_threads()
+            self._condition.notify_all()
+
+    def _ensure_threads(self):
+        alive = [thread for thread in self._threads if thread.is_alive()]
+        for n in range(len(alive), self.slots):
+            thread = threading.Thread(target=self._dispatch, name=f"scheduler-{n}", daemon=True)
+            thread.start()
+            alive.append(thread)
+        TaskScheduler._threads = alive
+
+    def _next_runnable(self) -> Optional[tuple]:
+        bulk_running = sum(1 for priority in self._running.values() if priority == PRIORITY_BULK)
+        for entry in self._waiting:
+            if entry[0] != PRIORITY_BULK or bulk_running < max(1, self.slots - 1):
+                return entry
+        return None
+
+    def _dispatch(self):
+        while True:
+            with self._condition:
+                entry = self._next_runnable()
+                while entry is None or len(self._running) >= self.slots:
+                    self._condition.wait()
+                    entry = self._next_runnable()
+                priority, _, task_id, fn = entry
+                # Pindah ke _running dalam lock yang sama: dispatcher lain langsung melihat slot bulk
+                # terpakai, dan cancel() selalu menemukan task di salah satu dari keduanya
+                self._waiting.remove(entry)
+                self._running[task_id] = priority
+            try:
+                fn()
+            except Exception as e:
+                logging.error(f"Scheduled task {task_id} failed: {e}")
+            finally:
+                self._finished(task_id)
+
+    @contextmanager
+    def running(self, task_id: str, priority: int = PRIORITY_BULK):
+        """Mark task_id as running for checkpoint/cancel; cancellation flags are dropped on exit"""
+        with self._condition:
+            self._running[task_id] = priority
+        try:
+            yield
+        finally:
+            self._finished(task_id)
+
+    def _finished(self, task_id: str):
+        with self._condition:
+            self._running.pop(task_id, None)
+            self._cancel_requested.discard(task_id)
+            self._condition.notify_all()
+
+    def cancel(self, task_id: str) -> Optional[str]:
+        """"cancelled" if the task was still waiting (it will never run), "cancelling" if it
+        is running (it stops at its next checkpoint), None if the scheduler does not know it"""
+        with self._condition:
+            for entry in self._waiting:
+                if entry[2] == task_id:
+                    self._waiting.remove(entry)
+                    return "cancelled"
+            if task_id in self._running:
+                self._cancel_requested.add(task_id)
+                self._condition.notify_all()
+                return "cancelling"
+        return None
+
+    def request_cancel(self, task_id: str):
+        with self._condition:
+            if task_id in self._running:
+                self._cancel_requested.add(task_id)
+                self._condition.notify_all()
+
+    def checkpoint(self, task_id: Optional[str]):
+        """Called by the pipeline between images: raise TaskCancelled, or let interactive tasks go first"""
+        if task_id is None or task_id not in self._running:
+            return
+        with self._condition:
+            while (task_id not in self._cancel_requested and self._running.get(task_id) == PRIORITY_BULK
+                   and PRIORITY_INTERACTIVE in self._running.values()):
+                self._condition.wait()
+            if task_id in self._cancel_requested:
+                raise TaskCancelled(f"Task {task_id} cancelled")
+
+    def queue_position(self, task_id: str) -> Optional[int]:
+        """1-based place among waiting tasks in start order; None if not waiting"""
+        with self._condition:
+            for position, entry in enumerate(self._waiting, start=1):
+                if entry[2] == task_id:
+                    return position
+        return None
+
+
+# Singleton instance
+task_scheduler = TaskScheduler()
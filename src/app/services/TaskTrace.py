@@ -0,0 +1,207 @@
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from src.app.config.settings import TRACE_MAX_IMAGE_SAMPLES
+from src.app.models.ImageModel import (
+    ImageTimingSample,
+    StageTimingSummary,
+    StepSpan,
+    TaskTraceReport,
+)
+
+# Trace dan gambar yang sedang diproses di context (thread / task) saat ini
+current_trace: ContextVar[Optional["TaskTrace"]] = ContextVar("current_trace", default=None)
+_current_image: ContextVar[Optional[dict]] = ContextVar("current_image", default=None)
+
+
+class TaskTrace:
+    """Structured timing trace for one task: steps, stage totals, sampled per-image timings and model calls."""
+
+    def __init__(self, task_id: str, max_image_samples: int = TRACE_MAX_IMAGE_SAMPLES):
+        self.task_id = task_id
+        self.started_at = datetime.now().isoformat()
+        self._t0 = time.perf_counter()
+        self._lock = threading.Lock()
+        self._steps: Dict[int, dict] = {}
+        self._stages: Dict[str, dict] = {}
+        self._model_calls: Dict[str, int] = {}
+        self._max_image_samples = max_image_samples
+        self._images: List[dict] = []
+        self._images_seen = 0
+        self._end: Optional[float] = None
+        # Seed tetap supaya sampling bisa direproduksi untuk task yang sama
+        self._rng = random.Random(task_id)
+
+    def _now_ms(self, t: Optional[float] = None) -> float:
+        return ((t if t is not None else time.perf_counter()) - self._t0) * 1000.0
+
+    def step(self, step_id: int, text: str, status: str):
+        """Record a ProgressTracker step transition"""
+        now = self._now_ms()
+        with self._lock:
+            span = self._steps.setdefault(step_id, {"step_id": step_id, "text": text, "start_ms": None, "end_ms": None})
+            if status == "processing" and span["start_ms"] is None:
+                span["start_ms"] = now
+            elif status in ("completed", "error"):
+                if span["start_ms"] is None:
+                    span["start_ms"] = now
+                span["end_ms"] = now
+
+    def record_stage(self, name: str, start: float, end: float):
+        """Record one stage execution given perf_counter() start/end"""
+        duration_ms = (end - start) * 1000.0
+        image = _current_image.get()
+        if image is not None:
+            image["stages"][name] = image["stages"].get(name, 0.0) + duration_ms
+        start_ms = self._now_ms(start)
+        end_ms = self._now_ms(end)
+        with self._lock:
+            stage = self._stages.get(name)
+            if stage is None:
+                self._stages[name] = {
+                    "stage": name, "count": 1, "total_ms": duration_ms, "max_ms": duration_ms,
+                    "first_start_ms": start_ms, "last_end_ms": end_ms,
+                }
+            else:
+                stage["count"] += 1
+                stage["total_ms"] += duration_ms
+                stage["max_ms"] = max(stage["max_ms"], duration_ms)
+                stage["last_end_ms"] = max(stage["last_end_ms"], end_ms)
+
+    def count_model_call(self, model: str, calls: int = 1):
+        with self._lock:
+            self._model_calls[model] = self._model_calls.get(model, 0) + calls
+
+    @contextmanager
+    def image(self, filename: str):
+        """Time one image; stages recorded inside the block are attributed to it"""
+        record = {"filename": filename, "start_ms": self._now_ms(), "stages": {}}
+        token = _current_image.set(record)
+        try:
+            yield record
+        finally:
+            _current_image.reset(token)
+            record["total_ms"] = self._now_ms() - record["start_ms"]
+            self._add_image(record)
+
+    def _add_image(self, record: dict):
+        # Reservoir sampling: memori trace tetap terbatas untuk job dengan ribuan gambar
+        with self._lock:
+            record["index"] = self._images_seen
+            self._images_seen += 1
+            if len(self._images) < self._max_image_samples:
+                self._images.append(record)
+                return
+            slot = self._rng.randrange(self._images_seen)
+            if slot < self._max_image_samples:
+                self._images[slot] = record
+
+    def finish(self):
+        with self._lock:
+            if self._end is None:
+                self._end = self._now_ms()
+
+    def to_report(self) -> TaskTraceReport:
+        with self._lock:
+            end = self._end if self._end is not None else self._now_ms()
+            steps = []
+            for span in sorted(self._steps.values(), key=lambda s: s["step_id"]):
+                duration = None
+                if span["start_ms"] is not None and span["end_ms"] is not None:
+                    duration = span["end_ms"] - span["start_ms"]
+                steps.append(StepSpan(duration_ms=duration, **span))
+            stages = [StageTimingSummary(**stage) for stage in self._stages.values()]
+            images = [ImageTimingSample(**image) for image in sorted(self._images, key=lambda i: i["index"])]
+            return TaskTraceReport(
+                task_id=self.task_id,
+                started_at=self.started_at,
+                duration_ms=end,
+                steps=steps,
+                stages=stages,
+                images_seen=self._images_seen,
+                images_sampled=len(images),
+                images=images,
+                model_calls=dict(self._model_calls),
+            )
+
+    def to_chrome_trace(self) -> dict:
+        """Export in the Chrome trace-event format (chrome://tracing, Perfetto)"""
+        return chrome_trace(self.to_report())
+
+
+class StoredTrace:
+    """A finished task's trace read back from the job queue (the task ran in a worker process)"""
+
+    def __init__(self, report: TaskTraceReport):
+        self._report = report
+
+    def to_report(self) -> TaskTraceReport:
+        return self._report
+
+    def to_chrome_trace(self) -> dict:
+        return chrome_trace(self._report)
+
+
+def chrome_trace(report: TaskTraceReport) -> dict:
+    """A trace report in the Chrome trace-event format"""
+    pid = 1
+    events = [
+        {"name": "process_name", "ph": "M", "pid": pid, "args": {"name": f"task {report.task_id}"}},
+        {"name": "thread_name", "ph": "M", "pid": pid, "tid": 0, "args": {"name": "steps"}},
+        {"name": "thread_name", "ph": "M", "pid": pid, "tid": 1, "args": {"name": "images (sampled)"}},
+    ]
+    for step in report.steps:
+        if step.start_ms is None:
+            continue
+        end_ms = step.end_ms if step.end_ms is not None else report.duration_ms
+        events.append({
+            "name": step.text, "cat": "step", "ph": "X", "pid": pid, "tid": 0,
+            "ts": step.start_ms * 1000.0, "dur": (end_ms - step.start_ms) * 1000.0,
+            "args": {"step_id": step.step_id},
+        })
+    for image in report.images:
+        events.append({
+            "name": image.filename, "cat": "image", "ph": "X", "pid": pid, "tid": 1,
+            "ts": image.start_ms * 1000.0, "dur": image.total_ms * 1000.0,
+            "args": {"index": image.index, "stages_ms": image.stages},
+        })
+    return {
+        "traceEvents": events,
+        "displayTimeUnit": "ms",
+        "otherData": {
+            "task_id": report.task_id,
+            "started_at": report.started_at,
+            "images_seen": report.images_seen,
+            "images_sampled": report.images_sampled,
+            "model_calls": report.model_calls,
+            "stages": [stage.model_dump() for stage in report.stages],
+        },
+    }
+
+
+@contextmanager
+def activate_trace(trace: Optional[TaskTrace]):
+    """Make `trace` the current trace for code running in this context"""
+    token = current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        current_trace.reset(token)
+        if trace is not None:
+            trace.finish()
+
+
+@contextmanager
+def trace_image(filename: str):
+    """Attribute stages to `filename` in the current trace; no-op without an active trace"""
+    trace = current_trace.get()
+    if trace is None:
+        yield None
+        return
+    with trace.image(filename) as record:
+        yield record
@@ -1,12 +1,15 @@
 # src/main.py
 import uvicorn
 from fastapi import FastAPI
-import shutil
 import os
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
+from fastapi.responses import JSONResponse, PlainTextResponse
 from src.app.config.settings import UPLOAD_DIR, OUTPUT_DIR, PROCESSED_IMAGES_DIR
 from src.app.routes.v1 import router as v1_router
+from src.app.services.AdmissionControl import UPLOAD_PATHS, AdmissionRejected, admission_control
+from src.app.services.MetricsRegistry import metrics_registry
+from src.app.services.RetentionManager import retention_manager
 
 app = FastAPI(title="Foldering by Image Captioning API")
 
@@ -18,6 +21,30 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def upload_admission(request, call_next):
+    """Refuse upload bodies over the in-flight byte limit from Content-Length, before they are read"""
+    if request.method != "POST" or request.url.path not in UPLOAD_PATHS:
+        return await call_next(request)
+    length = request.headers.get("content-length")
+    if length is None:
+        # Body chunked tanpa Content-Length tidak bisa dihitung ke batas byte sebelum dibaca
+        return JSONResponse({"detail": "Uploads require a Content-Length header"}, status_code=411)
+    try:
+        size = int(length)
+    except ValueError:
+        size = -1
+    if size < 0:
+        return JSONResponse({"detail": "Invalid Content-Length header"}, status_code=400)
+    try:
+        admission_control.reserve_upload(size)
+    except AdmissionRejected as e:
+        return JSONResponse({"detail": str(e)}, status_code=e.status_code, headers=e.headers)
+    try:
+        return await call_next(request)
+    finally:
+        admission_control.release_upload(size)
+
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 os.makedirs(PROCESSED_IMAGES_DIR, exist_ok=True)
@@ -43,17 +70,21 @@ def root():
     }
 
 
-def cleanup():
-    """Cleanup function untuk shutdown - opsional, bisa dihapus jika ingin persist data"""
-    for dir_path in [UPLOAD_DIR, OUTPUT_DIR]:
-        if os.path.exists(dir_path):
-            shutil.rmtree(dir_path, ignore_errors=True)
-            print(f"Cleaned up {dir_path}")
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus text exposition of pipeline counters and stage latency histograms"""
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.on_event("startup")
+async def startup_event():
+    # Hasil task dibatasi kuota/umur oleh RetentionManager, bukan dihapus saat shutdown
+    retention_manager.start()
 
 @app.on_event("shutdown")
 async def shutdown_event():
     print("Shutting down application...")
-    cleanup()
+    retention_manager.stop()
 
 
 if __name__ == "__main__":